@@ -0,0 +1,257 @@
+"""House number aware address resolution.
+
+Long streets are split across several townarea-streets entries, the
+house numbers each entry covers are part of its ``strasseBezeichnung``
+(``"Further Straße 1-99 ungerade"``) and single numbers can be excluded
+with ``blockedHomeNumbers``. ``AddressResolver`` parses those ranges once
+into an interval index per ``normalize_street`` key, so resolving an
+address is a dictionary lookup and a bisect::
+
+    resolver = AddressResolver(client.fetch_streets())
+    resolver.resolve("Further Straße", "17a")
+"""
+
+from __future__ import annotations
+
+import csv
+import re
+import sys
+from bisect import bisect_right
+from typing import (Dict, Iterable, Iterator, List, Optional, Sequence, TextIO,
+                    Tuple)
+
+from awl_streets import normalize_street
+
+# upper bound of an open range like "ab 20"
+MAX_HOUSE_NUMBER = 1 << 30
+
+# where the house numbers may start in a strasseBezeichnung
+_NUMBERS_START = re.compile(r"\s+(?=(?:ab|bis|nr\.?)?\s*\d)", re.I)
+# a house number part, "Straße des 17. Juni" has none
+_NUMBERS = re.compile(r"(?:(?:ab|bis|nr\.?)?\s*\d+\s*[a-z]?"
+                      r"(?:\s*-\s*\d+\s*[a-z]?)?"
+                      r"|ungerade|gerade|und|u\.|[\s,;/()&+])+", re.I)
+# one number, range, "ab n" or "bis n" of the house number part
+_RANGE = re.compile(r"(ab|bis)?\s*(\d+)\s*[a-z]?(?:\s*-\s*(\d+)\s*[a-z]?)?",
+                    re.I)
+_HOUSE_NUMBER = re.compile(r"\s*(\d+)\s*([a-z]?)", re.I)
+_ADDRESS = re.compile(r"^(.*?)\s*(\d+\s*[a-z]?)\s*$", re.I)
+
+EVEN = 0
+ODD = 1
+
+
+class StreetRange:  # pylint: disable=too-few-public-methods
+    """The house numbers a townarea-streets entry covers."""
+
+    __slots__ = ("number", "low", "high", "parity", "blocked")
+
+    def __init__(self, number, low: int = 0, high: int = MAX_HOUSE_NUMBER,
+                 parity: Optional[int] = None,
+                 blocked: Iterable = ()) -> None:
+        """Class initialisation steps.
+
+        :param number: the strasseNummer of the entry
+        :param low: first house number, included
+        :param high: last house number, included
+        :param parity: EVEN or ODD if only those numbers are covered
+        :param blocked: house numbers excluded from the range
+        """
+        self.number = number
+        self.low = low
+        self.high = high
+        self.parity = parity
+        self.blocked = frozenset(house_number_key(str(item))
+                                 for item in blocked)
+
+    def covers(self, house: int, key: str) -> bool:
+        """Check if the house number ``house``, spelled ``key``, is covered.
+
+        A blocked plain number also blocks its suffixed variants, a
+        blocked "12a" only blocks "12a".
+        """
+        if not self.low <= house <= self.high:
+            return False
+        if self.parity is not None and house % 2 != self.parity:
+            return False
+        return key not in self.blocked and str(house) not in self.blocked
+
+
+def house_number_key(text: str) -> str:
+    """Return the canonical spelling of a house number, "12 A" -> "12a"."""
+    return "".join(text.casefold().split())
+
+
+def parse_house_number(text) -> Optional[int]:
+    """Return the numeric part of a house number, None if it has none."""
+    found = _HOUSE_NUMBER.match(str(text))
+    return int(found.group(1)) if found else None
+
+
+def parse_address(address: str) -> Tuple[str, Optional[str]]:
+    """Split ``"Goethestraße 12a"`` into the street and the house number."""
+    found = _ADDRESS.match(address.strip())
+    if found is None or not found.group(1):
+        return address.strip(), None
+    return found.group(1).rstrip(" ,"), found.group(2)
+
+
+def parse_street(name: str) -> Tuple[str, List[Tuple[int, int]],
+                                     Optional[int]]:
+    """Split a strasseBezeichnung into its name and house number ranges.
+
+    :return: the street name, the ``(low, high)`` ranges, empty for the
+             whole street, and EVEN, ODD or None
+    """
+    for start in _NUMBERS_START.finditer(name):
+        if _NUMBERS.fullmatch(name, start.end()):
+            base, tail = name[:start.start()], name[start.end():]
+            break
+    else:
+        return name.strip(), [], None
+    ranges = []
+    for prefix, first, last in _RANGE.findall(tail):
+        low = high = int(first)
+        if last:
+            low, high = sorted((low, int(last)))
+        elif prefix.lower() == "ab":
+            high = MAX_HOUSE_NUMBER
+        elif prefix.lower() == "bis":
+            low = 0
+        ranges.append((low, high))
+    lowered = tail.casefold()
+    parity = (ODD if "ungerade" in lowered
+              else EVEN if "gerade" in lowered else None)
+    return base.strip(), ranges, parity
+
+
+class _IntervalIndex:  # pylint: disable=too-few-public-methods
+    """Elementary segments of overlapping house number ranges.
+
+    The boundaries of all ranges split the number line into segments,
+    each holding the ranges that cover it narrowest first. A lookup is a
+    bisect over the segment starts.
+    """
+
+    __slots__ = ("starts", "segments", "only")
+
+    def __init__(self, ranges: Sequence[StreetRange]) -> None:
+        bounds = sorted({bound for item in ranges
+                         for bound in (item.low, item.high + 1)})
+        self.starts = bounds[:-1]
+        self.segments = []
+        for start in self.starts:
+            covering = [item for item in ranges
+                        if item.low <= start <= item.high]
+            covering.sort(key=lambda item: (item.high - item.low,
+                                            item.parity is None))
+            self.segments.append(tuple(covering))
+        # the strasseNummer if every range belongs to the same entry
+        numbers = {item.number for item in ranges}
+        self.only = numbers.pop() if len(numbers) == 1 else None
+
+    def find(self, house: int, key: str):
+        """Return the strasseNummer covering ``house``, None if none does."""
+        pos = bisect_right(self.starts, house) - 1
+        if pos < 0:
+            return None
+        for item in self.segments[pos]:
+            if item.covers(house, key):
+                return item.number
+        return None
+
+
+class AddressResolver:
+    """Map street name and house number to the strasseNummer."""
+
+    def __init__(self, streets: Sequence) -> None:
+        """Class initialisation steps.
+
+        :param streets: the townarea-streets list, dicts or Street records
+        """
+        ranges: Dict[str, List[StreetRange]] = {}
+        for street in streets:
+            base, numbers, parity = parse_street(street["strasseBezeichnung"])
+            blocked = street.get("blockedHomeNumbers") or ()
+            for low, high in numbers or [(0, MAX_HOUSE_NUMBER)]:
+                ranges.setdefault(normalize_street(base), []).append(
+                    StreetRange(street["strasseNummer"], low, high, parity,
+                                blocked))
+        self._index = {name: _IntervalIndex(items)
+                       for name, items in ranges.items()}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_street(name) in self._index
+
+    def resolve(self, street: str, house_number=None):
+        """Return the strasseNummer of an address, None if unknown.
+
+        :param street: the street name without house number, or the full
+                       address if ``house_number`` is not given
+        :param house_number: Optional house number like 12 or "12a"
+        """
+        if house_number is None:
+            street, house_number = parse_address(street)
+        index = self._index.get(normalize_street(street))
+        if index is None:
+            return None
+        if not house_number:
+            # good enough as long as the street is not split
+            return index.only
+        house = parse_house_number(house_number)
+        if house is None:
+            return None
+        return index.find(house, house_number_key(str(house_number)))
+
+    def resolve_many(self, addresses: Iterable[Tuple[str, object]]
+                     ) -> Iterator[object]:
+        """Resolve ``(street, house number)`` pairs, lazily and in order."""
+        resolve = self.resolve
+        for street, house_number in addresses:
+            yield resolve(street, house_number)
+
+
+def resolve_csv(resolver: AddressResolver, source: TextIO, target: TextIO,
+                street_column: str = "strasse",
+                number_column: str = "hausnummer") -> Tuple[int, int]:
+    """Copy a CSV file, adding the strasseNummer of each row.
+
+    Rows are streamed, the file is never held in memory. If the file has
+    no ``number_column`` the ``street_column`` is read as a full address.
+
+    :return: the number of rows and of rows that could not be resolved
+    """
+    reader = csv.DictReader(source)
+    fields = list(reader.fieldnames or [])
+    if street_column not in fields:
+        raise ValueError(f"CSV has no column {street_column!r}")
+    has_number = number_column in fields
+    writer = csv.DictWriter(target, fields + ["strasseNummer"])
+    writer.writeheader()
+    rows = failed = 0
+    for row in reader:
+        number = resolver.resolve(
+            row[street_column], row[number_column] if has_number else None)
+        row["strasseNummer"] = "" if number is None else number
+        failed += number is None
+        rows += 1
+        writer.writerow(row)
+    return rows, failed
+
+
+def run_resolve(streets: Sequence, path: str, output: Optional[str],
+                street_column: str, number_column: str) -> None:
+    """Resolve the addresses of a CSV file and report the misses."""
+    resolver = AddressResolver(streets)
+    with open(path, newline="", encoding="utf-8") as source:
+        if output:
+            with open(output, "w", newline="", encoding="utf-8") as target:
+                rows, failed = resolve_csv(resolver, source, target,
+                                           street_column, number_column)
+        else:
+            rows, failed = resolve_csv(resolver, source, sys.stdout,
+                                       street_column, number_column)
+    print(f"Resolved {rows - failed} of {rows} addresses", file=sys.stderr)
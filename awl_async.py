@@ -0,0 +1,100 @@
+"""Asyncio client for fetching the schedules of many streets.
+
+The AWL portal only offers one street per calendar request, so bulk
+lookups are dominated by network round trips. ``AsyncAWLScheduleClient``
+keeps a bounded number of those requests in flight at the same time and
+hands out every result as soon as it arrives.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+from awl_schedule import AWLScheduleClient
+
+
+class AsyncAWLScheduleClient:
+    """Asyncio counterpart of ``AWLScheduleClient`` for bulk queries.
+
+    Requests run on the pooled session of the wrapped client in a worker
+    thread pool, so caching, retries and bin filtering behave exactly as
+    with the synchronous client.
+    """
+
+    def __init__(self, config_path: str | pathlib.Path = "awl.conf",
+                 concurrency: Optional[int] = None,
+                 client: Optional[AWLScheduleClient] = None) -> None:
+        """Class initialisation steps.
+
+        :param config_path: Optional path to config file
+        :param concurrency: Optional number of requests in flight,
+                            defaults to ``config.concurrency``
+        :param client: Optional synchronous client to wrap
+        """
+        self.client = client or AWLScheduleClient(config_path)
+        self.concurrency = concurrency or self.client.config.concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def __aenter__(self) -> AsyncAWLScheduleClient:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def get_pickup_dates(self, street, scope="m",
+                               bins: Optional[list] = None) -> dict:
+        """Get the pickup dates of ``street``, see ``get_pickup_dates``."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency,
+                thread_name_prefix="awl-fetch")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(self.client.get_pickup_dates,
+                              scope=scope, bins=bins, street=street))
+
+    async def fetch_many(self, street_numbers: Iterable, scope="m",
+                         bins: Optional[list] = None,
+                         return_exceptions: bool = False
+                         ) -> AsyncIterator[Tuple[object, object]]:
+        """Fetch the schedules of many streets concurrently.
+
+        Yields ``(strasseNummer, pickups)`` in the order the responses
+        arrive. With ``return_exceptions`` a failed street yields its
+        exception instead of ending the iteration.
+
+        :param street_numbers: the strasseNummer values to query
+        :param scope: "m", "3m" or "y", see ``get_pickup_dates``
+        :param bins: Optional bin types to keep
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(street):
+            async with semaphore:
+                try:
+                    return street, await self.get_pickup_dates(
+                        street, scope=scope, bins=bins)
+                except Exception as exc:  # pylint: disable=broad-except
+                    if not return_exceptions:
+                        raise
+                    return street, exc
+
+        tasks = [asyncio.ensure_future(fetch_one(street))
+                 for street in street_numbers]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
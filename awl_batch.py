@@ -0,0 +1,227 @@
+"""Next pickups for many streets at once.
+
+``BatchSchedules`` holds the schedules of many streets as one matrix of
+bin bitmasks, a row per day and a column per street, and answers "next
+pickup", "pickups per bin" and "pickups tomorrow" for every street in a
+few NumPy passes. The results are the same as calling the
+``PickupSchedule`` methods street by street, which is what happens when
+NumPy is not installed.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from awl_pickups import PickupSchedule
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+NextPickup = Optional[Tuple[date, List[str]]]
+
+
+class BatchSchedules:
+    """The schedules of many streets, queried together.
+
+    Results are dicts keyed by street. Bin names are listed in the order
+    of ``bins``, like ``PickupSchedule`` does.
+    """
+
+    def __init__(self, schedules: Dict[object, PickupSchedule],
+                 bins: Optional[Sequence[str]] = None) -> None:
+        """Class initialisation steps.
+
+        :param schedules: street to PickupSchedule
+        :param bins: Optional bin order, by default the bins of the first
+                     schedule followed by bins only other schedules know
+        """
+        self.streets = list(schedules)
+        self.schedules = schedules
+        names = list(bins or ())
+        for schedule in schedules.values():
+            names.extend(name for name in schedule.bins if name not in names)
+        if len(names) > 8:
+            raise ValueError("BatchSchedules supports at most 8 bin types")
+        self.bins = tuple(names)
+        self.first_day = 0
+        self._matrix = None
+        if np is not None:
+            self._matrix = self._build_matrix()
+
+    @classmethod
+    def from_store(cls, store, streets: Optional[Iterable[int]] = None
+                   ) -> BatchSchedules:
+        """Load the streets of a ``ScheduleStore``, all by default.
+
+        With NumPy the memory-mapped matrix is used in place.
+        """
+        numbers = list(store.street_numbers() if streets is None
+                       else streets)
+        if np is None or streets is not None:
+            return cls({number: store.schedule(number)
+                        for number in numbers}, store.bins)
+        batch = cls.__new__(cls)
+        batch.streets = numbers
+        batch.schedules = None
+        batch.bins = store.bins
+        batch.first_day = store.first_day
+        batch._matrix = np.frombuffer(store.matrix, dtype=np.uint8).reshape(
+            store.n_days, store.n_streets)
+        return batch
+
+    @property
+    def vectorized(self) -> bool:
+        """Check if the NumPy engine is in use."""
+        return self._matrix is not None
+
+    def mask(self, bins: Optional[Iterable[str]] = None) -> int:
+        """Return the bitmask of ``bins``, all bins for None."""
+        if bins is None:
+            return (1 << len(self.bins)) - 1
+        return sum(1 << self.bins.index(name) for name in set(bins)
+                   if name in self.bins)
+
+    def next_pickup(self, after: Optional[date] = None,
+                    bins: Optional[Iterable[str]] = None
+                    ) -> Dict[object, NextPickup]:
+        """Return ``PickupSchedule.next_pickup`` of every street."""
+        after = after or date.today()
+        if not self.vectorized:
+            return {street: self.schedules[street].next_pickup(after, bins)
+                    for street in self.streets}
+        wanted = self.mask(bins)
+        rows = self._rows_after(after) & wanted
+        if not len(rows):  # pylint: disable=use-implicit-booleaness-not-len
+            return dict.fromkeys(self.streets)
+        hits = rows != 0
+        found = hits.any(axis=0)
+        first = hits.argmax(axis=0)
+        masks = rows[first, np.arange(len(self.streets))]
+        start = self.first_day + self._start_row(after)
+        names = self._names_table()
+        return {street: ((date.fromordinal(start + row), list(names[mask]))
+                         if hit else None)
+                for street, hit, row, mask
+                in zip(self.streets, found.tolist(), first.tolist(),
+                       masks.tolist())}
+
+    def next_pickup_per_bin(self, after: Optional[date] = None
+                            ) -> Dict[object, Dict[str, Optional[date]]]:
+        """Return the next pickup day of each bin at every street."""
+        after = after or date.today()
+        if not self.vectorized:
+            result = {}
+            for street in self.streets:
+                schedule = self.schedules[street]
+                result[street] = {}
+                for name in self.bins:
+                    found = schedule.next_pickup(after, [name])
+                    result[street][name] = found[0] if found else None
+            return result
+        rows = self._rows_after(after)
+        start = self.first_day + self._start_row(after)
+        result = {street: dict.fromkeys(self.bins) for street in self.streets}
+        if not len(rows):  # pylint: disable=use-implicit-booleaness-not-len
+            return result
+        for bit, name in enumerate(self.bins):
+            hits = (rows & (1 << bit)) != 0
+            found = hits.any(axis=0).tolist()
+            first = hits.argmax(axis=0).tolist()
+            for street, hit, row in zip(self.streets, found, first):
+                result[street][name] = (date.fromordinal(start + row)
+                                        if hit else None)
+        return result
+
+    def counts(self, start: Optional[date] = None,
+               end: Optional[date] = None) -> Dict[object, Dict[str, int]]:
+        """Return the number of pickups per bin from ``start`` to ``end``.
+
+        Both days are included, missing bounds mean no limit.
+        """
+        if not self.vectorized:
+            result = {}
+            for street in self.streets:
+                schedule = self.schedules[street]
+                if start or end:
+                    schedule = schedule.between(start or date.min,
+                                                end or date.max)
+                result[street] = {name: len(schedule.filter([name]))
+                                  for name in self.bins}
+            return result
+        low = 0 if start is None else max(
+            0, start.toordinal() - self.first_day)
+        high = len(self._matrix) if end is None else max(
+            0, end.toordinal() - self.first_day + 1)
+        bits = np.unpackbits(self._matrix[low:high, :, np.newaxis], axis=2,
+                             bitorder="little")
+        totals = bits.sum(axis=0, dtype=np.int64).tolist()
+        return {street: dict(zip(self.bins, row[:len(self.bins)]))
+                for street, row in zip(self.streets, totals)}
+
+    def tomorrow(self, today: Optional[date] = None,
+                 bins: Optional[Iterable[str]] = None
+                 ) -> Dict[object, List[str]]:
+        """Return the bins collected tomorrow at every street.
+
+        Streets without a pickup of ``bins`` tomorrow get an empty list.
+        """
+        day = (today or date.today()) + timedelta(days=1)
+        if not self.vectorized:
+            result = {}
+            for street in self.streets:
+                found = self.schedules[street].next_pickup(
+                    day - timedelta(days=1), bins)
+                result[street] = (found[1] if found and found[0] == day
+                                  else [])
+            return result
+        row = day.toordinal() - self.first_day
+        names = self._names_table()
+        if not 0 <= row < len(self._matrix):
+            return {street: [] for street in self.streets}
+        masks = (self._matrix[row] & self.mask(bins)).tolist()
+        return {street: list(names[mask])
+                for street, mask in zip(self.streets, masks)}
+
+    def _start_row(self, after: date) -> int:
+        """Return the first row strictly after ``after``."""
+        return min(max(0, after.toordinal() + 1 - self.first_day),
+                   len(self._matrix))
+
+    def _rows_after(self, after: date):
+        """Return the matrix rows strictly after ``after``."""
+        return self._matrix[self._start_row(after):]
+
+    def _names_table(self) -> List[Tuple[str, ...]]:
+        """Return the bin names of every possible mask."""
+        return [tuple(name for bit, name in enumerate(self.bins)
+                      if mask & (1 << bit)) for mask in range(256)]
+
+    def _build_matrix(self):
+        """Return the day by street matrix of bin bitmasks."""
+        days = [(schedule, [day for day, _ in schedule.day_masks()])
+                for schedule in self.schedules.values()]
+        ordinals = [ordinal for _, found in days for ordinal in found]
+        if not ordinals:
+            return np.zeros((0, len(self.streets)), dtype=np.uint8)
+        self.first_day = min(ordinals)
+        matrix = np.zeros((max(ordinals) - self.first_day + 1,
+                           len(self.streets)), dtype=np.uint8)
+        for col, (schedule, found) in enumerate(days):
+            if not found:
+                continue
+            table = np.array(_bit_map(schedule.bins, self.bins),
+                             dtype=np.uint8)
+            masks = np.fromiter((mask for _, mask in schedule.day_masks()),
+                                dtype=np.uint8, count=len(found))
+            matrix[np.array(found) - self.first_day, col] = table[masks]
+        return matrix
+
+
+def _bit_map(source: Sequence[str], target: Sequence[str]) -> List[int]:
+    """Return the masks over ``target`` of every mask over ``source``."""
+    moved = [1 << target.index(name) for name in source]
+    return [sum(bit for idx, bit in enumerate(moved) if mask & (1 << idx))
+            for mask in range(256)]
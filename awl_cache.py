@@ -0,0 +1,665 @@
+"""Caching helpers for the AWL schedule client.
+
+The AWL portal data changes rarely, so the client keeps local copies of
+the responses it has already seen and only goes back to the portal when
+those copies are too old.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from awl_streets import Street
+
+# a calendar month as (year, 0-based month), the way the API keys them
+Month = Tuple[int, int]
+
+
+@dataclass
+class StreetCacheEntry:
+    """A cached copy of the townarea-streets list."""
+
+    url: str
+    streets: List[Street]
+    fetched: float = field(default_factory=time.time)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_fresh(self, ttl: float) -> bool:
+        """Check if the entry is younger than ``ttl`` seconds."""
+        return time.time() - self.fetched < ttl
+
+    def validators(self) -> Dict[str, str]:
+        """Return the headers for a conditional GET of this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class StreetCache:
+    """File backed cache for the townarea-streets list."""
+
+    file_name = "awl-streets.json"
+
+    def __init__(self, cache_dir: str | pathlib.Path,
+                 ttl: float = 86400) -> None:
+        """Class initialisation steps.
+
+        :param cache_dir: directory the cache file is stored in
+        :param ttl: seconds a cached list is used without revalidation
+        """
+        self.path = pathlib.Path(cache_dir) / self.file_name
+        self.ttl = ttl
+
+    def load(self, url: str) -> Optional[StreetCacheEntry]:
+        """Load the cached list for ``url``, None if there is none."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            # no cache yet or a broken one, both mean fetch again
+            return None
+
+        if not isinstance(data, dict) or data.get("url") != url:
+            return None
+        # not needed on the cached schedule path of the command line tool
+        # pylint: disable-next=import-outside-toplevel
+        from awl_streets import Street
+        try:
+            streets = [Street.from_dict(item) for item in data["streets"]]
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+        return StreetCacheEntry(
+            url=url,
+            streets=streets,
+            fetched=data.get("fetched", 0),
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+        )
+
+    def store(self, entry: StreetCacheEntry) -> None:
+        """Write ``entry`` to the cache file."""
+        payload = {
+            "url": entry.url,
+            "fetched": entry.fetched,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "streets": [street.to_dict() for street in entry.streets],
+        }
+        try:
+            _atomic_write(self.path, json.dumps(payload))
+        except OSError as exc:
+            # the cache is an optimisation, never fail the run because of it
+            print(f"Warning: could not write street cache {self.path}: {exc}",
+                  file=sys.stderr)
+
+    def touch(self, entry: StreetCacheEntry) -> None:
+        """Mark ``entry`` as revalidated now."""
+        entry.fetched = time.time()
+        self.store(entry)
+
+    def invalidate(self) -> None:
+        """Remove the cache file."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ScheduleDiskCache:
+    """Yearly calendar responses stored as files in the cache directory.
+
+    Lets a fresh process answer schedule queries without any request,
+    one file per street and year.
+    """
+
+    def __init__(self, cache_dir: str | pathlib.Path,
+                 ttl: float = 86400) -> None:
+        """Class initialisation steps.
+
+        :param cache_dir: directory the files are stored in
+        :param ttl: seconds a stored schedule is used
+        """
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.ttl = ttl
+
+    def path(self, street, year: int) -> pathlib.Path:
+        """Return the file holding the schedule of ``street`` in ``year``."""
+        return (self.cache_dir
+                / f"awl-schedule-{street_key(street)}-{int(year)}.json")
+
+    def load(self, url: str, street, year: int) -> Optional[dict]:
+        """Return the stored schedule, None if missing or too old."""
+        found = self.load_entry(url, street, year)
+        return None if found is None else found[0]
+
+    def load_entry(self, url: str, street,
+                   year: int) -> Optional[Tuple[dict, float]]:
+        """Return the stored schedule and when it was fetched."""
+        try:
+            data = json.loads(self.path(street, year).read_text(
+                encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(data, dict) or data.get("url") != url
+                or time.time() - data.get("fetched", 0) >= self.ttl
+                or not isinstance(data.get("pickups"), dict)):
+            return None
+        return data["pickups"], data.get("fetched", 0)
+
+    def store(self, url: str, street, year: int, pickups: dict) -> None:
+        """Store the yearly schedule of ``street``."""
+        payload = {"url": url, "fetched": time.time(), "pickups": pickups}
+        try:
+            _atomic_write(self.path(street, year), json.dumps(payload))
+        except OSError as exc:
+            print(f"Warning: could not write schedule cache: {exc}",
+                  file=sys.stderr)
+
+    def invalidate(self, street=None) -> None:
+        """Remove the stored schedules of ``street``, or all of them."""
+        pattern = ("awl-schedule-"
+                   f"{'*' if street is None else street_key(street)}-*.json")
+        for path in self.cache_dir.glob(pattern):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class MonthStore:
+    """Per-month copies of a street's calendar with fetch times and hashes.
+
+    One file per street in the cache directory, used by the incremental
+    sync to decide which months to fetch again and what changed.
+    """
+
+    def __init__(self, cache_dir: str | pathlib.Path) -> None:
+        """Class initialisation steps.
+
+        :param cache_dir: directory the files are stored in
+        """
+        self.cache_dir = pathlib.Path(cache_dir)
+
+    def path(self, street) -> pathlib.Path:
+        """Return the file holding the months of ``street``."""
+        return self.cache_dir / f"awl-months-{street_key(street)}.json"
+
+    def load(self, url: str, street) -> Dict[str, dict]:
+        """Return ``{"M-YYYY": {"fetched", "hash", "days"}}``, empty if none."""
+        try:
+            data = json.loads(self.path(street).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if (not isinstance(data, dict) or data.get("url") != url
+                or not isinstance(data.get("months"), dict)):
+            return {}
+        return data["months"]
+
+    def store(self, url: str, street, months: Dict[str, dict]) -> None:
+        """Write the month records of ``street``."""
+        payload = {"url": url, "months": months}
+        try:
+            _atomic_write(self.path(street), json.dumps(payload))
+        except OSError as exc:
+            print(f"Warning: could not write month store: {exc}",
+                  file=sys.stderr)
+
+    def invalidate(self, street=None) -> None:
+        """Remove the month records of ``street``, or all of them."""
+        pattern = ("awl-months-"
+                   f"{'*' if street is None else street_key(street)}.json")
+        for path in self.cache_dir.glob(pattern):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def street_key(street) -> str:
+    """Return ``street`` as the strasseNummer used in cache file names.
+
+    :raises ValueError: if ``street`` is not a number, it would otherwise
+                        end up as part of a path
+    """
+    key = str(street)
+    if not (key.isascii() and key.isdigit()):
+        raise ValueError(f"strasseNummer must be a number, not {street!r}")
+    return key
+
+
+def month_hash(days: dict) -> str:
+    """Return a content hash of one month of a calendar response.
+
+    The bins of a day are hashed in sorted order, a reordered response
+    is not a change.
+    """
+    # only needed by the sync, keep it off the start up path
+    import hashlib  # pylint: disable=import-outside-toplevel
+    canonical = json.dumps({str(int(day)): sorted(day_bins)
+                            for day, day_bins in days.items()},
+                           sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def scope_months(year: int, month: int, scope: str) -> Tuple[Month, ...]:
+    """Return the months an API query with ``scope`` covers.
+
+    :param year: year of the start month
+    :param month: 1-based start month, as in ``datetime.month``
+    :param scope: "m", "3m" or "y", see ``get_pickup_dates``
+    """
+    if scope == "y":
+        return tuple((year, month0) for month0 in range(12))
+    count = 3 if scope == "3m" else 1
+    return tuple(divmod(year * 12 + month - 1 + offset, 12)
+                 for offset in range(count))
+
+
+def months_between(start: date, end: date) -> Tuple[Month, ...]:
+    """Return the months from ``start`` to ``end``, both included."""
+    first = start.year * 12 + start.month - 1
+    last = end.year * 12 + end.month - 1
+    return tuple(divmod(index, 12) for index in range(first, last + 1))
+
+
+def plan_queries(months: Iterable[Month]) -> List[Tuple[Month, str]]:
+    """Return the fewest calendar queries covering ``months``.
+
+    Each month is covered by a "m" query, a "3m" query starting with it,
+    or the "y" query of its year. Among plans with the fewest queries the
+    one fetching the fewest months wins.
+
+    :return: ``(start month, scope)`` pairs in month order
+    """
+    wanted = sorted(set(months))
+    count = len(wanted)
+    # best[idx] is (queries, months fetched, first query, next idx) for
+    # covering wanted[idx:]
+    best: List[tuple] = [(0, 0, None, count)] * (count + 1)
+    for idx in range(count - 1, -1, -1):
+        year, month0 = wanted[idx]
+        options = []
+        for query in (((year, month0), "m"), ((year, month0), "3m"),
+                      ((year, 0), "y")):
+            covered = set(scope_months(query[0][0], query[0][1] + 1,
+                                       query[1]))
+            after = idx
+            while after < count and wanted[after] in covered:
+                after += 1
+            options.append((best[after][0] + 1,
+                            best[after][1] + len(covered), query, after))
+        best[idx] = min(options, key=lambda option: option[:2])
+
+    queries = []
+    idx = 0
+    while idx < count:
+        queries.append(best[idx][2])
+        idx = best[idx][3]
+    return queries
+
+
+def month_key(month: Month) -> str:
+    """Return the ``"M-YYYY"`` key the API uses for ``month``."""
+    return f"{month[1]}-{month[0]}"
+
+
+def copy_pickups(pickups: dict) -> dict:
+    """Return a copy of ``pickups`` that shares no dict or list with it."""
+    return {key: {day: list(day_bins) for day, day_bins in days.items()}
+            for key, days in pickups.items()}
+
+
+def slice_months(pickups: dict, months: Iterable[Month]) -> dict:
+    """Return a copy of the part of ``pickups`` that falls into ``months``."""
+    sliced = {}
+    for month in months:
+        key = month_key(month)
+        if key in pickups:
+            sliced[key] = {day: list(day_bins)
+                           for day, day_bins in pickups[key].items()}
+    return sliced
+
+
+def merge_pickups(target: dict, pickups: dict) -> dict:
+    """Add the pickups of ``pickups`` to ``target``, skipping duplicates.
+
+    Days that change get a new list, lists of ``pickups`` are not reused.
+    """
+    for key, days in pickups.items():
+        merged = target.setdefault(key, {})
+        for day, day_bins in days.items():
+            known = merged.get(day, [])
+            merged[day] = known + [name for name in day_bins
+                                   if name not in known]
+    return target
+
+
+def trim_pickups(pickups: dict, start: date, end: date) -> dict:
+    """Return the pickups from ``start`` to ``end`` in date order."""
+    trimmed = {}
+    for item in months_between(start, end):
+        days = pickups.get(month_key(item))
+        if not days:
+            continue
+        low = start.day if item == (start.year, start.month - 1) else 1
+        high = end.day if item == (end.year, end.month - 1) else 31
+        kept = {day: days[day] for day in sorted(days, key=int)
+                if low <= int(day) <= high}
+        if kept:
+            trimmed[month_key(item)] = kept
+    return trimmed
+
+
+class _ScheduleEntry:  # pylint: disable=too-few-public-methods
+    """A cached calendar response and the months it covers."""
+
+    __slots__ = ("pickups", "months", "stored", "fetched")
+
+    def __init__(self, pickups: dict, months: Tuple[Month, ...],
+                 fetched: Optional[float] = None) -> None:
+        # callers may change what they stored or got back, keep our own
+        self.pickups = copy_pickups(pickups)
+        self.months = months
+        self.stored = time.time()
+        # when the portal sent it, older than stored if read from disk
+        self.fetched = self.stored if fetched is None else fetched
+
+
+class ScheduleCache:
+    """In-memory LRU cache for calendar responses.
+
+    Entries are keyed by ``(strasseNummer, start month, scope)``. A query
+    is answered from any cached entries of the same street that together
+    cover its months, so a cached "y" response also serves every "m" and
+    "3m" query of that year.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600) -> None:
+        """Class initialisation steps.
+
+        :param max_entries: entries kept before the least recently used
+                            one is evicted
+        :param ttl: seconds a cached response is used
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._by_street: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, street, year: int, month: int,
+            scope: str) -> Optional[dict]:
+        """Return the cached pickups for a query, None on a miss.
+
+        :param street: the strasseNummer
+        :param year: year of the start month
+        :param month: 1-based start month
+        :param scope: "m", "3m" or "y"
+        """
+        found = self.get_entry(street, year, month, scope)
+        return None if found is None else found[0]
+
+    def get_entry(self, street, year: int, month: int,
+                  scope: str) -> Optional[Tuple[dict, float]]:
+        """Return the cached pickups for a query and when they were fetched.
+
+        Takes the arguments of ``get``. If several responses make up the
+        answer, the fetch time of the oldest one is returned.
+        """
+        wanted = scope_months(year, month, scope)
+        street = str(street)
+        with self._lock:
+            sources = self._sources(street)
+            if any(item not in sources for item in wanted):
+                self.misses += 1
+                return None
+
+            pickups = {}
+            fetched = time.time()
+            for item in wanted:
+                key = sources[item]
+                self._entries.move_to_end(key)
+                entry = self._entries[key]
+                pickups.update(slice_months(entry.pickups, (item,)))
+                fetched = min(fetched, entry.fetched)
+            self.hits += 1
+            return pickups, fetched
+
+    def lookup(self, street,
+               months: Iterable[Month]) -> Tuple[dict, List[Month]]:
+        """Return the cached part of ``months`` and the months missing.
+
+        Counts a hit only if nothing is missing.
+        """
+        street = str(street)
+        with self._lock:
+            sources = self._sources(street)
+            pickups = {}
+            missing = []
+            for item in months:
+                key = sources.get(item)
+                if key is None:
+                    missing.append(item)
+                    continue
+                self._entries.move_to_end(key)
+                pickups.update(slice_months(self._entries[key].pickups,
+                                            (item,)))
+            if missing:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return pickups, missing
+
+    def put(self, street, year: int, month: int, scope: str,
+            pickups: dict) -> None:
+        """Store the pickups returned for a query."""
+        self._put((str(street), year, month, scope), _ScheduleEntry(
+            pickups, scope_months(year, month, scope)))
+
+    def put_year(self, street, year: int, pickups: dict,
+                 fetched: float) -> None:
+        """Store a yearly response the portal sent at ``fetched``."""
+        self._put((str(street), year, 1, "y"), _ScheduleEntry(
+            pickups, scope_months(year, 1, "y"), fetched))
+
+    def _put(self, key: tuple, entry: _ScheduleEntry) -> None:
+        street = key[0]
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._by_street.setdefault(street, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, street=None) -> None:
+        """Drop the cached responses of ``street``, or all of them."""
+        with self._lock:
+            if street is None:
+                self._entries.clear()
+                self._by_street.clear()
+                return
+            for key in list(self._by_street.get(str(street), ())):
+                self._drop(key)
+
+    def _sources(self, street: str) -> Dict[Month, tuple]:
+        """Map each month cached for ``street`` to the entry holding it."""
+        now = time.time()
+        live = []
+        for key in list(self._by_street.get(street, ())):
+            entry = self._entries[key]
+            if now - entry.stored >= self.ttl:
+                self._drop(key)
+            else:
+                live.append((entry.stored, key))
+
+        # the newest response wins where entries overlap
+        sources: Dict[Month, tuple] = {}
+        for _, key in sorted(live, reverse=True):
+            for item in self._entries[key].months:
+                sources.setdefault(item, key)
+        return sources
+
+    def _drop(self, key: tuple) -> None:
+        del self._entries[key]
+        keys = self._by_street[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_street[key[0]]
+
+
+class _Call:  # pylint: disable=too-few-public-methods
+    """A call in flight and its outcome."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce identical calls that are in flight at the same time.
+
+    The first caller of a key runs the call, callers that arrive before
+    it finishes wait for it and get the same result or exception.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.shared = 0
+        self._calls: Dict[object, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Return ``func()``, shared with concurrent callers of ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of calls made and of calls deduplicated."""
+        return {"calls": self.calls, "shared": self.shared}
+
+
+class BackgroundRefresh:
+    """Run refreshes on a daemon worker thread, one per key at a time.
+
+    ``submit`` returns at once. A key that is already waiting or running
+    is not queued again, so many readers of the same stale schedule cause
+    a single refresh. The thread is started by the first ``submit``.
+    """
+
+    def __init__(self) -> None:
+        self.runs = 0
+        self.failed = 0
+        self._pending: set = set()
+        self._queue = None
+        self._idle = threading.Event()
+        self._idle.set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, func) -> bool:
+        """Queue ``func()`` unless a refresh of ``key`` is pending.
+
+        :return: True if ``func`` was queued
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            self._idle.clear()
+            if self._queue is None:
+                # pylint: disable-next=import-outside-toplevel
+                import queue
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._run, name="awl-refresh",
+                                 daemon=True).start()
+            self._queue.put((key, func))
+        return True
+
+    def pending(self) -> int:
+        """Return the number of refreshes waiting or running."""
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until no refresh is pending, False on timeout."""
+        return self._idle.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            key, func = self._queue.get()
+            try:
+                func()
+            except Exception as exc:  # pylint: disable=broad-except
+                self.failed += 1
+                # the stale copy keeps being served, try again next time
+                print(f"Warning: background refresh of {key} failed: {exc}",
+                      file=sys.stderr)
+            finally:
+                with self._lock:
+                    self.runs += 1
+                    self._pending.discard(key)
+                    if not self._pending:
+                        self._idle.set()
+
+
+def _atomic_write(path: pathlib.Path, text: str) -> None:
+    """Replace ``path`` with ``text`` without exposing partial writes."""
+    # only needed when writing, keep it off the start up path
+    import tempfile  # pylint: disable=import-outside-toplevel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent),
+                                    prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
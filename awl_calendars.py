@@ -0,0 +1,210 @@
+"""Identical street calendars, stored once.
+
+Every street of a collection district gets the same calendar, so the
+yearly responses of a whole city are mostly copies. ``CalendarStore``
+hashes each response in a normalized form, keeps one read-only copy per
+distinct calendar and maps every strasseNummer to the id of its
+calendar. The streets sharing an id are a district, work that only
+depends on the calendar can be done once per district::
+
+    calendars = CalendarStore()
+    for number in numbers:
+        calendars.add(number, client.get_pickup_dates(scope="y",
+                                                      street=number))
+    next_pickups = calendars.per_district(
+        lambda schedule: schedule.next_pickup())
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from types import MappingProxyType
+from typing import (Callable, Dict, Iterable, List, Mapping, Optional,
+                    Sequence, Tuple, TypeVar)
+
+from awl_pickups import DEFAULT_BINS, PickupSchedule
+
+Result = TypeVar("Result")
+
+# characters of the hex digest used as calendar id
+ID_LENGTH = 16
+
+
+def normalize_pickups(pickups: dict) -> dict:
+    """Return ``pickups`` in the form calendars are compared in.
+
+    Months are in date order, days in numeric order without leading
+    zeros and the bins of a day sorted without duplicates. Days without
+    bins and months without days are dropped.
+    """
+    normalized = {}
+    for month_year in sorted(pickups, key=_month_order):
+        days = {str(int(day)): sorted(set(day_bins))
+                for day, day_bins in pickups[month_year].items()
+                if day_bins}
+        if days:
+            normalized[month_year] = {day: days[day]
+                                      for day in sorted(days, key=int)}
+    return normalized
+
+
+def calendar_id(pickups: dict) -> str:
+    """Return the content address of a calendar response."""
+    return _digest(normalize_pickups(pickups))
+
+
+class CalendarStore:
+    """Calendar responses of many streets, one shared copy per calendar.
+
+    The copies are read-only mappings of month to day to a tuple of bins,
+    in the normalized order of ``normalize_pickups``.
+    """
+
+    def __init__(self, bins: Sequence[str] = DEFAULT_BINS) -> None:
+        """Class initialisation steps.
+
+        :param bins: bin order of the PickupSchedule of each calendar
+        """
+        self.bins = tuple(bins)
+        self._calendars: Dict[str, Mapping] = {}
+        self._schedules: Dict[str, PickupSchedule] = {}
+        self._streets: Dict[str, str] = {}
+        self._districts: Dict[str, List[str]] = {}
+        # every day with the same bins shares one tuple
+        self._bin_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store) -> CalendarStore:
+        """Return the calendars of every fetched street of a store file."""
+        calendars = cls(store.bins)
+        for number in store.street_numbers():
+            if store.is_fetched(number):
+                calendars.add(number, store.schedule(number).to_pickups())
+        return calendars
+
+    def __len__(self) -> int:
+        """Return the number of distinct calendars."""
+        return len(self._calendars)
+
+    def __contains__(self, street) -> bool:
+        return str(street) in self._streets
+
+    def add(self, street, pickups: dict) -> str:
+        """Store the calendar of ``street``, return its id.
+
+        A street that is added again moves to its new calendar, calendars
+        no street uses any more are dropped.
+        """
+        street = str(street)
+        normalized = normalize_pickups(pickups)
+        key = _digest(normalized)
+        with self._lock:
+            if self._streets.get(street) == key:
+                return key
+            self._discard(street)
+            if key not in self._calendars:
+                self._calendars[key] = self._freeze(normalized)
+            self._streets[street] = key
+            self._districts.setdefault(key, []).append(street)
+        return key
+
+    def discard(self, street) -> None:
+        """Forget the calendar of ``street`` if it has one."""
+        with self._lock:
+            self._discard(str(street))
+
+    def calendar_id(self, street) -> str:
+        """Return the calendar id of ``street``, KeyError if unknown."""
+        return self._streets[str(street)]
+
+    def pickups(self, street) -> Mapping:
+        """Return the shared read-only calendar of ``street``."""
+        return self._calendars[self.calendar_id(street)]
+
+    def schedule(self, street) -> PickupSchedule:
+        """Return the shared PickupSchedule of ``street``."""
+        return self.calendar_schedule(self.calendar_id(street))
+
+    def calendar_schedule(self, key: str) -> PickupSchedule:
+        """Return the PickupSchedule of calendar ``key``, built once."""
+        schedule = self._schedules.get(key)
+        if schedule is None:
+            schedule = PickupSchedule.from_pickups(self._calendars[key],
+                                                   self.bins)
+            self._schedules[key] = schedule
+        return schedule
+
+    def calendars(self) -> Dict[str, Mapping]:
+        """Return calendar id to the shared calendar."""
+        with self._lock:
+            return dict(self._calendars)
+
+    def districts(self) -> Dict[str, List[str]]:
+        """Return calendar id to the streets sharing it, largest first."""
+        with self._lock:
+            grouped = {key: list(streets)
+                       for key, streets in self._districts.items()}
+        return dict(sorted(grouped.items(),
+                           key=lambda item: (-len(item[1]), item[0])))
+
+    def district(self, street) -> List[str]:
+        """Return the streets with the same calendar as ``street``."""
+        with self._lock:
+            return list(self._districts[self._streets[str(street)]])
+
+    def per_district(self, func: Callable[[PickupSchedule], Result],
+                     streets: Optional[Iterable] = None
+                     ) -> Dict[str, Result]:
+        """Call ``func`` once per calendar, return its result per street.
+
+        :param func: called with the PickupSchedule of each calendar
+        :param streets: Optional streets to answer for, all by default
+        """
+        with self._lock:
+            wanted = (dict(self._streets) if streets is None
+                      else {str(street): self._streets[str(street)]
+                            for street in streets})
+        results: Dict[str, Result] = {}
+        for key in set(wanted.values()):
+            results[key] = func(self.calendar_schedule(key))
+        return {street: results[key] for street, key in wanted.items()}
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of streets and of distinct calendars."""
+        with self._lock:
+            return {"streets": len(self._streets),
+                    "calendars": len(self._calendars)}
+
+    def _freeze(self, normalized: dict) -> Mapping:
+        months = {}
+        for month_year, days in normalized.items():
+            months[month_year] = MappingProxyType({
+                day: self._bin_tuples.setdefault(tuple(names), tuple(names))
+                for day, names in days.items()})
+        return MappingProxyType(months)
+
+    def _discard(self, street: str) -> None:
+        key = self._streets.pop(street, None)
+        if key is None:
+            return
+        district = self._districts[key]
+        district.remove(street)
+        if not district:
+            del self._districts[key]
+            del self._calendars[key]
+            self._schedules.pop(key, None)
+
+
+def _digest(normalized: dict) -> str:
+    """Return the calendar id of a normalized calendar."""
+    canonical = json.dumps(normalized, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:ID_LENGTH]
+
+
+def _month_order(month_year: str) -> Tuple[int, int]:
+    """Sort key of a ``"M-YYYY"`` month key."""
+    month, year = month_year.split("-")
+    return int(year), int(month)
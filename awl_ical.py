@@ -0,0 +1,208 @@
+"""iCalendar feeds of pickup schedules.
+
+``export_feeds`` turns a schedule store written by ``crawl`` into one
+``.ics`` feed per street and bin type. Streets are split across a process
+pool, every worker maps the store itself, and feeds are written line by
+line as they are generated. A feed is only replaced when its content
+changed, so unchanged files keep their modification time and calendar
+clients that poll with ``If-Modified-Since`` see nothing new.
+
+Schedules come from the store because a whole-city export should not
+depend on thousands of portal requests, run ``crawl`` first.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import os
+import pathlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import (Callable, Iterable, Iterator, List, Optional, Sequence,
+                    Tuple)
+
+from awl_pickups import PickupSchedule
+from awl_store import ScheduleStore
+
+PRODID = "-//awlSchedule//AWL Neuss Abfallkalender//DE"
+# longest content line in octets, longer ones are folded (RFC 5545 3.1)
+LINE_LIMIT = 75
+ONE_DAY = timedelta(days=1)
+
+
+def feed_name(street: int, bin_name: str) -> str:
+    """Return the file name of the feed of ``bin_name`` at ``street``."""
+    return f"awl-{street}-{bin_name}.ics"
+
+
+def iter_calendar(schedule: PickupSchedule, bin_name: str, street: int,
+                  street_name: str) -> Iterator[str]:
+    """Yield the iCalendar feed of one bin at one street in pieces.
+
+    Every pickup is an all-day event, yielded as one piece. The output
+    only depends on the schedule, ``DTSTAMP`` is derived from the pickup
+    day instead of the clock, so an unchanged schedule gives a byte
+    identical feed.
+    """
+    yield ("BEGIN:VCALENDAR\r\n"
+           "VERSION:2.0\r\n"
+           f"PRODID:{PRODID}\r\n"
+           "CALSCALE:GREGORIAN\r\n"
+           + _line(f"X-WR-CALNAME:{_escape(f'AWL {bin_name} {street_name}')}"))
+    tail = (_line(f"SUMMARY:{_escape(f'Abfuhr {bin_name}')}")
+            + _line(f"LOCATION:{_escape(street_name)}")
+            + "TRANSP:TRANSPARENT\r\n"
+            "END:VEVENT\r\n")
+    uid = f"{street}-{bin_name}@awl-neuss\r\n"
+    for ordinal, _ in schedule.filter([bin_name]).day_masks():
+        stamp, next_stamp = _stamps(ordinal)
+        yield (f"BEGIN:VEVENT\r\n"
+               f"UID:{stamp}-{uid}"
+               f"DTSTAMP:{stamp}T000000Z\r\n"
+               f"DTSTART;VALUE=DATE:{stamp}\r\n"
+               f"DTEND;VALUE=DATE:{next_stamp}\r\n"
+               + tail)
+    yield "END:VCALENDAR\r\n"
+
+
+def write_feed(path: pathlib.Path,
+               generate: Callable[[], Iterable[str]]) -> bool:
+    """Write the feed ``generate()`` yields unless ``path`` already has it.
+
+    The feed is generated twice rather than held in memory: once to hash
+    it against the file, and once more into a temporary file that
+    replaces ``path`` if the hashes differ.
+
+    :return: True if ``path`` was written
+    """
+    digest = hashlib.sha256()
+    for piece in generate():
+        digest.update(piece.encode("utf-8"))
+    if _file_digest(path) == digest.digest():
+        return False
+
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent),
+                                    prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as handle:
+            handle.writelines(generate())
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+    return True
+
+
+def export_streets(store_path: str, output: str, numbers: Sequence[int],
+                   bins: Optional[Sequence[str]] = None) -> Tuple[int, int]:
+    """Write the feeds of ``numbers``, the work of one pool worker.
+
+    :return: the number of feeds written and of feeds left unchanged
+    """
+    written = unchanged = 0
+    directory = pathlib.Path(output)
+    with ScheduleStore(store_path) as store:
+        for number in numbers:
+            if not store.is_fetched(number):
+                continue
+            schedule = store.schedule(number)
+            name = store.street_name(number)
+            for bin_name in bins or store.bins:
+                if write_feed(directory / feed_name(number, bin_name),
+                              functools.partial(iter_calendar, schedule,
+                                                bin_name, number, name)):
+                    written += 1
+                else:
+                    unchanged += 1
+    return written, unchanged
+
+
+def export_feeds(store_path: str | pathlib.Path, output: str | pathlib.Path,
+                 bins: Optional[Sequence[str]] = None,
+                 workers: Optional[int] = None) -> Tuple[int, int]:
+    """Write the feeds of every street in a schedule store.
+
+    :param store_path: store file written by ``crawl``
+    :param output: directory the feeds are written to
+    :param bins: Optional bin types, all bins of the store if not given
+    :param workers: processes to use, one per CPU if not given, 1 runs
+                    everything in this process
+    :return: the number of feeds written and of feeds left unchanged
+    """
+    store_path = str(store_path)
+    pathlib.Path(output).mkdir(parents=True, exist_ok=True)
+    with ScheduleStore(store_path) as store:
+        numbers = list(store.street_numbers())
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return export_streets(store_path, str(output), numbers, bins)
+
+    # a few chunks per worker even out streets with many pickups
+    size = max(1, len(numbers) // (workers * 4))
+    chunks = [numbers[pos:pos + size] for pos in range(0, len(numbers), size)]
+    written = unchanged = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, same in pool.map(export_streets,
+                                   [store_path] * len(chunks),
+                                   [str(output)] * len(chunks), chunks,
+                                   [bins] * len(chunks)):
+            written += done
+            unchanged += same
+    return written, unchanged
+
+
+def run_export(store_path: str, output: str, bins: Optional[List[str]],
+               workers: Optional[int]) -> None:
+    """Export the feeds of a schedule store and print a summary."""
+    written, unchanged = export_feeds(store_path, output, bins, workers)
+    print(f"Wrote {written} feeds to {output}, {unchanged} unchanged")
+
+
+def _file_digest(path: pathlib.Path) -> Optional[bytes]:
+    """Return the SHA-256 of the file at ``path``, None if missing."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(65536), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.digest()
+
+
+@functools.lru_cache(maxsize=1024)
+def _stamps(ordinal: int) -> Tuple[str, str]:
+    """Return the DATE values of a day and the day after it."""
+    # every feed of the city shares the same few hundred days
+    day = date.fromordinal(ordinal)
+    return f"{day:%Y%m%d}", f"{day + ONE_DAY:%Y%m%d}"
+
+
+def _escape(text: str) -> str:
+    """Escape a TEXT property value."""
+    return (text.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _line(content: str) -> str:
+    """Return a content line, folded at ``LINE_LIMIT`` octets."""
+    data = content.encode("utf-8")
+    if len(data) <= LINE_LIMIT:
+        return content + "\r\n"
+    parts = []
+    start = 0
+    limit = LINE_LIMIT
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # never split a multi-byte character
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start = end
+        # continuation lines start with a space
+        limit = LINE_LIMIT - 1
+    return "\r\n ".join(parts) + "\r\n"
@@ -0,0 +1,192 @@
+"""Adaptive rate limiting of the portal requests.
+
+Bulk jobs like ``crawl`` ask the portal for thousands of schedules. Too
+many requests get them throttled, too few make them slow. ``AdaptiveLimiter``
+sits under ``AWLScheduleClient._send`` and keeps two limits:
+
+* a ``TokenBucket`` for the requests started per second, and
+* the number of requests in flight.
+
+Both follow AIMD like TCP congestion control: every good response raises
+them a little, a 429, a 5xx, a failed connection or a response slower
+than the latency target cuts them in half. Only requests sent after the
+last cut can cut again, so one overload is not punished once per request
+that was already in flight. Callers use ``acquire`` and ``release``
+around each request. ``AsyncAWLScheduleClient`` sends its requests from
+worker threads, so coroutines are limited the same way without blocking
+the event loop.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+
+# factor both limits are cut by on overload
+DECREASE = 0.5
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """Requests per second with bursts up to ``burst`` requests."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        """Class initialisation steps.
+
+        :param rate: tokens added per second
+        :param burst: most tokens held, ``rate`` by default
+        """
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, return the seconds to wait before using it.
+
+        Tokens may be taken ahead, the balance goes negative and the
+        callers queue up one ``1 / rate`` apart.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens
+                               + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class AdaptiveLimiter:  # pylint: disable=too-many-instance-attributes
+    """AIMD controlled request rate and concurrency, see the module doc."""
+
+    def __init__(self, rate: float, concurrency: int,
+                 latency_target: float = 2.0, min_rate: float = 0.5,
+                 increase: float = 5.0) -> None:
+        """Class initialisation steps.
+
+        :param rate: most requests started per second, the starting rate
+        :param concurrency: most requests in flight, the starting limit
+        :param latency_target: seconds above which a response counts as
+                               a sign of overload
+        :param min_rate: the rate is never cut below this
+        :param increase: requests per second the rate grows by for every
+                         second of good responses
+        """
+        self.max_rate = rate
+        self.max_limit = max(1, concurrency)
+        self.min_rate = min(min_rate, rate)
+        self.latency_target = latency_target
+        self.increase = increase
+        self.bucket = TokenBucket(rate, self.max_limit)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.slow = 0
+        self.cuts = 0
+        self.latency_total = 0.0
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        """The current requests per second."""
+        return self.bucket.rate
+
+    def acquire(self) -> float:
+        """Wait for a free slot and a token, return the start time.
+
+        Pass the start time to ``release`` when the response is in.
+        """
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        delay = self.bucket.reserve()
+        if delay:
+            time.sleep(delay)
+        return self._started()
+
+    def release(self, started: float, status: Optional[int] = None) -> None:
+        """Free the slot taken at ``started`` and adapt the limits.
+
+        :param started: the value ``acquire`` returned
+        :param status: the HTTP status, None if the request failed
+                       without a response
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self.latency_total += latency
+            self._last = now
+            if status == 429:
+                self.throttled += 1
+            elif status is None or status >= 500:
+                self.errors += 1
+            elif latency > self.latency_target:
+                self.slow += 1
+            else:
+                # one more slot per window of ``limit`` good responses,
+                # ``increase`` more requests per second of them
+                self.limit = min(float(self.max_limit),
+                                 self.limit + 1 / self.limit)
+                self.bucket.rate = min(self.max_rate, self.bucket.rate
+                                       + self.increase / self.bucket.rate)
+                self._cond.notify_all()
+                return
+            if started >= self._last_cut:
+                self.limit = max(1.0, self.limit * DECREASE)
+                self.bucket.rate = max(self.min_rate,
+                                       self.bucket.rate * DECREASE)
+                self._last_cut = now
+                self.cuts += 1
+            self._cond.notify_all()
+
+    def throughput(self) -> float:
+        """Return the requests per second achieved so far."""
+        with self._cond:
+            if self._first is None or self._last is None:
+                return 0.0
+            elapsed = self._last - self._first
+            return self.requests / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """Return the counters, the current limits and the throughput."""
+        throughput = self.throughput()
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "slow": self.slow,
+                "cuts": self.cuts,
+                "in_flight": self.in_flight,
+                "limit": int(self.limit),
+                "rate": self.bucket.rate,
+                "latency": (self.latency_total / self.requests
+                            if self.requests else 0.0),
+                "throughput": throughput,
+            }
+
+    def report(self) -> str:
+        """Return a one line summary of ``stats``."""
+        stats = self.stats()
+        return (f"{stats['requests']} requests at "
+                f"{stats['throughput']:.1f}/s, {stats['throttled']} "
+                f"throttled, {stats['errors']} failed, limits now "
+                f"{stats['limit']} in flight and {stats['rate']:.1f}/s")
+
+    def _started(self) -> float:
+        now = time.monotonic()
+        with self._cond:
+            if self._first is None:
+                self._first = now
+        return now
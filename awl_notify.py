@@ -0,0 +1,255 @@
+"""Telegram reminders the day before a pickup.
+
+``NotificationDaemon`` keeps one timer per subscriber in a heap and
+sleeps until the earliest one is due, so an idle daemon uses no CPU no
+matter how many subscribers it serves. Schedules are fetched once per
+street and shared by every subscriber of that street.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import pathlib
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from datetime import time as day_time
+from typing import (TYPE_CHECKING, Callable, Dict, Iterable, List, Optional,
+                    Tuple)
+
+import requests
+
+from awl_pickups import PickupSchedule
+
+if TYPE_CHECKING:
+    from awl_schedule import AWLScheduleClient
+
+TELEGRAM_URL = "https://api.telegram.org/bot{token}/sendMessage"
+
+
+@dataclass
+class Subscriber:
+    """A chat that wants reminders for some bins of a street."""
+
+    chat_id: str
+    street: str
+    bins: Optional[List[str]] = None
+    # local time on the day before the pickup the reminder is sent
+    notify_at: day_time = field(default_factory=lambda: day_time(18, 0))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Subscriber:
+        """Create a subscriber from its JSON representation."""
+        notify_at = data.get("notify_at")
+        return cls(
+            chat_id=str(data["chat_id"]),
+            street=str(data["strasseNummer"]),
+            bins=data.get("bins"),
+            notify_at=(day_time.fromisoformat(notify_at) if notify_at
+                       else day_time(18, 0)),
+        )
+
+
+def load_subscribers(path: str | pathlib.Path) -> List[Subscriber]:
+    """Load the subscribers from a JSON list."""
+    data = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+    return [Subscriber.from_dict(entry) for entry in data]
+
+
+class TelegramSender:  # pylint: disable=too-few-public-methods
+    """Send messages through the Telegram bot API."""
+
+    def __init__(self, token: str,
+                 session: Optional[requests.Session] = None) -> None:
+        """Class initialisation steps.
+
+        :param token: the bot token
+        :param session: Optional HTTP session to send with
+        """
+        self.url = TELEGRAM_URL.format(token=token)
+        self.session = session or requests.Session()
+
+    def send(self, chat_id: str, text: str) -> None:
+        """Send ``text`` to ``chat_id``."""
+        response = self.session.post(
+            self.url, json={"chat_id": chat_id, "text": text}, timeout=30)
+        response.raise_for_status()
+
+
+class PrintSender:  # pylint: disable=too-few-public-methods
+    """Print messages instead of sending them, for dry runs."""
+
+    def send(self, chat_id: str, text: str) -> None:
+        """Print ``text`` for ``chat_id``."""
+        print(f"[{chat_id}] {text}")
+
+
+def reminder_text(day: date, bins: Iterable[str]) -> str:
+    """Return the reminder message for a pickup on ``day``."""
+    return f"Morgen ({day:%d.%m.%Y}) wird abgeholt: {', '.join(bins)}"
+
+
+class NotificationDaemon:  # pylint: disable=too-many-instance-attributes
+    """Timer driven reminder loop for many subscribers.
+
+    ``sender`` is any object with a ``send(chat_id, text)`` method,
+    ``clock`` returns the current time in seconds since the epoch.
+    """
+
+    def __init__(self, client: AWLScheduleClient, sender,
+                 subscribers: Iterable[Subscriber] = (),
+                 refresh_interval: float = 86400,
+                 max_sleep: float = 3600) -> None:
+        """Class initialisation steps.
+
+        :param client: client used to fetch the schedules
+        :param sender: the message sender
+        :param subscribers: Optional initial subscribers
+        :param refresh_interval: seconds a street schedule is trusted
+        :param max_sleep: longest sleep, bounds the effect of clock jumps
+        """
+        self.client = client
+        self.sender = sender
+        self.refresh_interval = refresh_interval
+        self.max_sleep = max_sleep
+        self.sent = 0
+        self.clock: Callable[[], float] = time.time
+        self._schedules: Dict[str, Tuple[float, PickupSchedule]] = {}
+        self._timers: list = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        for subscriber in subscribers:
+            self.add(subscriber)
+
+    def add(self, subscriber: Subscriber) -> None:
+        """Start sending reminders to ``subscriber``.
+
+        The first timer is planned by the ``run`` loop, so subscribers can
+        be added from any thread.
+        """
+        with self._lock:
+            heapq.heappush(self._timers, (self.clock(), next(self._counter),
+                                          subscriber, None))
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        """Make ``run`` return."""
+        self._stopped = True
+        self._wakeup.set()
+
+    def run(self) -> None:
+        """Send reminders until ``stop`` is called."""
+        while not self._stopped:
+            self.run_pending()
+            with self._lock:
+                due = self._timers[0][0] if self._timers else None
+            wait = self.max_sleep
+            if due is not None:
+                wait = min(max(due - self.clock(), 0), self.max_sleep)
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def run_pending(self) -> int:
+        """Handle every timer that is due, return the number handled."""
+        handled = 0
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > self.clock():
+                    return handled
+                _, _, subscriber, day = heapq.heappop(self._timers)
+            now = datetime.fromtimestamp(self.clock())
+            if day is not None:
+                self._notify(subscriber, day)
+            self._plan(subscriber, now, after=day)
+            handled += 1
+
+    def _notify(self, subscriber: Subscriber, day: date) -> None:
+        """Send the reminder for ``day`` if the pickup still exists."""
+        try:
+            schedule = self._schedule(subscriber.street)
+        except (requests.RequestException, RuntimeError) as exc:
+            print(f"Warning: schedule for {subscriber.street} failed: {exc}")
+            return
+        found = schedule.next_pickup(day - timedelta(days=1),
+                                     subscriber.bins)
+        if found is None or found[0] != day:
+            # the calendar changed since the timer was planned
+            return
+        try:
+            self.sender.send(subscriber.chat_id,
+                             reminder_text(day, found[1]))
+            self.sent += 1
+        except requests.RequestException as exc:
+            print(f"Warning: reminder to {subscriber.chat_id} failed: {exc}")
+
+    def _plan(self, subscriber: Subscriber, now: datetime,
+              after: Optional[date] = None) -> None:
+        """Push the next timer of ``subscriber``."""
+        after = max(after or now.date(), now.date())
+        day = None
+        due = now + timedelta(seconds=self.refresh_interval)
+        try:
+            schedule = self._schedule(subscriber.street)
+        except (requests.RequestException, RuntimeError) as exc:
+            print(f"Warning: schedule for {subscriber.street} failed: {exc}")
+            schedule = PickupSchedule()
+        while True:
+            found = schedule.next_pickup(after, subscriber.bins)
+            if found is None:
+                # nothing known yet, look again after the next refresh
+                break
+            instant = datetime.combine(found[0] - timedelta(days=1),
+                                       subscriber.notify_at)
+            if instant > now:
+                day, due = found[0], instant
+                break
+            after = found[0]
+
+        with self._lock:
+            heapq.heappush(self._timers, (due.timestamp(),
+                                          next(self._counter),
+                                          subscriber, day))
+
+    def _schedule(self, street: str) -> PickupSchedule:
+        """Return the schedule of ``street`` for the next three months.
+
+        A schedule older than ``refresh_interval`` is fetched again, the
+        old one is kept if that fails.
+        """
+        cached = self._schedules.get(street)
+        if cached is not None and self.clock() - cached[0] < self.refresh_interval:
+            return cached[1]
+        if cached is not None:
+            self.client.invalidate_schedule(street)
+        try:
+            schedule = self.client.get_schedule(scope="3m", street=street)
+        except (requests.RequestException, RuntimeError) as exc:
+            if cached is None:
+                raise
+            print(f"Warning: refreshing {street} failed: {exc}")
+            return cached[1]
+        self._schedules[street] = (self.clock(), schedule)
+        return schedule
+
+
+def run_daemon(client: AWLScheduleClient, subscribers_path: str,
+               dry_run: bool = False) -> None:
+    """Run the reminder daemon for the subscribers in a JSON file."""
+    if dry_run:
+        sender = PrintSender()
+    elif client.config.telegram_token:
+        sender = TelegramSender(client.config.telegram_token)
+    else:
+        raise RuntimeError("TELEGRAM_TOKEN is missing in the configuration")
+
+    daemon = NotificationDaemon(client, sender,
+                                load_subscribers(subscribers_path))
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
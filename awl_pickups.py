@@ -0,0 +1,185 @@
+"""Compact, indexed representation of a pickup schedule.
+
+The calendar API answers with nested dicts of the form
+``{"M-YYYY": {"D": ["bin", ...]}}`` where ``M`` is the 0-based month.
+``PickupSchedule`` parses that once into sorted day ordinals plus a bin
+bitmask per day, so lookups are bisects and bit operations instead of
+walks over the nested dicts.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BINS = ("blau", "braun", "gelb", "grau", "pink")
+
+
+class PickupSchedule:
+    """Sorted pickup days with one bin bitmask per day.
+
+    Bit ``i`` of a day mask is set when ``bins[i]`` is collected on that
+    day. Instances are immutable, all queries return new schedules.
+    """
+
+    __slots__ = ("bins", "_bits", "_days", "_masks", "_by_bin")
+
+    def __init__(self, days: Iterable[int] = (), masks: Iterable[int] = (),
+                 bins: Sequence[str] = DEFAULT_BINS) -> None:
+        """Class initialisation steps.
+
+        :param days: sorted ``date.toordinal()`` values
+        :param masks: the bin bitmask of each day
+        :param bins: bin names in bit order, at most 8
+        """
+        if len(bins) > 8:
+            raise ValueError("PickupSchedule supports at most 8 bin types")
+        self.bins = tuple(bins)
+        self._bits = {name: 1 << idx for idx, name in enumerate(self.bins)}
+        self._days = array("l", days)
+        self._masks = array("B", masks)
+        if len(self._days) != len(self._masks):
+            raise ValueError("days and masks must have the same length")
+        self._by_bin: Optional[List[array]] = None
+
+    @classmethod
+    def from_pickups(cls, pickups: dict,
+                     bins: Sequence[str] = DEFAULT_BINS) -> PickupSchedule:
+        """Build a schedule from an API response.
+
+        Bin types that are not in ``bins`` get the next free bits.
+
+        :param pickups: the ``{"M-YYYY": {"D": [bins]}}`` API response
+        :param bins: the known bin types, usually ``config.waste_bins``
+        """
+        names = list(bins)
+        entries = _day_masks(pickups, names)
+        ordered = sorted(entries)
+        return cls(ordered, (entries[day] for day in ordered), names)
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def __iter__(self) -> Iterator[Tuple[date, List[str]]]:
+        for ordinal, mask in zip(self._days, self._masks):
+            yield date.fromordinal(ordinal), self._names(mask)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PickupSchedule):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def day_masks(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over ``(day ordinal, bin bitmask)`` pairs."""
+        return zip(self._days, self._masks)
+
+    def mask(self, bins: Optional[Iterable[str]] = None) -> int:
+        """Return the bitmask of ``bins``, all known bins for None."""
+        if bins is None:
+            return (1 << len(self.bins)) - 1
+        mask = 0
+        for name in bins:
+            mask |= self._bits.get(name, 0)
+        return mask
+
+    def next_pickup(self, after: Optional[date] = None,
+                    bins: Optional[Iterable[str]] = None
+                    ) -> Optional[Tuple[date, List[str]]]:
+        """Return the first pickup day strictly after ``after``.
+
+        :param after: Optional day to search from, defaults to today
+        :param bins: Optional bin types the day must contain one of
+        :return: ``(date, [bins])`` with the requested bins of that day
+        """
+        after = (after or date.today()).toordinal()
+        wanted = self.mask(bins)
+        if bins is None:
+            idx = bisect_right(self._days, after)
+        else:
+            # one bisect per bin in the per-bin day lists
+            idx = len(self._days)
+            for bit, days in enumerate(self._bin_days()):
+                if wanted & (1 << bit):
+                    pos = bisect_right(days, after)
+                    if pos < len(days):
+                        idx = min(idx, bisect_left(self._days, days[pos]))
+        if idx >= len(self._days):
+            return None
+        return (date.fromordinal(self._days[idx]),
+                self._names(self._masks[idx] & wanted))
+
+    def filter(self, bins: Iterable[str]) -> PickupSchedule:
+        """Return the schedule of ``bins`` only."""
+        wanted = self.mask(bins)
+        days = array("l")
+        masks = array("B")
+        for ordinal, mask in zip(self._days, self._masks):
+            if mask & wanted:
+                days.append(ordinal)
+                masks.append(mask & wanted)
+        return PickupSchedule(days, masks, self.bins)
+
+    def between(self, start: date, end: date) -> PickupSchedule:
+        """Return the pickups from ``start`` to ``end``, both included."""
+        low = bisect_left(self._days, start.toordinal())
+        high = bisect_right(self._days, end.toordinal())
+        return PickupSchedule(self._days[low:high], self._masks[low:high],
+                              self.bins)
+
+    def to_pickups(self) -> dict:
+        """Convert back to the ``{"M-YYYY": {"D": [bins]}}`` API shape."""
+        pickups: dict = {}
+        for day, names in self:
+            key = f"{day.month - 1}-{day.year}"
+            pickups.setdefault(key, {})[str(day.day)] = names
+        return pickups
+
+    def next_pickup_dict(self, after: Optional[date] = None,
+                         bins: Optional[Iterable[str]] = None
+                         ) -> Optional[dict]:
+        """Return ``next_pickup`` in the shape of filter_next_available_day."""
+        found = self.next_pickup(after, bins)
+        if found is None:
+            return None
+        day, names = found
+        return {f"{day.month - 1}-{day.year}": {str(day.day): names}}
+
+    def _names(self, mask: int) -> List[str]:
+        return [name for idx, name in enumerate(self.bins)
+                if mask & (1 << idx)]
+
+    def _bin_days(self) -> List[array]:
+        """Return the sorted day ordinals of every bin, built on first use."""
+        if self._by_bin is None:
+            by_bin = [array("l") for _ in self.bins]
+            for ordinal, mask in zip(self._days, self._masks):
+                for bit, days in enumerate(by_bin):
+                    if mask & (1 << bit):
+                        days.append(ordinal)
+            self._by_bin = by_bin
+        return self._by_bin
+
+
+def _day_masks(pickups: dict, names: List[str]) -> Dict[int, int]:
+    """Map the day ordinals of an API response to bin bitmasks.
+
+    Bin types missing from ``names`` are appended to it.
+    """
+    bits = {name: 1 << idx for idx, name in enumerate(names)}
+    entries: Dict[int, int] = {}
+    for month_year, days in pickups.items():
+        month, year = map(int, month_year.split('-'))
+        first = date(year, month + 1, 1).toordinal() - 1
+        for day, day_bins in days.items():
+            mask = 0
+            for name in day_bins:
+                if name not in bits:
+                    names.append(name)
+                    bits[name] = 1 << (len(names) - 1)
+                mask |= bits[name]
+            if mask:
+                ordinal = first + int(day)
+                entries[ordinal] = entries.get(ordinal, 0) | mask
+    return entries
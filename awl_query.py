@@ -0,0 +1,280 @@
+"""Schedule queries for scripts and pipelines.
+
+Runs one query for any number of streets and writes a record per pickup
+day, or per street with ``--next``, as soon as the street's schedule is
+in::
+
+    awl_schedule.py --street 1000 --street 1001 --bins gelb --format csv
+    cut -d, -f1 streets.csv | awl_schedule.py --street - --next \\
+        --format ndjson --concurrency 16
+
+Records are ``{"strasseNummer": ..., "date": "YYYY-MM-DD", "bins": [...]}``,
+a street that failed gets ``{"strasseNummer": ..., "error": "..."}``
+instead. Nothing but records is written to the output.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import (TYPE_CHECKING, Iterable, Iterator, List, Optional,
+                    Sequence, TextIO)
+
+from awl_pickups import DEFAULT_BINS, PickupSchedule
+
+if TYPE_CHECKING:
+    from awl_schedule import AWLScheduleClient
+
+FORMATS = ("json", "ndjson", "csv")
+CSV_FIELDS = ("strasseNummer", "date", "bins", "error")
+
+
+class RecordWriter:
+    """Write records as NDJSON, one line each."""
+
+    def __init__(self, stream: TextIO) -> None:
+        """Class initialisation steps.
+
+        :param stream: text stream the records are written to
+        """
+        self.stream = stream
+        self.records = 0
+
+    def write(self, record: dict) -> None:
+        """Write one record."""
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.records += 1
+
+    def flush(self) -> None:
+        """Hand the records written so far to the reader."""
+        self.stream.flush()
+
+    def close(self) -> None:
+        """Finish the output, the stream stays open."""
+        self.stream.flush()
+
+
+class JSONWriter(RecordWriter):
+    """Write records as one JSON array, element by element."""
+
+    def write(self, record: dict) -> None:
+        self.stream.write("[\n" if not self.records else ",\n")
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.records += 1
+
+    def close(self) -> None:
+        self.stream.write("]\n" if self.records else "[]\n")
+        self.stream.flush()
+
+
+class CSVWriter(RecordWriter):
+    """Write records as CSV rows, the bins of a day separated by spaces."""
+
+    def __init__(self, stream: TextIO) -> None:
+        super().__init__(stream)
+        self._writer = csv.DictWriter(stream, CSV_FIELDS,
+                                      lineterminator="\n")
+        self._writer.writeheader()
+
+    def write(self, record: dict) -> None:
+        row = dict(record)
+        if "bins" in row:
+            row["bins"] = " ".join(row["bins"])
+        self._writer.writerow(row)
+        self.records += 1
+
+
+def make_writer(output_format: str, stream: TextIO) -> RecordWriter:
+    """Return the writer of ``output_format``, one of ``FORMATS``."""
+    writers = {"json": JSONWriter, "ndjson": RecordWriter, "csv": CSVWriter}
+    return writers[output_format](stream)
+
+
+def read_streets(values: Iterable[str],
+                 stdin: Optional[TextIO] = None) -> List[str]:
+    """Return the streets of the ``--street`` values.
+
+    A value of ``-`` stands for one street per line of ``stdin``, blank
+    lines and lines starting with ``#`` are skipped.
+    """
+    streets = []
+    for value in values:
+        if value != "-":
+            streets.append(value.strip())
+            continue
+        for line in stdin or sys.stdin:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                streets.append(line)
+    return streets
+
+
+def pickup_records(street, pickups: dict, bins: Optional[List[str]],
+                   next_only: bool = False,
+                   known_bins: Sequence[str] = DEFAULT_BINS
+                   ) -> Iterator[dict]:
+    """Yield the records of one street's pickups, in date order.
+
+    :param bins: Optional bin types to keep, all by default
+    :param next_only: only the next pickup, a record with ``date`` None
+                      if there is none within the queried months
+    :param known_bins: bin order of the records, ``config.waste_bins``
+    """
+    schedule = PickupSchedule.from_pickups(pickups, known_bins)
+    if next_only:
+        found = schedule.next_pickup(bins=bins)
+        day, names = found if found else (None, [])
+        yield {"strasseNummer": street,
+               "date": day.isoformat() if day else None, "bins": names}
+        return
+    if bins:
+        schedule = schedule.filter(bins)
+    for day, names in schedule:
+        yield {"strasseNummer": street, "date": day.isoformat(),
+               "bins": names}
+
+
+class QueryRunner:  # pylint: disable=too-few-public-methods
+    """Fetch the schedules of many streets and write their records."""
+
+    def __init__(self, client: AWLScheduleClient, writer: RecordWriter,
+                 scope: str = "m", bins: Optional[List[str]] = None,
+                 next_only: bool = False) -> None:
+        """Class initialisation steps.
+
+        :param client: client used for the queries
+        :param writer: where the records go
+        :param scope: "m", "3m" or "y", see ``get_pickup_dates``
+        :param bins: Optional bin types to keep, all by default
+        :param next_only: write the next pickup per street only
+        """
+        self.client = client
+        self.writer = writer
+        self.scope = scope
+        self.bins = bins
+        self.next_only = next_only
+        self.failed = 0
+
+    def run(self, streets: List[str], concurrency: int = 1) -> int:
+        """Query ``streets`` and return the number that failed.
+
+        One street at a time writes the records in the order of
+        ``streets``, with a higher ``concurrency`` they are written in
+        the order the responses arrive.
+        """
+        resolved = list(zip(streets, self._numbers(streets)))
+        if concurrency <= 1:
+            for street, number in resolved:
+                if isinstance(number, Exception):
+                    self._emit(street, number)
+                else:
+                    self._emit(number, self._fetch(number))
+        else:
+            for street, number in resolved:
+                if isinstance(number, Exception):
+                    self._emit(street, number)
+            self._run_parallel([number for _, number in resolved
+                                if not isinstance(number, Exception)],
+                               concurrency)
+        self.writer.close()
+        return self.failed
+
+    def _run_parallel(self, numbers: List[str], concurrency: int) -> None:
+        with ThreadPoolExecutor(max_workers=concurrency,
+                                thread_name_prefix="awl-query") as pool:
+            futures = {pool.submit(self._fetch, number): number
+                       for number in numbers}
+            try:
+                for future in as_completed(futures):
+                    self._emit(futures[future], future.result())
+            finally:
+                # the reader may be gone, do not start what is left
+                for future in futures:
+                    future.cancel()
+
+    def _fetch(self, number: str):
+        """Return the pickups of ``number``, or the exception raised."""
+        try:
+            return self.client.get_pickup_dates(scope=self.scope,
+                                                street=number)
+        except Exception as exc:  # pylint: disable=broad-except
+            return exc
+
+    def _emit(self, street, pickups) -> None:
+        """Write and flush the records of ``street``, or its error."""
+        if isinstance(pickups, Exception):
+            self.failed += 1
+            error = str(pickups) or type(pickups).__name__
+            self.writer.write({"strasseNummer": street, "error": error})
+        else:
+            for record in pickup_records(street, pickups, self.bins,
+                                         self.next_only,
+                                         self.client.config.waste_bins):
+                self.writer.write(record)
+        self.writer.flush()
+
+    def _numbers(self, streets: List[str]) -> list:
+        """Return the strasseNummer of each street, or why there is none.
+
+        Values that are not a number are looked up as an address with
+        the ``AddressResolver``, the street list is only fetched then.
+        """
+        if all(street.isdigit() for street in streets):
+            return list(streets)
+        try:
+            # pylint: disable-next=import-outside-toplevel
+            from awl_address import AddressResolver
+            resolver = AddressResolver(self.client.fetch_streets())
+        except Exception as exc:  # pylint: disable=broad-except
+            return [street if street.isdigit() else exc
+                    for street in streets]
+        numbers = []
+        for street in streets:
+            number = street if street.isdigit() else resolver.resolve(street)
+            numbers.append(ValueError("unknown street") if number is None
+                           else str(number))
+        return numbers
+
+
+def run_query(client: AWLScheduleClient, args: argparse.Namespace) -> int:
+    """Run the query of the command line options, return the exit status.
+
+    Uses ``args.query_street``, ``args.query_scope``, ``args.query_bins``,
+    ``args.query_next``, ``args.query_format`` and
+    ``args.query_concurrency``. Without ``--scope`` the current month is
+    queried, with ``--next`` three months, so that a pickup early in the
+    next month is still found at the end of this one.
+    """
+    streets = read_streets(args.query_street)
+    bins = args.query_bins
+    if not streets:
+        if not client.config.is_complete:
+            print("Error: no --street given and no street configured",
+                  file=sys.stderr)
+            return 2
+        streets = [str(client.config.strasse_nummer)]
+    invalid = [name for name in bins or () if name not in
+               client.config.waste_bins]
+    if invalid:
+        print(f"Error: {invalid} is not a valid waste type", file=sys.stderr)
+        return 2
+
+    runner = QueryRunner(client, make_writer(args.query_format or "json",
+                                             sys.stdout),
+                         args.query_scope or ("3m" if args.query_next
+                                              else "m"),
+                         bins, args.query_next)
+    try:
+        failed = runner.run(streets, args.query_concurrency or 1)
+    except BrokenPipeError:
+        # the reader went away, like head does, do not fail on exit flush
+        # pylint: disable-next=import-outside-toplevel
+        import os
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    if failed:
+        print(f"{failed} of {len(streets)} streets failed", file=sys.stderr)
+    return 1 if failed else 0
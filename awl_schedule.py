@@ -5,22 +5,55 @@ This module encapsulates the workflow described in ``awlSchedule.md``.
 It handles configuration management, discovery of available streets
 via the AWL API, and persistence of the selected street configuration.
 """
+# pylint: disable=too-many-lines
 
 from __future__ import annotations
 
 import argparse
-import curses
-from datetime import datetime
+from datetime import date, datetime
+import importlib
 import json
 import pathlib
+import sys
+import threading
+import time
 from dataclasses import dataclass, field
-from typing import Iterable, List, Optional, Sequence
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Tuple
 
-import requests
+from awl_cache import (BackgroundRefresh, Month, MonthStore, ScheduleCache,
+                       ScheduleDiskCache, SingleFlight, StreetCache, StreetCacheEntry,
+                       copy_pickups, merge_pickups, months_between,
+                       plan_queries, scope_months, slice_months, trim_pickups)
+from awl_pickups import PickupSchedule
+from awl_stats import STATS, prometheus_text, report, timed
+
+if TYPE_CHECKING:
+    from awl_streets import Street, StreetIndex, StreetMatcher
+
+
+class _LazyModule:  # pylint: disable=too-few-public-methods
+    """Import a module on first attribute access.
+
+    ``curses`` and ``awl_streets`` are only needed to pick a street and
+    ``requests`` only when the answer is not cached, loading them up front
+    would slow down every start of the command line tool.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+awl_streets = _LazyModule("awl_streets")
+curses = _LazyModule("curses")
+requests = _LazyModule("requests")
 
 
 @dataclass
-class AWLConfig:
+class AWLConfig:  # pylint: disable=too-many-instance-attributes
     """Represents the persisted AWL configuration."""
 
     api_url: str = "https://buergerportal.awl-neuss.de/api/v1/calendar"
@@ -30,6 +63,43 @@ class AWLConfig:
     )
     strasse_nummer: Optional[str] = None
     strasse_bezeichnung: Optional[str] = None
+    # directory for cached API data, defaults to the config file directory
+    cache_dir: Optional[str] = None
+    # seconds a cached street list is used before it is revalidated
+    streets_ttl: int = 86400
+    # seconds a yearly schedule stored in cache_dir is used
+    schedule_disk_ttl: int = 86400
+    # seconds and number of calendar responses kept in memory
+    schedule_ttl: int = 3600
+    schedule_cache_size: int = 256
+    # stale-while-revalidate: with schedule_soft_ttl set, schedules older
+    # than that many seconds are still answered at once and refreshed in
+    # the background, only schedules older than schedule_hard_ttl or none
+    # at all make the caller wait for the API
+    schedule_soft_ttl: Optional[int] = None
+    schedule_hard_ttl: int = 604800
+    # answer "m" and "3m" queries from one yearly fetch per street
+    schedule_fetch_year: bool = True
+    # HTTP connection pool and retry behaviour
+    timeout: float = 30
+    pool_size: int = 10
+    retries: int = 3
+    retry_backoff: float = 0.5
+    retry_backoff_max: float = 30
+    # streets fetched at the same time by bulk clients
+    concurrency: int = 8
+    # adaptive limits of the API calls: at most rate_limit requests per
+    # second and concurrency in flight, both cut in half on 429, 5xx and
+    # responses slower than latency_target seconds. Off with rate_limit
+    # 0, set it for bulk jobs against a portal that throttles
+    rate_limit: float = 0
+    latency_target: float = 2.0
+    # "sync" fetches months older than sync_max_age seconds again, and
+    # always the sync_volatile_months months starting with the current one
+    sync_max_age: int = 604800
+    sync_volatile_months: int = 2
+    # bot token for the Telegram reminders
+    telegram_token: Optional[str] = None
 
     @property
     def is_complete(self) -> bool:
@@ -37,21 +107,176 @@ class AWLConfig:
         return bool(self.strasse_nummer and self.strasse_bezeichnung)
 
 
-class AWLScheduleClient:
+# awl.conf keys and the AWLConfig attributes they are stored in
+CONFIG_KEYS = {
+    "API_URL": "api_url",
+    "STR_URL": "streets_endpoint",
+    "WASTE_BINS": "waste_bins",
+    "strasseNummer": "strasse_nummer",
+    "strasseBezeichnung": "strasse_bezeichnung",
+    "CACHE_DIR": "cache_dir",
+    "STREETS_TTL": "streets_ttl",
+    "SCHEDULE_DISK_TTL": "schedule_disk_ttl",
+    "SCHEDULE_TTL": "schedule_ttl",
+    "SCHEDULE_CACHE_SIZE": "schedule_cache_size",
+    "SCHEDULE_SOFT_TTL": "schedule_soft_ttl",
+    "SCHEDULE_HARD_TTL": "schedule_hard_ttl",
+    "SCHEDULE_FETCH_YEAR": "schedule_fetch_year",
+    "TIMEOUT": "timeout",
+    "POOL_SIZE": "pool_size",
+    "RETRIES": "retries",
+    "RETRY_BACKOFF": "retry_backoff",
+    "RETRY_BACKOFF_MAX": "retry_backoff_max",
+    "CONCURRENCY": "concurrency",
+    "RATE_LIMIT": "rate_limit",
+    "LATENCY_TARGET": "latency_target",
+    "SYNC_MAX_AGE": "sync_max_age",
+    "SYNC_VOLATILE_MONTHS": "sync_volatile_months",
+    "TELEGRAM_TOKEN": "telegram_token",
+}
+
+# always written by save_config, the other keys only when they were in the
+# loaded file or differ from the defaults, so later default changes still
+# reach existing configurations
+SAVED_KEYS = ("API_URL", "STR_URL", "WASTE_BINS", "strasseNummer",
+              "strasseBezeichnung")
+
+# options of the query mode, see awl_query
+QUERY_OPTIONS = ("query_street", "query_scope", "query_bins", "query_next",
+                 "query_format", "query_concurrency")
+
+# responses worth another try, the portal recovers from these
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# seconds a finished command waits for its background refreshes, they
+# run on a daemon thread that would die with the process
+REFRESH_EXIT_TIMEOUT = 5
+
+
+class MenuView:
+    """Viewport renderer for the street picker.
+
+    The view remembers what it painted on every line and only rewrites
+    the lines that changed. The result list scrolls so the highlighted
+    entry is always visible.
+    """
+
+    # lines above the result list
+    header_lines = 3
+
+    def __init__(self, stdscr) -> None:
+        """Class initialisation steps.
+
+        :param stdscr: the curses window to draw on
+        """
+        self.stdscr = stdscr
+        self.top = 0
+        self._size = None
+        self._painted: dict = {}
+
+    @property
+    def page_size(self) -> int:
+        """Number of result lines that fit on the screen."""
+        max_y, _ = self.stdscr.getmaxyx()
+        return max(max_y - self.header_lines - 1, 1)
+
+    def draw(self, query: str, filtered: Sequence[dict],
+             highlight_idx: int) -> None:
+        """Draw the menu, repainting only the lines that changed."""
+        size = self.stdscr.getmaxyx()
+        if size != self._size:
+            # the terminal was resized, start from a blank screen
+            self._size = size
+            self._painted.clear()
+            self.stdscr.erase()
+
+        page = self.page_size
+        self._scroll_to(highlight_idx, len(filtered), page)
+
+        status = "Results:"
+        if len(filtered) > page:
+            last = min(self.top + page, len(filtered))
+            status = f"Results: {self.top + 1}-{last} of {len(filtered)}"
+        lines = ["Type to filter street (ESC to quit)", f"> {query}", status]
+        attrs = [curses.A_NORMAL] * len(lines)
+        for idx in range(self.top, self.top + page):
+            if idx < len(filtered):
+                lines.append(f"  {filtered[idx]['strasseBezeichnung']}")
+                attrs.append(curses.A_REVERSE if idx == highlight_idx
+                             else curses.A_NORMAL)
+            else:
+                lines.append("")
+                attrs.append(curses.A_NORMAL)
+        if not filtered:
+            lines[self.header_lines] = "  No matches"
+
+        for row, line in enumerate(zip(lines, attrs)):
+            if self._painted.get(row) != line:
+                self._paint(row, *line)
+                self._painted[row] = line
+
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+
+    def _scroll_to(self, highlight_idx: int, count: int, page: int) -> None:
+        """Move the viewport so ``highlight_idx`` is on the screen."""
+        if highlight_idx < self.top:
+            self.top = highlight_idx
+        elif highlight_idx >= self.top + page:
+            self.top = highlight_idx - page + 1
+        self.top = max(0, min(self.top, count - page))
+
+    def _paint(self, row: int, text: str, attr: int) -> None:
+        _, max_x = self._size
+        self.stdscr.move(row, 0)
+        self.stdscr.clrtoeol()
+        if text:
+            self.stdscr.addnstr(row, 0, text, max_x - 1, attr)
+
+
+class AWLScheduleClient:  # pylint: disable=too-many-instance-attributes
     """High-level AWL client."""
 
-    def __init__(self, config_path: str | pathlib.Path = "awl.conf") -> None:
+    # identical API calls in flight are shared by all clients
+    single_flight = SingleFlight()
+
+    def __init__(self, config_path: str | pathlib.Path = "awl.conf",
+                 session: Optional[requests.Session] = None) -> None:
         """Class initialisation steps.
 
         :param config_path: Optional path to config file
+        :param session: Optional HTTP session to share between clients
         """
         self.config_path = pathlib.Path(config_path)
+        # CONFIG_KEYS found in the configuration file
+        self._config_keys: Tuple[str, ...] = ()
         self.config = self._load_config()
+        self._session = session
+        self._limiter = None
+        # session and limiter are first used from worker threads
+        self._lazy_lock = threading.Lock()
+        self._street_index: Optional[StreetIndex] = None
+        self._street_matcher: Optional[StreetMatcher] = None
+        cache_dir = self.config.cache_dir or self.config_path.parent
+        self.street_cache = StreetCache(cache_dir,
+                                        ttl=self.config.streets_ttl)
+        disk_ttl = self.config.schedule_disk_ttl
+        memory_ttl = self.config.schedule_ttl
+        if self.config.schedule_soft_ttl is not None:
+            # stale copies are served up to the hard TTL, keep them as long
+            disk_ttl = max(disk_ttl, self.config.schedule_hard_ttl)
+            memory_ttl = max(memory_ttl, self.config.schedule_hard_ttl)
+        self.schedule_file = ScheduleDiskCache(cache_dir, ttl=disk_ttl)
+        self.schedule_cache = ScheduleCache(
+            max_entries=self.config.schedule_cache_size, ttl=memory_ttl)
+        self.month_store = MonthStore(cache_dir)
+        self.refresher = BackgroundRefresh()
 
     # ------------------------------------------------------------------
     # Configuration handling
     # ------------------------------------------------------------------
 
+    @timed("config_seconds", operation="load")
     def _load_config(self) -> AWLConfig:
         """Load the configuration."""
         if not self.config_path.exists():
@@ -62,29 +287,26 @@ class AWLScheduleClient:
         except json.JSONDecodeError as exc:
             # if we have some problems parsing the configuration do it again
             print(
-                f"Error {exc} loading the configuration, going for a fresh one!")
+                f"Error {exc} loading the configuration, going for a fresh one!",
+                file=sys.stderr)
             return AWLConfig()
         except OSError as exc:
             # go out if we have disk problems
             raise RuntimeError(f"Failed to read configuration: {exc}") from exc
 
-        return AWLConfig(
-            api_url=data.get("API_URL", AWLConfig.api_url),
-            streets_endpoint=data.get("STR_URL", AWLConfig.streets_endpoint),
-            waste_bins=data.get("WASTE_BINS", AWLConfig().waste_bins),
-            strasse_nummer=data.get("strasseNummer"),
-            strasse_bezeichnung=data.get("strasseBezeichnung"),
-        )
+        self._config_keys = tuple(key for key in CONFIG_KEYS if key in data)
+        return AWLConfig(**{attr: data[key]
+                            for key, attr in CONFIG_KEYS.items()
+                            if key in data})
 
+    @timed("config_seconds", operation="save")
     def save_config(self) -> None:
         """Save the configuration."""
-        payload = {
-            "API_URL": self.config.api_url,
-            "STR_URL": self.config.streets_endpoint,
-            "WASTE_BINS": self.config.waste_bins,
-            "strasseNummer": self.config.strasse_nummer,
-            "strasseBezeichnung": self.config.strasse_bezeichnung,
-        }
+        defaults = AWLConfig()
+        payload = {key: getattr(self.config, attr)
+                   for key, attr in CONFIG_KEYS.items()
+                   if key in SAVED_KEYS or key in self._config_keys
+                   or getattr(self.config, attr) != getattr(defaults, attr)}
         self.config_path.write_text(json.dumps(payload, indent=2),
                                     encoding="utf-8")
 
@@ -93,11 +315,18 @@ class AWLScheduleClient:
     # ------------------------------------------------------------------
 
     def _validate_selection(self, entry: str, labels: Iterable[str]) -> None:
-        entry_normalized = entry.strip().lower()
-        if not any(label.lower() == entry_normalized for label in labels):
+        labels = list(labels)
+        entry_normalized = awl_streets.normalize_street(entry)
+        if not any(awl_streets.normalize_street(label) == entry_normalized
+                   for label in labels):
+            best = awl_streets.StreetMatcher(
+                [{"strasseBezeichnung": label} for label in labels]
+            ).best(entry)
+            hint = f", did you mean {best['strasseBezeichnung']}?" if best else ""
             raise ValueError(
-                "Entered street name is not in the available list")
+                f"Entered street name is not in the available list{hint}")
 
+    @timed("filter_seconds", function="filter_pickups_by_bins")
     def filter_pickups_by_bins(self, pickups: dict, bins: list[str]) -> dict:
         """Return a dict of pickup dates filtered by bin types."""
         filtered: dict = {}
@@ -113,6 +342,7 @@ class AWLScheduleClient:
                 filtered[month] = filtered_days
         return filtered
 
+    @timed("filter_seconds", function="filter_next_available_day")
     def filter_next_available_day(self, pickups):
         """Return the next available pickup date from the pickups dict."""
         # Parse the current date
@@ -154,25 +384,230 @@ class AWLScheduleClient:
     # API interaction
     # ------------------------------------------------------------------
 
-    def _get(self, endpoint=None, args=None) -> list[dict]:
-        """Get data from the endpoint."""
+    @property
+    def session(self) -> requests.Session:
+        """The pooled keep-alive HTTP session used for all API calls."""
+        if self._session is None:
+            with self._lazy_lock:
+                if self._session is None:
+                    self._session = self._new_session()
+        return self._session
+
+    def _new_session(self) -> requests.Session:
+        # pylint: disable-next=import-outside-toplevel
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.config.pool_size,
+                              pool_maxsize=self.config.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        return session
+
+    @property
+    def limiter(self):
+        """The ``AdaptiveLimiter`` shared by all API calls, None if off."""
+        if self._limiter is None and self.config.rate_limit > 0:
+            with self._lazy_lock:
+                if self._limiter is None:
+                    # pylint: disable-next=import-outside-toplevel
+                    from awl_limit import AdaptiveLimiter
+                    self._limiter = AdaptiveLimiter(
+                        self.config.rate_limit, self.config.concurrency,
+                        latency_target=self.config.latency_target)
+        return self._limiter
+
+    def _request(self, endpoint=None, args=None,
+                 headers=None, stream: bool = False) -> requests.Response:
+        """Send a GET request to the endpoint and return the response.
+
+        Connection errors, timeouts and RETRY_STATUS responses are retried
+        up to ``config.retries`` times with exponential backoff. With
+        ``stream`` the body is left unread for the caller.
+        """
         url = f"{self.config.api_url}"
         if endpoint:
             url = f"{url}{endpoint}"
-        if args:
-            response = requests.get(url,  params=args, timeout=30)
-        else:
-            response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        label = endpoint or "calendar"
+
+        attempt = 0
+        while True:
+            try:
+                response = self._send(url, args, headers, label, stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.config.retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if (response.status_code not in RETRY_STATUS
+                        or attempt >= self.config.retries):
+                    response.raise_for_status()
+                    return response
+                delay = self._backoff(attempt,
+                                      response.headers.get("Retry-After"))
+                response.close()
+            attempt += 1
+            if STATS.enabled:
+                STATS.count("retries_total", endpoint=label)
+            time.sleep(delay)
+
+    def _send(self, url: str, args, headers, label: str,
+              stream: bool = False) -> requests.Response:
+        """Send one GET request within the limits of ``limiter``."""
+        limiter = self.limiter
+        if limiter is None:
+            return self._send_once(url, args, headers, label, stream)
+        started = limiter.acquire()
+        status = None
+        try:
+            response = self._send_once(url, args, headers, label, stream)
+            status = response.status_code
+            return response
+        finally:
+            limiter.release(started, status)
+
+    def _send_once(self, url: str, args, headers, label: str,
+                   stream: bool = False) -> requests.Response:
+        """Send one GET request, recording it when stats are enabled."""
+        if not STATS.enabled:
+            return self.session.get(url, params=args, headers=headers,
+                                    timeout=self.config.timeout,
+                                    stream=stream)
+
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, params=args, headers=headers,
+                                        timeout=self.config.timeout,
+                                        stream=stream)
+        except requests.RequestException as exc:
+            STATS.count("request_errors_total", endpoint=label,
+                        error=type(exc).__name__)
+            raise
+        finally:
+            STATS.observe("request_seconds", time.perf_counter() - started,
+                          endpoint=label)
+        STATS.count("responses_total", endpoint=label,
+                    status=str(response.status_code))
+        # reading the body of a streamed response would defeat streaming
+        size = (int(response.headers.get("Content-Length", 0)) if stream
+                else len(response.content))
+        STATS.count("response_bytes_total", size, endpoint=label)
+        return response
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None
+                 ) -> float:
+        """Return the seconds to wait before retry number ``attempt``."""
+        delay = self.config.retry_backoff * 2 ** attempt
+        if retry_after:
+            # the server knows best, Retry-After is seconds or a HTTP date
+            # pylint: disable-next=import-outside-toplevel
+            from email.utils import parsedate_to_datetime
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after).timestamp()
+                             - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return max(0.0, min(delay, self.config.retry_backoff_max))
+
+    @staticmethod
+    @timed("decode_seconds")
+    def _decode(response: requests.Response) -> list[dict]:
+        """Decode the JSON payload of an AWL API response."""
         data = response.json()
         if not isinstance(data, (list, dict)):
             raise RuntimeError("Expected list or dict from AWL API")
 
         return data
 
-    def fetch_streets(self) -> list[dict]:
-        """Fetch all streets from the AWL portal."""
-        return self._get(self.config.streets_endpoint)
+    @staticmethod
+    @timed("decode_seconds", payload="streets")
+    def _decode_streets(response: requests.Response) -> List[Street]:
+        """Decode a streamed townarea-streets response into Street records."""
+        try:
+            return list(awl_streets.iter_streets(
+                response.iter_content(chunk_size=16384)))
+        except ValueError as exc:
+            raise RuntimeError(f"Malformed street list from AWL API: {exc}"
+                               ) from exc
+        finally:
+            response.close()
+
+    def _get(self, endpoint=None, args=None) -> list[dict]:
+        """Get data from the endpoint.
+
+        Concurrent calls with the same endpoint and arguments, from any
+        client or thread, share one request and its decoded result.
+        """
+        key = (self.config.api_url, endpoint,
+               tuple(sorted((args or {}).items())))
+        return self.single_flight.do(
+            key, lambda: self._decode(self._request(endpoint, args)))
+
+    def fetch_streets(self) -> List[Street]:
+        """Fetch all streets from the AWL portal.
+
+        The list is served from the street cache while it is younger than
+        ``config.streets_ttl``. Older copies are revalidated with a
+        conditional GET and used as a fallback if the portal is down. The
+        response is decoded while it downloads into ``Street`` records.
+        """
+        url = f"{self.config.api_url}{self.config.streets_endpoint}"
+        entry = self.street_cache.load(url)
+        if entry and entry.is_fresh(self.street_cache.ttl):
+            self._count_street_cache("hits")
+            return entry.streets
+        self._count_street_cache("misses")
+
+        try:
+            response = self._request(self.config.streets_endpoint,
+                                     headers=entry.validators() if entry
+                                     else None, stream=True)
+        except requests.RequestException as exc:
+            if entry is None:
+                raise
+            print(f"Warning: {exc}, using cached street list",
+                  file=sys.stderr)
+            self._count_street_cache("stale")
+            return entry.streets
+
+        if response.status_code == 304 and entry is not None:
+            # not modified, the cached copy is good for another ttl
+            response.close()
+            self.street_cache.touch(entry)
+            self._count_street_cache("revalidated")
+            return entry.streets
+
+        streets = self._decode_streets(response)
+        self.street_cache.store(StreetCacheEntry(
+            url=url,
+            streets=streets,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        ))
+        return streets
+
+    @staticmethod
+    def _count_street_cache(outcome: str) -> None:
+        if STATS.enabled:
+            STATS.count(f"cache_{outcome}_total", cache="streets")
+
+    def cache_counters(self):
+        """Yield the cache and request sharing counters for ``STATS``."""
+        yield ("cache_hits_total", {"cache": "schedule"},
+               self.schedule_cache.hits)
+        yield ("cache_misses_total", {"cache": "schedule"},
+               self.schedule_cache.misses)
+        yield ("singleflight_calls_total", {}, self.single_flight.calls)
+        yield ("singleflight_shared_total", {}, self.single_flight.shared)
+        yield ("background_refresh_total", {}, self.refresher.runs)
+        yield ("background_refresh_failures_total", {},
+               self.refresher.failed)
+        if self._limiter is not None:
+            yield ("rate_limit_cuts_total", {}, self._limiter.cuts)
+            yield ("rate_limit_throttled_total", {}, self._limiter.throttled)
 
     def fetch_pickups(self, args=None) -> list[dict]:
         """Use the _get API call to fetch pickups."""
@@ -183,49 +618,51 @@ class AWLScheduleClient:
     # ------------------------------------------------------------------
     # Interactive workflow
     # ------------------------------------------------------------------
+    @timed("filter_seconds", function="filter_streets")
     def filter_streets(self, query: str, streets: Sequence[dict]) -> List[dict]:
-        """Search street from a list of streets."""
-        query_lower = query.lower()
-        return [street for street in streets
-                if query_lower in street["strasseBezeichnung"].lower()]
+        """Search street from a list of streets.
+
+        Falls back to fuzzy matching when no name contains ``query``, so
+        "Goethestr." or "Göthestraße" still find the Goethestraße.
+        """
+        found = self.street_index(streets).search(query)
+        if found or not query:
+            return found
+        return [street for street, _ in
+                self.street_matcher(streets).search(query)]
+
+    def street_index(self, streets: Sequence[dict]) -> StreetIndex:
+        """Return the search index of ``streets``, built once per list."""
+        if self._street_index is None or self._street_index.streets is not streets:
+            self._street_index = awl_streets.StreetIndex(streets)
+        return self._street_index
+
+    def street_matcher(self, streets: Sequence[dict]) -> StreetMatcher:
+        """Return the fuzzy matcher of ``streets``, built once per list."""
+        if (self._street_matcher is None
+                or self._street_matcher.streets is not streets):
+            self._street_matcher = awl_streets.StreetMatcher(streets)
+        return self._street_matcher
 
     def draw_menu(self, stdscr, query: str,
                   filtered: Sequence[dict],
                   highlight_idx: int) -> None:
         """Draw a menu to select a street."""
-        stdscr.clear()
-        max_y, _ = stdscr.getmaxyx()
-
-        stdscr.addstr(0, 0, "Type to filter street (ESC to quit)")
-        stdscr.addstr(1, 0, f"> {query}")
-        stdscr.addstr(2, 0, "Results:")
-
-        for idx, street in enumerate(filtered[: max_y - 4]):
-            line = f"  {street['strasseBezeichnung']}"
-            if idx == highlight_idx:
-                stdscr.attron(curses.A_REVERSE)
-                stdscr.addstr(3 + idx, 0, line)
-                stdscr.attroff(curses.A_REVERSE)
-            else:
-                stdscr.addstr(3 + idx, 0, line)
-
-        if not filtered:
-            stdscr.addstr(3, 0, "  No matches")
-
-        stdscr.refresh()
+        MenuView(stdscr).draw(query, filtered, highlight_idx)
 
     def select_street(self, stdscr, streets: Sequence[dict]) -> dict | None:
         """Select a street from a list of streets."""
         query = ""
         filtered = list(streets)
         highlight_idx = 0
+        view = MenuView(stdscr)
 
         curses.curs_set(0)
         stdscr.nodelay(False)
         stdscr.keypad(True)
 
         while True:
-            self.draw_menu(stdscr, query, filtered, highlight_idx)
+            view.draw(query, filtered, highlight_idx)
             key = stdscr.getch()
 
             if key in (curses.KEY_EXIT, 27):  # ESC
@@ -237,14 +674,12 @@ class AWLScheduleClient:
 
             if key in (curses.KEY_BACKSPACE, 127, 8):
                 query = query[:-1]
-            elif key == curses.KEY_DOWN:
-                if filtered:
-                    highlight_idx = (highlight_idx + 1) % len(filtered)
-            elif key == curses.KEY_UP:
-                if filtered:
-                    highlight_idx = (highlight_idx - 1) % len(filtered)
             elif 32 <= key <= 126:
                 query += chr(key)
+            else:
+                highlight_idx = self._move_highlight(
+                    key, highlight_idx, len(filtered), view.page_size)
+                continue
 
             filtered = self.filter_streets(query, streets)
             if filtered:
@@ -252,6 +687,22 @@ class AWLScheduleClient:
             else:
                 highlight_idx = 0
 
+    @staticmethod
+    def _move_highlight(key: int, highlight_idx: int, count: int,
+                        page_size: int) -> int:
+        """Return the highlighted entry after a navigation key."""
+        if not count:
+            return 0
+        if key == curses.KEY_DOWN:
+            return (highlight_idx + 1) % count
+        if key == curses.KEY_UP:
+            return (highlight_idx - 1) % count
+        if key == curses.KEY_NPAGE:
+            return min(highlight_idx + page_size, count - 1)
+        if key == curses.KEY_PPAGE:
+            return max(highlight_idx - page_size, 0)
+        return highlight_idx
+
     def ensure_correct_street(self) -> None:
         """Ensure configuration contains a street selection."""
         # do we have a complete configuration already? if yes we are done
@@ -292,11 +743,22 @@ class AWLScheduleClient:
             bins = self.config.waste_bins
 
         # get pickups for this month
-        pickups = self.get_pickup_dates(scope="m", bins=bins)
-        # select the next pickup date from the pickups dict
-        return self.filter_next_available_day(pickups)
+        schedule = self.get_schedule(scope="m", bins=bins)
+        # select the next pickup date from the indexed schedule
+        return schedule.next_pickup_dict()
+
+    def get_schedule(self, scope="m", bins: Optional[list] = None,
+                     street=None) -> PickupSchedule:
+        """Get the pickup dates as an indexed PickupSchedule.
 
-    def get_pickup_dates(self, scope="m", bins: Optional[list] = None):
+        Takes the same arguments as ``get_pickup_dates``.
+        """
+        pickups = self.get_pickup_dates(scope=scope, bins=bins,
+                                        street=street)
+        return PickupSchedule.from_pickups(pickups, self.config.waste_bins)
+
+    def get_pickup_dates(self, scope="m", bins: Optional[list] = None,
+                         street=None):
         """Get AWL waste bin pickup dates.
 
         param: range: Optional
@@ -305,12 +767,197 @@ class AWLScheduleClient:
                 "y"  - get all dates for this year
         param: bins: Optional
                 type of config.waste_bins
+        param: street: Optional
+                strasseNummer to query instead of the configured one
+
+        Responses are kept in ``schedule_cache``, repeated queries for the
+        same street are answered from it without calling the API. With
+        ``config.schedule_soft_ttl`` set, see ``_swr_schedule``.
         """
-        # arguments for the API call
+        start = datetime.now()
+        if street is None:
+            street = self.config.strasse_nummer
+        if self.config.schedule_soft_ttl is not None:
+            pickups = self._swr_schedule(street, start, scope)
+        else:
+            pickups = self.schedule_cache.get(street, start.year,
+                                              start.month, scope)
+            if pickups is None:
+                pickups = self._fetch_schedule(street, start, scope)
+
+        # no bins specified we will use all and return directly
+        if not bins:
+            bins = self.config.waste_bins
+            return pickups
+
+        if not set(bins).issubset(set(self.config.waste_bins)):
+            invl_bins = [
+                item for item in bins if item not in self.config.waste_bins]
+            print(f"Warning: {invl_bins} is not a valid waste type",
+                  file=sys.stderr)
+
+        return self.filter_pickups_by_bins(pickups, bins)
+
+    def get_pickups_between(self, start: date, end: date,
+                            bins: Optional[list] = None, street=None) -> dict:
+        """Get the pickups from ``start`` to ``end``, both included.
+
+        Months found in ``schedule_cache`` or in the yearly schedules of
+        the cache directory are not fetched again, the others with the
+        fewest API calls (see ``plan_queries``), issued concurrently.
+
+        :return: the ``get_pickup_dates`` shape, in date order
+        """
+        if isinstance(start, datetime):
+            start = start.date()
+        if isinstance(end, datetime):
+            end = end.date()
+        if end < start:
+            raise ValueError("end must not be before start")
+        if street is None:
+            street = self.config.strasse_nummer
+
+        pickups, missing = self.schedule_cache.lookup(
+            street, months_between(start, end))
+        if missing:
+            merge_pickups(pickups, self._fetch_months(street, missing))
+        pickups = trim_pickups(pickups, start, end)
+        if bins:
+            return self.filter_pickups_by_bins(pickups, bins)
+        return pickups
+
+    def _fetch_months(self, street, months: List[Month]) -> dict:
+        """Fetch ``months`` of ``street`` with as few API calls as possible."""
+        wanted = set(months)
+        found: dict = {}
+        # yearly schedules stored by earlier runs cost no request
+        for year in sorted({year for year, _ in wanted}):
+            data = self.schedule_file.load(self.config.api_url, street, year)
+            if data is not None:
+                self.schedule_cache.put(street, year, 1, "y", data)
+                merge_pickups(found, slice_months(data, wanted))
+                wanted.difference_update(scope_months(year, 1, "y"))
+
+        queries = plan_queries(wanted)
+        if not queries:
+            return found
+        # pylint: disable-next=import-outside-toplevel
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(
+                len(queries), self.config.concurrency)) as pool:
+            results = pool.map(
+                lambda query: self.fetch_schedule(
+                    street, datetime(query[0][0], query[0][1] + 1, 1),
+                    query[1]), queries)
+            for ((year, month0), scope), data in zip(queries, results):
+                self.schedule_cache.put(street, year, month0 + 1, scope,
+                                        data)
+                if scope == "y":
+                    self.schedule_file.store(self.config.api_url, street,
+                                             year, data)
+                merge_pickups(found, slice_months(data, months))
+        return found
+
+    def fetch_schedule(self, street, start: datetime, scope: str) -> dict:
+        """Fetch one calendar query from the API, bypassing the caches."""
+        return self.fetch_pickups(self._pickup_args(street, start, scope))
+
+    def _fetch_schedule(self, street, start: datetime, scope: str) -> dict:
+        """Fetch a schedule from the API and store it in the cache."""
+        if not self.config.schedule_fetch_year:
+            return self._refresh_schedule(street, start, scope)
+
+        # fetch the whole year(s) once, later queries are sliced from it
+        months = scope_months(start.year, start.month, scope)
+        yearly: dict = {}
+        for year in sorted({year for year, _ in months}):
+            found = self.schedule_file.load_entry(self.config.api_url,
+                                                  street, year)
+            if found is None:
+                data = self.fetch_schedule(street, datetime(year, 1, 1), "y")
+                self.schedule_file.store(self.config.api_url, street, year,
+                                         data)
+                self.schedule_cache.put(street, year, 1, "y", data)
+            else:
+                data = found[0]
+                self.schedule_cache.put_year(street, year, data, found[1])
+            yearly.update(data)
+        return slice_months(yearly, months)
+
+    def _swr_schedule(self, street, start: datetime, scope: str) -> dict:
+        """Get a schedule the stale-while-revalidate way.
+
+        A cached schedule younger than ``config.schedule_hard_ttl`` is
+        returned at once. If it is older than ``config.schedule_soft_ttl``
+        a refresh is queued on ``refresher`` first, so a later call gets
+        the new one. Without a usable copy the API is called right away.
+        """
+        found = self._cached_schedule(street, start, scope)
+        if found is not None:
+            pickups, fetched = found
+            age = time.time() - fetched
+            if age < self.config.schedule_hard_ttl:
+                if age >= self.config.schedule_soft_ttl:
+                    self.refresher.submit(
+                        (str(street), start.year, start.month, scope),
+                        lambda: self._refresh_schedule(street, start, scope))
+                return pickups
+        return self._refresh_schedule(street, start, scope)
+
+    def _cached_schedule(self, street, start: datetime,
+                         scope: str) -> Optional[Tuple[dict, float]]:
+        """Return a cached schedule and its fetch time, without requests."""
+        found = self.schedule_cache.get_entry(street, start.year,
+                                              start.month, scope)
+        if found is not None or not self.config.schedule_fetch_year:
+            return found
+        months = scope_months(start.year, start.month, scope)
+        yearly: dict = {}
+        fetched = time.time()
+        for year in sorted({year for year, _ in months}):
+            stored = self.schedule_file.load_entry(self.config.api_url,
+                                                   street, year)
+            if stored is None:
+                return None
+            self.schedule_cache.put_year(street, year, *stored)
+            yearly.update(stored[0])
+            fetched = min(fetched, stored[1])
+        return slice_months(yearly, months), fetched
+
+    def _refresh_schedule(self, street, start: datetime, scope: str) -> dict:
+        """Fetch a schedule from the API, replacing the cached copies."""
+        if not self.config.schedule_fetch_year:
+            pickups = self.fetch_schedule(street, start, scope)
+            self.schedule_cache.put(street, start.year, start.month, scope,
+                                    pickups)
+            # concurrent callers share the response of single_flight
+            return copy_pickups(pickups)
+
+        months = scope_months(start.year, start.month, scope)
+        yearly: dict = {}
+        for year in sorted({year for year, _ in months}):
+            data = self.fetch_schedule(street, datetime(year, 1, 1), "y")
+            self.schedule_file.store(self.config.api_url, street, year, data)
+            self.schedule_cache.put(street, year, 1, "y", data)
+            yearly.update(data)
+        return slice_months(yearly, months)
+
+    def invalidate_schedule(self, street=None) -> None:
+        """Forget the cached schedules of ``street``, or all of them.
+
+        Drops the in-memory responses and the yearly schedules stored in
+        the cache directory, the next query goes to the API.
+        """
+        self.schedule_cache.invalidate(street)
+        self.schedule_file.invalidate(street)
+
+    @staticmethod
+    def _pickup_args(street, start: datetime, scope: str) -> dict:
+        """Build the calendar API arguments for a schedule query."""
         args = {
-            "streetNum": self.config.strasse_nummer,
+            "streetNum": street,
             "homeNumber": "1",  # not used anyway
-            "startMonth": datetime.now().strftime('%b %Y')
+            "startMonth": start.strftime('%b %Y')
         }
 
         if scope == "3m":
@@ -322,37 +969,14 @@ class AWLScheduleClient:
         else:
             args["isYear"] = "false"
             args["isTreeMonthRange"] = "false"
-
-        pickups = self._get(args=args)
-
-        # no bins specified we will use all and return directly
-        if not bins:
-            bins = self.config.waste_bins
-            return pickups
-
-        if not set(bins).issubset(set(self.config.waste_bins)):
-            invl_bins = [
-                item for item in bins if item not in self.config.waste_bins]
-            print(f"Warning: {invl_bins} is not a valid waste type")
-
-        return self.filter_pickups_by_bins(pickups, bins)
+        return args
 
 
 # ------------------------------------------------------------------
 # The main program loop starts here
 # ------------------------------------------------------------------
-def main() -> None:
-    """Program main loop."""
-    ap = argparse.ArgumentParser()
-    ap.add_argument('-c', '--config',
-                    required=False,
-                    default='awl.conf',
-                    help='configuration file to use')
-    args = ap.parse_args()
-    # print(f"arguments {args}")
-    # initialize the class and read the config
-    client = AWLScheduleClient(args.config)
-
+def show(client: AWLScheduleClient) -> None:
+    """Print this month's pickups and the next yellow bin pickup."""
     # Ensure a street configuration exists (prompts user if needed)
     client.ensure_correct_street()
 
@@ -370,13 +994,191 @@ def main() -> None:
     next_pickup = client.get_next_pickup_date(bins=["gelb"])
     print("Next pickup:", next_pickup)
 
-    # Placeholder for future steps: e.g., fetch next garbage pickup dates
-    # print(
-    #    "Configured street:",
-    #    client.config.strasse_bezeichnung,
-    #    f"(ID: {client.config.strasse_nummer})",
-    # )
-    # print("TODO: Call additional API endpoints to retrieve pickup schedule.")
+
+def finish_refreshes(client: AWLScheduleClient,
+                     timeout: float = REFRESH_EXIT_TIMEOUT) -> bool:
+    """Wait for the background refreshes before the process exits.
+
+    Output written so far is flushed first, so the caller has its answer
+    while the stale schedules are revalidated.
+
+    :return: False if refreshes were still running after ``timeout``
+    """
+    if not client.refresher.pending():
+        return True
+    sys.stdout.flush()
+    return client.refresher.wait(timeout)
+
+
+def check_query_options(parser: argparse.ArgumentParser,
+                        args: argparse.Namespace) -> None:
+    """Exit with a usage error if query options precede a subcommand.
+
+    :param parser: parser that produced ``args``
+    :param args: parsed command line
+    """
+    if args.command and any(getattr(args, name) for name in QUERY_OPTIONS):
+        parser.error(f"the query options can not be combined with the "
+                     f"{args.command} command")
+
+
+def main() -> None:
+    """Program main loop."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-c', '--config',
+                    required=False,
+                    default='awl.conf',
+                    help='configuration file to use')
+    ap.add_argument('--stats', action='store_true',
+                    help='print timings and counters to stderr when done')
+    ap.add_argument('--stats-format', default='text',
+                    choices=('text', 'prometheus'),
+                    help='format of the --stats output')
+    query = ap.add_argument_group(
+        'query', 'print pickups for scripts instead of the overview, any '
+                 'of these options selects this mode')
+    query.add_argument('--street', action='append', default=[],
+                       dest='query_street', metavar='STREET',
+                       help='strasseNummer or address to query, may be '
+                            'repeated, - reads one per line from stdin, '
+                            'defaults to the configured street')
+    query.add_argument('--scope', default=None, choices=('m', '3m', 'y'),
+                       dest='query_scope',
+                       help='months to query, default m, 3m with --next')
+    query.add_argument('--bins', type=lambda value: value.split(','),
+                       default=None, dest='query_bins', metavar='BINS',
+                       help='comma separated bin types, default all')
+    query.add_argument('--next', action='store_true', dest='query_next',
+                       help='only the next pickup of each street')
+    query.add_argument('--format', default=None, choices=('json', 'ndjson',
+                                                          'csv'),
+                       dest='query_format',
+                       help='output format, default json')
+    query.add_argument('--concurrency', type=int, default=None,
+                       dest='query_concurrency', metavar='CONCURRENCY',
+                       help='streets fetched at the same time, records '
+                            'are written as they arrive')
+    commands = ap.add_subparsers(dest="command")
+    crawl_cmd = commands.add_parser(
+        "crawl", help="store the yearly schedule of every street")
+    crawl_cmd.add_argument("output", help="schedule store file to write")
+    crawl_cmd.add_argument("--concurrency", type=int, default=None,
+                           help="requests in flight at the same time")
+    daemon_cmd = commands.add_parser(
+        "daemon", help="send Telegram reminders the day before pickups")
+    daemon_cmd.add_argument("subscribers",
+                            help="JSON list of chat_id, strasseNummer, "
+                                 "bins and notify_at entries")
+    daemon_cmd.add_argument("--dry-run", action="store_true",
+                            help="print the reminders instead of sending")
+    serve_cmd = commands.add_parser(
+        "serve", help="answer next pickup queries over HTTP")
+    serve_cmd.add_argument("--host", default="127.0.0.1",
+                           help="address to listen on")
+    serve_cmd.add_argument("--port", type=int, default=8080,
+                           help="port to listen on")
+    serve_cmd.add_argument("--refresh", type=float, default=3600,
+                           help="seconds between background refreshes")
+    sync_cmd = commands.add_parser(
+        "sync", help="fetch stale months again and report changed days")
+    sync_cmd.add_argument("--street", action="append", default=[],
+                          help="strasseNummer to sync, may be repeated, "
+                               "defaults to the configured street")
+    sync_cmd.add_argument("--scope", default="y", choices=("m", "3m", "y"),
+                          help="months to keep in sync")
+    export_cmd = commands.add_parser(
+        "export", help="write iCalendar feeds per street and bin")
+    export_cmd.add_argument("store", help="schedule store written by crawl")
+    export_cmd.add_argument("output", help="directory for the .ics files")
+    export_cmd.add_argument("--bins", type=lambda value: value.split(","),
+                            default=None,
+                            help="comma separated bin types, default all")
+    export_cmd.add_argument("--workers", type=int, default=None,
+                            help="processes to use, default one per CPU")
+    resolve_cmd = commands.add_parser(
+        "resolve", help="add the strasseNummer to the addresses of a CSV")
+    resolve_cmd.add_argument("csv", help="CSV file with a header row")
+    resolve_cmd.add_argument("-o", "--output", default=None,
+                             help="file to write, default stdout")
+    resolve_cmd.add_argument("--street-column", default="strasse",
+                             help="column with the street name")
+    resolve_cmd.add_argument("--number-column", default="hausnummer",
+                             help="column with the house number, if the "
+                                  "CSV has none the street column is "
+                                  "read as full address")
+    args = ap.parse_args()
+    check_query_options(ap, args)
+    # print(f"arguments {args}")
+    if args.stats:
+        STATS.enable()
+    # initialize the class and read the config
+    client = AWLScheduleClient(args.config)
+    if args.stats:
+        STATS.add_collector(client.cache_counters)
+
+    try:
+        run_command(client, args)
+    finally:
+        finish_refreshes(client)
+        if args.stats and args.stats_format == 'prometheus':
+            print(prometheus_text(), file=sys.stderr, end="")
+        elif args.stats:
+            print(report(), file=sys.stderr)
+
+
+def run_command(client: AWLScheduleClient, args: argparse.Namespace) -> None:
+    """Run the command selected on the command line."""
+    if args.command == "crawl":
+        # pylint: disable-next=import-outside-toplevel
+        from awl_store import crawl
+        total, failed, calendars = crawl(client, args.output,
+                                         args.concurrency)
+        print(f"Stored {total - failed} of {total} streets with {calendars} "
+              f"distinct calendars in {args.output}")
+        if client.limiter is not None:
+            print(f"Sent {client.limiter.report()}")
+        return
+
+    if args.command == "daemon":
+        # pylint: disable-next=import-outside-toplevel
+        from awl_notify import run_daemon
+        run_daemon(client, args.subscribers, args.dry_run)
+        return
+
+    if args.command == "serve":
+        # pylint: disable-next=import-outside-toplevel
+        from awl_server import run_server
+        run_server(client, args.host, args.port, args.refresh)
+        return
+
+    if args.command == "sync":
+        # pylint: disable-next=import-outside-toplevel
+        from awl_sync import run_sync
+        run_sync(client, args.street, args.scope)
+        return
+
+    if args.command == "export":
+        # pylint: disable-next=import-outside-toplevel
+        from awl_ical import run_export
+        run_export(args.store, args.output, args.bins, args.workers)
+        return
+
+    if args.command == "resolve":
+        # pylint: disable-next=import-outside-toplevel
+        from awl_address import run_resolve
+        run_resolve(client.fetch_streets(), args.csv, args.output,
+                    args.street_column, args.number_column)
+        return
+
+    if args.command is None and any(getattr(args, name)
+                                    for name in QUERY_OPTIONS):
+        # pylint: disable-next=import-outside-toplevel
+        from awl_query import run_query
+        status = run_query(client, args)
+        if status:
+            sys.exit(status)
+    else:
+        show(client)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+"""Local HTTP service for pickup lookups.
+
+Dashboards poll the next pickup far more often than the calendar
+changes. ``ScheduleService`` keeps the schedules it was asked for in
+memory, refreshes them in the background and answers every request
+from memory::
+
+    GET /next?street=3670&bins=gelb,blau
+    GET /schedule?street=3670&scope=3m&bins=pink
+
+``street`` defaults to the configured street, ``bins`` to all bins and
+``scope`` to "m", streets that are not a number and bins not in
+``config.waste_bins`` are rejected. At most ``max_schedules`` schedules
+are kept, those nobody asked for during a refresh interval are dropped
+instead of refreshed.
+Responses are JSON in the shapes returned by ``get_next_pickup_date``
+and ``get_pickup_dates``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import traceback
+from collections import OrderedDict
+from datetime import date
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from awl_pickups import PickupSchedule
+
+if TYPE_CHECKING:
+    from awl_schedule import AWLScheduleClient
+
+SCOPES = ("m", "3m", "y")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error",
+           502: "Bad Gateway"}
+
+
+class RequestError(Exception):
+    """A request the service cannot answer, with its HTTP status."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ScheduleService:  # pylint: disable=too-many-instance-attributes
+    """In-memory schedules with background refresh, served over HTTP."""
+
+    def __init__(self, client: AWLScheduleClient,
+                 refresh_interval: float = 3600,
+                 max_responses: int = 4096,
+                 max_schedules: int = 1024) -> None:
+        """Class initialisation steps.
+
+        :param client: client used to fetch the schedules
+        :param refresh_interval: seconds between background refreshes
+        :param max_responses: encoded responses kept before the least
+                              recently used one is dropped
+        :param max_schedules: schedules kept before the least recently
+                              used one is dropped
+        """
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.max_responses = max_responses
+        self.max_schedules = max_schedules
+        self.requests = 0
+        # (street, scope, first day of the month) -> unfiltered pickups
+        # and their index, the scope windows start at the current month
+        self._schedules: OrderedDict = OrderedDict()
+        # schedules asked for since the last refresh
+        self._used: Set[Tuple[str, str, date]] = set()
+        # encoded responses, dropped whenever a schedule changes
+        self._responses: OrderedDict = OrderedDict()
+        self._responses_day = date.today()
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        """Serve requests until cancelled."""
+        server = await asyncio.start_server(self._handle, host, port)
+        self._refresher = asyncio.ensure_future(self._refresh_loop())
+        print(f"Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._refresher.cancel()
+
+    async def answer(self, target: str) -> bytes:
+        """Return the JSON body for a request target."""
+        url = urlsplit(target)
+        params = {key: values[-1]
+                  for key, values in parse_qs(url.query).items()}
+        street = self._street(params.get("street"))
+        bins = self._bins(params.get("bins", ""))
+
+        if url.path == "/next":
+            key = ("next", street, bins)
+            scope = "3m"
+        elif url.path == "/schedule":
+            scope = params.get("scope", "m")
+            if scope not in SCOPES:
+                raise RequestError(400, f"scope must be one of {SCOPES}")
+            key = ("schedule", street, scope, bins)
+        else:
+            raise RequestError(404, f"unknown path {url.path}")
+
+        if self._responses_day != date.today():
+            # "next" and the scope windows move with the date
+            self._responses.clear()
+            self._responses_day = date.today()
+        window = (street, scope, self._responses_day.replace(day=1))
+        # also when answered from _responses, see _refresh_loop
+        self._used.add(window)
+        if window in self._schedules:
+            self._schedules.move_to_end(window)
+        body = self._responses.get(key)
+        if body is not None:
+            self._responses.move_to_end(key)
+            return body
+
+        pickups, schedule = await self._schedule(window)
+        if key[0] == "next":
+            result = schedule.next_pickup_dict(bins=bins)
+        elif bins:
+            result = self.client.filter_pickups_by_bins(pickups, list(bins))
+        else:
+            result = pickups
+        body = json.dumps(result).encode("utf-8")
+        self._responses[key] = body
+        while len(self._responses) > self.max_responses:
+            self._responses.popitem(last=False)
+        return body
+
+    def _street(self, value: Optional[str]) -> str:
+        """Return the ``street`` parameter as a canonical strasseNummer."""
+        street = str(value or self.client.config.strasse_nummer or "")
+        if not street:
+            raise RequestError(400, "street is required")
+        if not (street.isascii() and street.isdigit()):
+            raise RequestError(400, "street must be a strasseNummer")
+        return str(int(street))
+
+    def _bins(self, value: str) -> Optional[Tuple[str, ...]]:
+        """Return the ``bins`` parameter in config order, None for all."""
+        requested = {name for name in value.split(",") if name}
+        known = self.client.config.waste_bins
+        unknown = requested.difference(known)
+        if unknown:
+            raise RequestError(400, f"unknown bins {sorted(unknown)}, "
+                                    f"known are {known}")
+        return tuple(name for name in known if name in requested) or None
+
+    async def _schedule(self, window: Tuple[str, str, date]
+                        ) -> Tuple[dict, PickupSchedule]:
+        """Return the schedule of a street, fetching it on first use."""
+        cached = self._schedules.get(window)
+        if cached is None:
+            cached = await self._fetch(*window)
+        return cached
+
+    async def _fetch(self, street: str, scope: str,
+                     month: date) -> Tuple[dict, PickupSchedule]:
+        """Fetch a schedule in a worker thread and store it.
+
+        ``get_pickup_dates`` starts the window at the current month, which
+        ``month`` is expected to be.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            pickups = await loop.run_in_executor(
+                None, lambda: self.client.get_pickup_dates(scope=scope,
+                                                           street=street))
+        except (requests.RequestException, RuntimeError) as exc:
+            raise RequestError(502, f"AWL portal request failed: {exc}"
+                               ) from exc
+        entry = (pickups, PickupSchedule.from_pickups(
+            pickups, self.client.config.waste_bins))
+        window = (street, scope, month)
+        if self._schedules.get(window, (None,))[0] != pickups:
+            self._schedules[window] = entry
+            self._drop_responses(street)
+        while len(self._schedules) > self.max_schedules:
+            dropped, _ = self._schedules.popitem(last=False)
+            self._drop_responses(dropped[0])
+        return entry
+
+    def _drop_responses(self, street: str) -> None:
+        """Forget the encoded responses of a street."""
+        self._responses = OrderedDict(
+            (key, body) for key, body in self._responses.items()
+            if key[1] != street)
+
+    async def _refresh_loop(self) -> None:
+        """Refetch every known schedule once per refresh interval."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            started = time.time()
+            month = date.today().replace(day=1)
+            for window in [window for window in self._schedules
+                           if window not in self._used
+                           or window[2] != month]:
+                del self._schedules[window]
+                self._drop_responses(window[0])
+            self._used = set()
+            for street, scope, month in list(self._schedules):
+                self.client.invalidate_schedule(street)
+                try:
+                    await self._fetch(street, scope, month)
+                except RequestError as exc:
+                    # keep serving the old schedule
+                    print(f"Warning: refreshing {street} failed: {exc}")
+            print(f"Refreshed {len(self._schedules)} schedules in "
+                  f"{time.time() - started:.1f}s")
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        """Answer the requests of one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = request_line.rstrip().endswith(b"HTTP/1.1")
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "connection":
+                        keep_alive = value.strip().lower() == "keep-alive"
+
+                self.requests += 1
+                status, body = await self._respond(
+                    request_line.decode("latin-1").split())
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"
+                    "\r\n\r\n".encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, parts: list) -> Tuple[int, bytes]:
+        """Return the status and body for a parsed request line."""
+        if len(parts) != 3:
+            return 400, b'{"error": "malformed request"}'
+        if parts[0] != "GET":
+            return 405, b'{"error": "only GET is supported"}'
+        try:
+            return 200, await self.answer(parts[1])
+        except RequestError as exc:
+            return exc.status, json.dumps({"error": str(exc)}).encode()
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"Warning: answering {parts[1]} failed: {exc!r}")
+            traceback.print_exc()
+            return 500, b'{"error": "internal error"}'
+
+
+def run_server(client: AWLScheduleClient, host: str, port: int,
+               refresh_interval: float) -> None:
+    """Run the query service until interrupted."""
+    service = ScheduleService(client, refresh_interval)
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        pass
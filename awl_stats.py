@@ -0,0 +1,189 @@
+"""Runtime instrumentation for the AWL schedule client.
+
+``STATS`` collects latency histograms and counters for API calls, JSON
+decoding, configuration handling and the filter helpers. Collection is
+off by default and every hook starts with a check of ``STATS.enabled``,
+so a disabled registry costs one attribute lookup per call.
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# upper bounds in seconds, roughly doubling from 50us to 60s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    __slots__ = ("buckets", "counts", "count", "total")
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, fraction: float) -> float:
+        """Return the bucket bound below which ``fraction`` of values are."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Stats:
+    """Registry of histograms and counters keyed by name and labels."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        """Start collecting."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop collecting, keep what was collected."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Drop everything collected."""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add ``value`` to the histogram ``name``."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add ``value`` to the counter ``name``."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]) -> None:
+        """Register a callable yielding ``(name, labels, value)`` counters.
+
+        Collectors are asked at export time, they report counters that are
+        kept elsewhere, like cache hits.
+        """
+        self._collectors.append(collector)
+
+    def collected(self) -> Dict[Tuple[str, Labels], float]:
+        """Return the own counters merged with the collector counters."""
+        with self._lock:
+            counters = dict(self.counters)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+        return counters
+
+
+STATS = Stats()
+
+
+def timed(name: str, **labels: str):
+    """Decorate a function to record its run time in histogram ``name``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not STATS.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STATS.observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorate
+
+
+def prometheus_text(stats: Optional[Stats] = None) -> str:
+    """Return the collected values in the Prometheus text format."""
+    stats = stats or STATS
+    lines: List[str] = []
+    typed = set()
+    for (name, labels), histogram in sorted(stats.histograms.items()):
+        if name not in typed:
+            lines.append(f"# TYPE awl_{name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),),
+                                histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"awl_{name}_bucket"
+                         f"{_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"awl_{name}_sum{_labels(labels)} {histogram.total}")
+        lines.append(f"awl_{name}_count{_labels(labels)} {histogram.count}")
+    for (name, labels), value in sorted(stats.collected().items()):
+        if name not in typed:
+            lines.append(f"# TYPE awl_{name} counter")
+            typed.add(name)
+        lines.append(f"awl_{name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def report(stats: Optional[Stats] = None) -> str:
+    """Return a short human readable summary of the collected values."""
+    stats = stats or STATS
+    lines = ["timings:"]
+    for (name, labels), histogram in sorted(stats.histograms.items()):
+        mean = histogram.total / histogram.count if histogram.count else 0
+        lines.append(
+            f"  {name}{_labels(labels)}: n={histogram.count} "
+            f"mean={mean * 1000:.2f}ms p50<={histogram.quantile(0.5) * 1000:g}ms "
+            f"p95<={histogram.quantile(0.95) * 1000:g}ms")
+    counters = stats.collected()
+    lines.append("counters:")
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"  {name}{_labels(labels)}: {value:g}")
+    for cache in sorted({dict(labels).get("cache") for name, labels
+                         in counters if name == "cache_hits_total"}):
+        hits = counters.get(("cache_hits_total", (("cache", cache),)), 0)
+        misses = counters.get(("cache_misses_total", (("cache", cache),)), 0)
+        if hits + misses:
+            lines.append(f"  {cache} cache hit ratio: "
+                         f"{hits / (hits + misses):.1%}")
+    return "\n".join(lines)
+
+
+def _number(value: float) -> str:
+    """Return ``value`` exactly, integers without a decimal point."""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
@@ -0,0 +1,316 @@
+"""Whole-city schedule store.
+
+``crawl`` fetches the yearly schedule of every street and writes it to a
+compact columnar file, ``ScheduleStore`` memory-maps such a file so any
+number of processes can query it without parsing or copying it.
+
+File layout, all integers little-endian::
+
+    header       magic, version, bin count, street count,
+                 first day ordinal, day count
+    bin names    ``BIN_NAME_SIZE`` bytes per bin, NUL padded
+    numbers      int32 strasseNummer per street, sorted
+    status       uint8 per street, 1 if its schedule was fetched
+    name offsets uint32 per street plus one, into the name blob
+    name blob    UTF-8 street names
+    padding      up to the next multiple of 8
+    matrix       uint8 bin bitmask per day and street, one row per day
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import pathlib
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Tuple
+
+from awl_calendars import CalendarStore
+from awl_pickups import PickupSchedule
+
+if TYPE_CHECKING:
+    from awl_schedule import AWLScheduleClient
+
+MAGIC = b"AWLS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIiI")
+BIN_NAME_SIZE = 16
+
+
+def write_store(path: str | pathlib.Path, year: int,
+                streets: Sequence[Tuple[int, str]],
+                schedules: dict, bins: Sequence[str]) -> None:
+    """Write a schedule store file.
+
+    :param path: file to write, replaced atomically
+    :param year: the calendar year the matrix covers
+    :param streets: ``(strasseNummer, strasseBezeichnung)`` pairs
+    :param schedules: strasseNummer to PickupSchedule, streets missing
+                      here are stored as not fetched
+    :param bins: bin names, bit ``i`` of a mask is ``bins[i]``
+    """
+    if len(bins) > 8:
+        raise ValueError("the schedule store supports at most 8 bin types")
+    streets = sorted(streets)
+    first_day = date(year, 1, 1).toordinal()
+    n_days = date(year + 1, 1, 1).toordinal() - first_day
+
+    names = [name.encode("utf-8") for _, name in streets]
+    offsets = array("I", [0] * (len(names) + 1))
+    for idx, name in enumerate(names):
+        offsets[idx + 1] = offsets[idx] + len(name)
+    status, matrix = _matrix(streets, schedules, bins, first_day, n_days)
+
+    parts = [
+        HEADER.pack(MAGIC, VERSION, len(bins), len(streets), first_day,
+                    n_days),
+        b"".join(name.encode("utf-8")[:BIN_NAME_SIZE].ljust(BIN_NAME_SIZE,
+                                                            b"\0")
+                 for name in bins),
+        _le(array("i", (number for number, _ in streets))),
+        status, _le(offsets), b"".join(names),
+    ]
+    size = sum(len(part) for part in parts)
+    parts.append(b"\0" * (-size % 8))
+    parts.append(matrix)
+
+    _write_parts(pathlib.Path(path), parts)
+
+
+class ScheduleStore:  # pylint: disable=too-many-instance-attributes
+    """Read-only, memory-mapped view of a schedule store file."""
+
+    def __init__(self, path: str | pathlib.Path) -> None:
+        """Class initialisation steps.
+
+        :param path: the store file written by ``write_store``
+        """
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        (magic, version, n_bins, self.n_streets, self.first_day,
+         self.n_days) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            view.release()
+            self._map.close()
+            raise ValueError(f"{path} is not a schedule store file")
+
+        pos = HEADER.size
+        self.bins = tuple(
+            bytes(view[pos + idx * BIN_NAME_SIZE:
+                       pos + (idx + 1) * BIN_NAME_SIZE]).rstrip(b"\0")
+            .decode("utf-8") for idx in range(n_bins))
+        pos += n_bins * BIN_NAME_SIZE
+        self._numbers = _array("i", view[pos:pos + 4 * self.n_streets])
+        pos += 4 * self.n_streets
+        self._status = view[pos:pos + self.n_streets]
+        pos += self.n_streets
+        self._offsets = _array("I", view[pos:pos + 4 * (self.n_streets + 1)])
+        pos += 4 * (self.n_streets + 1)
+        self._names = view[pos:pos + self._offsets[-1]]
+        pos += self._offsets[-1]
+        pos += -pos % 8
+        self._matrix = view[pos:pos + self.n_days * self.n_streets]
+
+    def __enter__(self) -> ScheduleStore:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_streets
+
+    def close(self) -> None:
+        """Release the memory mapping."""
+        for name in ("_numbers", "_status", "_offsets", "_names", "_matrix"):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+    @property
+    def days(self) -> Tuple[date, date]:
+        """The first and last day of the store."""
+        return (date.fromordinal(self.first_day),
+                date.fromordinal(self.first_day + self.n_days - 1))
+
+    @property
+    def matrix(self) -> memoryview:
+        """The bin bitmasks, ``n_days`` rows of ``n_streets`` bytes."""
+        return self._matrix
+
+    def street_numbers(self) -> Sequence[int]:
+        """The strasseNummer of every street, sorted."""
+        return self._numbers
+
+    def street_name(self, number: int) -> str:
+        """Return the strasseBezeichnung of ``number``."""
+        col = self._column(number)
+        return bytes(self._names[self._offsets[col]:
+                                 self._offsets[col + 1]]).decode("utf-8")
+
+    def is_fetched(self, number: int) -> bool:
+        """Check if the crawl got a schedule for ``number``."""
+        return bool(self._status[self._column(number)])
+
+    def streets_on(self, day: date,
+                   bins: Optional[Iterable[str]] = None) -> List[int]:
+        """Return the streets with a pickup of ``bins`` on ``day``.
+
+        :param day: the day to look up
+        :param bins: Optional bin types, all bins if not given
+        """
+        row = day.toordinal() - self.first_day
+        if not 0 <= row < self.n_days:
+            return []
+        wanted = self._mask(bins)
+        masks = self._matrix[row * self.n_streets:(row + 1) * self.n_streets]
+        return [self._numbers[col] for col, mask in enumerate(masks)
+                if mask & wanted]
+
+    def schedule(self, number: int) -> PickupSchedule:
+        """Return the schedule of street ``number``."""
+        col = self._column(number)
+        masks = self._matrix[col::self.n_streets]
+        days = [self.first_day + row for row, mask in enumerate(masks) if mask]
+        return PickupSchedule(days, (mask for mask in masks if mask),
+                              self.bins)
+
+    def _column(self, number: int) -> int:
+        col = bisect_left(self._numbers, number)
+        if col == self.n_streets or self._numbers[col] != number:
+            raise KeyError(number)
+        return col
+
+    def _mask(self, bins: Optional[Iterable[str]]) -> int:
+        if bins is None:
+            return 0xFF
+        return sum(1 << self.bins.index(name) for name in set(bins)
+                   if name in self.bins)
+
+
+def crawl(client: AWLScheduleClient, path: str | pathlib.Path,
+          concurrency: Optional[int] = None) -> Tuple[int, int, int]:
+    """Fetch this year's schedule of every street into a store file.
+
+    The schedules go straight from the API into the store, the schedule
+    caches of ``client`` are neither used nor filled. Streets with the
+    same calendar share one copy of it in memory until it is written.
+
+    :param client: client used for the street list and the requests
+    :param path: the store file to write
+    :param concurrency: Optional number of requests in flight, defaults
+                        to ``config.concurrency``
+    :return: the number of streets, of failed streets and of distinct
+             calendars
+    """
+    year = date.today().year
+    streets = {}
+    for street in client.fetch_streets():
+        streets.setdefault(int(street["strasseNummer"]),
+                           street["strasseBezeichnung"])
+    calendars = _fetch_calendars(client, streets, year,
+                                 concurrency or client.config.concurrency)
+    bins = list(calendars.bins)
+    schedules: dict = {}
+    for key, numbers in calendars.districts().items():
+        schedule = calendars.calendar_schedule(key)
+        # keep the bit order the same for every street
+        bins.extend(name for name in schedule.bins if name not in bins)
+        schedules.update(dict.fromkeys(map(int, numbers), schedule))
+    write_store(path, year, list(streets.items()), schedules, bins)
+    return len(streets), len(streets) - len(schedules), len(calendars)
+
+
+def _fetch_calendars(client: AWLScheduleClient, numbers: Iterable[int],
+                     year: int, concurrency: int) -> CalendarStore:
+    """Fetch the yearly calendars of ``numbers`` into a CalendarStore."""
+    calendars = CalendarStore(client.config.waste_bins)
+    if client.limiter is not None:
+        # the adaptive limit may grow up to what was asked for
+        client.limiter.max_limit = max(client.limiter.max_limit, concurrency)
+
+    with ThreadPoolExecutor(max_workers=concurrency,
+                            thread_name_prefix="awl-crawl") as pool:
+        futures = {pool.submit(client.fetch_schedule, number,
+                               datetime(year, 1, 1), "y"): number
+                   for number in numbers}
+        for future in as_completed(futures):
+            number = futures[future]
+            try:
+                pickups = future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                print(f"Warning: street {number} failed: {exc}")
+                continue
+            calendars.add(number, pickups)
+    return calendars
+
+
+def _matrix(streets: Sequence[Tuple[int, str]], schedules: dict,
+            bins: Sequence[str], first_day: int,
+            n_days: int) -> Tuple[bytearray, bytearray]:
+    """Return the street status column and the day by street matrix."""
+    n_streets = len(streets)
+    status = bytearray(n_streets)
+    matrix = bytearray(n_days * n_streets)
+    for col, (number, _) in enumerate(streets):
+        schedule = schedules.get(number)
+        if schedule is None:
+            continue
+        status[col] = 1
+        remap = _bit_map(schedule.bins, bins)
+        for ordinal, mask in schedule.day_masks():
+            row = ordinal - first_day
+            if 0 <= row < n_days:
+                matrix[row * n_streets + col] = remap[mask]
+    return status, matrix
+
+
+def _write_parts(path: pathlib.Path, parts: Iterable[bytes]) -> None:
+    """Replace ``path`` with the concatenated ``parts``."""
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent),
+                                    prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            for part in parts:
+                handle.write(part)
+        # readers keep their mapping of the old file until they reopen
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def _bit_map(source: Sequence[str], target: Sequence[str]) -> bytes:
+    """Return a table translating masks over ``source`` to ``target``."""
+    moves = [(1 << idx, 1 << target.index(name))
+             for idx, name in enumerate(source)]
+    table = bytearray(256)
+    for mask in range(256):
+        for src, dst in moves:
+            if mask & src:
+                table[mask] |= dst
+    return bytes(table)
+
+
+def _le(values: array) -> bytes:
+    """Return the little-endian bytes of ``values``."""
+    if struct.pack("=H", 1) != struct.pack("<H", 1):
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array(typecode: str, view: memoryview) -> Sequence[int]:
+    """Return a little-endian integer view of ``view`` without copying."""
+    if struct.pack("=H", 1) != struct.pack("<H", 1):
+        values = array(typecode, bytes(view))
+        values.byteswap()
+        return values
+    return view.cast(typecode)
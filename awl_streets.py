@@ -0,0 +1,381 @@
+"""Street list helpers for the AWL schedule client.
+
+The townarea-streets list holds every street of the city. Searching it
+is done on every key press of the street picker, so ``StreetIndex``
+prepares the list once and keeps each search proportional to the number
+of matches instead of the size of the list.
+
+``iter_streets`` decodes the list while it is downloaded into compact
+``Street`` records that keep only the fields the client uses.
+
+``StreetMatcher`` finds streets despite spelling variants: names are
+compared as ``normalize_street`` keys, and keys within a small edit
+distance are found with a BK-tree.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# longest n-gram kept in the index, longer queries intersect trigrams
+NGRAM = 3
+
+# API field names and the Street attributes they are kept in
+STREET_FIELDS = {
+    "strasseNummer": "number",
+    "strasseBezeichnung": "name",
+    "blockedHomeNumbers": "blocked",
+}
+
+# separators between the elements of a JSON list
+_SEPARATORS = re.compile(r"[\s,]*")
+
+# spelling variants folded by normalize_street
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_STREET_WORD = re.compile(r"stra(?:ss|ß|s)e\b|str\.|str\b")
+_NOT_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+class Street:
+    """One entry of the townarea-streets list.
+
+    Only ``strasseNummer``, ``strasseBezeichnung`` and the blocked house
+    numbers are kept, names are interned. Items can be read with the API
+    field names, ``street["strasseBezeichnung"]``, like the raw dicts.
+    """
+
+    __slots__ = ("number", "name", "blocked")
+
+    def __init__(self, number, name: str,
+                 blocked: Optional[Iterable] = None) -> None:
+        """Class initialisation steps.
+
+        :param number: the strasseNummer
+        :param name: the strasseBezeichnung
+        :param blocked: the blockedHomeNumbers, None when there are none
+        """
+        self.number = number
+        self.name = sys.intern(name)
+        self.blocked = tuple(blocked) if blocked else None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Street:
+        """Create a street from a townarea-streets entry."""
+        return cls(data["strasseNummer"], data["strasseBezeichnung"],
+                   data.get("blockedHomeNumbers"))
+
+    def to_dict(self) -> dict:
+        """Return the townarea-streets entry of this street."""
+        data = {"strasseNummer": self.number,
+                "strasseBezeichnung": self.name}
+        if self.blocked:
+            data["blockedHomeNumbers"] = list(self.blocked)
+        return data
+
+    def __getitem__(self, key: str):
+        attr = STREET_FIELDS.get(key)
+        if attr is None:
+            raise KeyError(key)
+        value = getattr(self, attr)
+        if attr == "blocked":
+            return list(value or ())
+        return value
+
+    def get(self, key: str, default=None):
+        """Return the field ``key``, ``default`` if it is unknown."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Street):
+            return NotImplemented
+        return ((self.number, self.name, self.blocked)
+                == (other.number, other.name, other.blocked))
+
+    def __hash__(self) -> int:
+        return hash((self.number, self.name))
+
+    def __repr__(self) -> str:
+        return f"Street({self.number!r}, {self.name!r})"
+
+
+def iter_streets(chunks: Iterable[bytes]) -> Iterator[Street]:
+    """Decode a townarea-streets JSON list while it arrives.
+
+    Each street is yielded as soon as its object is complete, so callers
+    see the first streets before the download finished and the full list
+    of dicts never exists in memory.
+
+    :param chunks: the UTF-8 encoded response body in pieces
+    :raises ValueError: if the body is not a complete JSON list of objects
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    opened = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if not opened:
+                if buffer[pos] != "[":
+                    raise ValueError("expected a JSON list of streets")
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                data, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # the object is not complete yet, wait for more data
+                break
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object per street")
+            yield Street.from_dict(data)
+            pos = end
+    raise ValueError("street list ended early")
+
+
+class StreetIndex:
+    """Substring search over street names.
+
+    Matching is the same as in ``AWLScheduleClient.filter_streets``: a
+    street matches when the lowercased query is part of its lowercased
+    ``strasseBezeichnung``. Results keep the order of the street list.
+    """
+
+    def __init__(self, streets: Sequence[dict], memo_size: int = 64) -> None:
+        """Class initialisation steps.
+
+        :param streets: the townarea-streets list
+        :param memo_size: number of recent query results kept for reuse
+        """
+        self.streets = streets
+        self.names = [street["strasseBezeichnung"].lower()
+                      for street in streets]
+        self._grams: Dict[str, array] = {}
+        for idx, name in enumerate(self.names):
+            for gram in {name[pos:pos + size]
+                         for size in range(1, NGRAM + 1)
+                         for pos in range(len(name) - size + 1)}:
+                postings = self._grams.get(gram)
+                if postings is None:
+                    postings = self._grams[gram] = array("l")
+                postings.append(idx)
+        # the empty query matches everything, it is kept outside the memo
+        # so that it can not be evicted
+        self._everything = array("l", range(len(self.names)))
+        self._memo_size = memo_size
+        self._memo: OrderedDict = OrderedDict()
+
+    def reset(self) -> None:
+        """Forget the memoized query results."""
+        self._memo.clear()
+
+    def search(self, query: str) -> List[dict]:
+        """Return the streets whose name contains ``query``."""
+        return [self.streets[idx] for idx in self.search_indices(query)]
+
+    def search_indices(self, query: str) -> Sequence[int]:
+        """Return the list positions of the streets matching ``query``."""
+        query = query.lower()
+        if not query:
+            return self._everything
+        found = self._memo.get(query)
+        if found is not None:
+            self._memo.move_to_end(query)
+            return found
+
+        candidates = self._candidates(query)
+        if len(query) <= NGRAM:
+            # the n-gram posting list is the exact answer
+            found = candidates
+        else:
+            names = self.names
+            found = array("l", (idx for idx in candidates
+                                if query in names[idx]))
+
+        self._memo[query] = found
+        while len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+        return found
+
+    def _candidates(self, query: str) -> Sequence[int]:
+        """Return a superset of the matches of ``query``."""
+        if len(query) <= NGRAM:
+            return self._grams.get(query, array("l"))
+
+        # the smallest trigram posting list bounds the result
+        postings = sorted((self._grams.get(query[pos:pos + NGRAM], array("l"))
+                           for pos in range(len(query) - NGRAM + 1)), key=len)
+        best = postings[0]
+
+        # typing one more character only narrows the previous result
+        for previous in (query[:-1], query[1:]):
+            narrowed = self._memo.get(previous)
+            if narrowed is not None and len(narrowed) < len(best):
+                best = narrowed
+        return best
+
+
+def normalize_street(name: str) -> str:
+    """Return the key street names are matched with.
+
+    Folds case, umlauts and ß, spells "Straße", "Strasse" and "Str." as
+    "str" and drops hyphens, dots and spaces, so "Goethe-Straße",
+    "Goethestrasse" and "goethestr." all give "goethestr".
+    """
+    key = name.casefold().translate(_UMLAUTS)
+    key = _STREET_WORD.sub("str", key)
+    return _NOT_ALNUM.sub("", key)
+
+
+def edit_distance(left: str, right: str, bound: int) -> int:
+    """Return the Levenshtein distance, or ``bound + 1`` if it is larger."""
+    if abs(len(left) - len(right)) > bound:
+        return bound + 1
+    previous = list(range(len(right) + 1))
+    for row, char in enumerate(left, 1):
+        current = [row]
+        last = row
+        for col, other in enumerate(right):
+            # substitution, deletion and insertion, without min() calls
+            cost = previous[col] + (char != other)
+            if previous[col + 1] < cost:
+                cost = previous[col + 1] + 1
+            if last < cost:
+                cost = last + 1
+            current.append(cost)
+            last = cost
+        if min(current) > bound:
+            return bound + 1
+        previous = current
+    return min(previous[-1], bound + 1)
+
+
+class _BKNode:  # pylint: disable=too-few-public-methods
+    """A key of the BK-tree and its children by distance."""
+
+    __slots__ = ("key", "children")
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.children: Dict[int, _BKNode] = {}
+
+
+class StreetMatcher:
+    """Fuzzy street search over normalized names.
+
+    A query matches a street when its ``normalize_street`` key is part
+    of the street's key, or when the keys are at most ``max_distance``
+    edits apart. Substring matches rank first, then closer keys.
+    """
+
+    # keys are compared exactly up to 4 characters, beyond that up to
+    # this many edits are allowed by default
+    max_distance = 2
+
+    def __init__(self, streets: Sequence) -> None:
+        """Class initialisation steps.
+
+        :param streets: the townarea-streets list, dicts or Street records
+        """
+        self.streets = streets
+        self._positions: Dict[str, List[int]] = {}
+        for idx, street in enumerate(streets):
+            key = normalize_street(street["strasseBezeichnung"])
+            self._positions.setdefault(key, []).append(idx)
+        self._keys = list(self._positions)
+        self._root: Optional[_BKNode] = None
+        for key in self._keys:
+            self._add(key)
+
+    def search(self, query: str, max_distance: Optional[int] = None,
+               limit: Optional[int] = None) -> List[Tuple[object, int]]:
+        """Return ``(street, distance)`` pairs matching ``query``, best first.
+
+        Substring matches have distance 0.
+
+        :param query: the name as typed
+        :param max_distance: edits allowed, by default none for keys of up
+                             to 4 characters and ``max_distance`` beyond
+        :param limit: Optional number of results
+        """
+        key = normalize_street(query)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = 0 if len(key) <= 4 else self.max_distance
+
+        ranked = {found: (0, not found.startswith(key), len(found))
+                  for found in self._keys if key in found}
+        for found, distance in self.within(key, max_distance):
+            ranked.setdefault(found, (distance, True, len(found)))
+        order = sorted(ranked, key=ranked.__getitem__)
+        results = [(self.streets[idx], ranked[found][0])
+                   for found in order for idx in self._positions[found]]
+        return results[:limit] if limit is not None else results
+
+    def best(self, query: str, max_distance: Optional[int] = None):
+        """Return the best match of ``query`` if it is unambiguous.
+
+        An exact key match always wins, otherwise the closest match wins
+        if no other street is as close.
+        """
+        key = normalize_street(query)
+        exact = self._positions.get(key)
+        if exact:
+            return self.streets[exact[0]]
+        if max_distance is None:
+            max_distance = 0 if len(key) <= 4 else self.max_distance
+        found = sorted((distance, name)
+                       for name, distance in self.within(key, max_distance))
+        if not found or (len(found) > 1 and found[1][0] == found[0][0]):
+            return None
+        return self.streets[self._positions[found[0][1]][0]]
+
+    def within(self, key: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Return the indexed keys at most ``max_distance`` edits away."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            # children are only searched in the band around the distance,
+            # a distance beyond the widest band needs not be exact
+            bound = max_distance + max(node.children, default=0)
+            distance = edit_distance(key, node.key, bound)
+            if distance <= max_distance:
+                found.append((node.key, distance))
+            low = distance - max_distance
+            high = distance + max_distance
+            for child_distance, child in node.children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+        return found
+
+    def _add(self, key: str) -> None:
+        """Insert ``key`` into the BK-tree."""
+        if self._root is None:
+            self._root = _BKNode(key)
+            return
+        node = self._root
+        while True:
+            distance = edit_distance(key, node.key, len(key) + len(node.key))
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(key)
+                return
+            node = child
@@ -0,0 +1,234 @@
+"""Incremental synchronisation of pickup schedules.
+
+The calendar of a street rarely changes once it is published. The sync
+keeps every month of a street in a ``MonthStore`` together with the time
+it was fetched and a hash of its content, and only asks the portal again
+for months that are too old or still likely to change. Months whose hash
+changed are compared day by day, so callers learn which pickups were
+added, removed or moved instead of just "something is different".
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from awl_cache import (Month, month_hash, month_key, plan_queries,
+                       scope_months)
+
+if TYPE_CHECKING:
+    from awl_schedule import AWLScheduleClient
+
+# a pickup of one bin on one day
+Pickup = Tuple[date, str]
+
+
+@dataclass
+class ScheduleChanges:  # pylint: disable=too-many-instance-attributes
+    """Outcome of syncing the schedule of one street."""
+
+    street: str
+    # months asked from the portal and months answered from the store
+    fetched: List[Month] = field(default_factory=list)
+    skipped: List[Month] = field(default_factory=list)
+    changed_months: List[Month] = field(default_factory=list)
+    added: List[Pickup] = field(default_factory=list)
+    removed: List[Pickup] = field(default_factory=list)
+    # (bin, old day, new day)
+    moved: List[Tuple[str, date, date]] = field(default_factory=list)
+    requests: int = 0
+
+    @property
+    def changed(self) -> bool:
+        """Check if any pickup was added, removed or moved."""
+        return bool(self.added or self.removed or self.moved)
+
+    def days(self) -> List[date]:
+        """Return the days whose pickups changed, sorted."""
+        changed = {day for day, _ in self.added + self.removed}
+        for _, old, new in self.moved:
+            changed.update((old, new))
+        return sorted(changed)
+
+    def lines(self) -> List[str]:
+        """Return a human readable line per change."""
+        lines = [f"{name}: {old:%d.%m.%Y} -> {new:%d.%m.%Y}"
+                 for name, old, new in self.moved]
+        lines += [f"{name}: new pickup on {day:%d.%m.%Y}"
+                  for day, name in self.added]
+        lines += [f"{name}: no pickup on {day:%d.%m.%Y} any more"
+                  for day, name in self.removed]
+        return lines
+
+
+def diff_pickups(old: dict, new: dict,
+                 move_window: int = 7) -> Tuple[List[Pickup], List[Pickup],
+                                                List[Tuple[str, date, date]]]:
+    """Compare two calendar responses day by day.
+
+    A bin that disappears from one day and appears on another day at most
+    ``move_window`` days away counts as moved, everything else as added or
+    removed.
+
+    :return: the added pickups, removed pickups and moves
+    """
+    before = _pickup_set(old)
+    after = _pickup_set(new)
+    added = sorted(after - before)
+    removed = sorted(before - after)
+
+    moved = []
+    unmatched = []
+    for day, name in removed:
+        # the closest unclaimed new pickup of the same bin
+        candidates = [(abs((other - day).days), idx)
+                      for idx, (other, other_name) in enumerate(added)
+                      if other_name == name
+                      and abs((other - day).days) <= move_window]
+        if candidates:
+            _, idx = min(candidates)
+            moved.append((name, day, added.pop(idx)[0]))
+        else:
+            unmatched.append((day, name))
+    return added, unmatched, moved
+
+
+class ScheduleSync:
+    """Fetch only the stale and volatile months of a street's calendar."""
+
+    def __init__(self, client: AWLScheduleClient,
+                 max_age: Optional[float] = None,
+                 volatile_months: Optional[int] = None,
+                 move_window: int = 7) -> None:
+        """Class initialisation steps.
+
+        :param client: client used to fetch the calendars
+        :param max_age: seconds after which a stored month is fetched
+                        again, defaults to ``config.sync_max_age``
+        :param volatile_months: months from the current one on that are
+                                always fetched, defaults to
+                                ``config.sync_volatile_months``
+        :param move_window: days a pickup may move and still count as
+                            moved rather than removed and added
+        """
+        self.client = client
+        self.max_age = (client.config.sync_max_age if max_age is None
+                        else max_age)
+        self.volatile_months = (client.config.sync_volatile_months
+                                if volatile_months is None
+                                else volatile_months)
+        self.move_window = move_window
+
+    def stale_months(self, records: Dict[str, dict],
+                     months: Iterable[Month],
+                     today: Optional[date] = None) -> List[Month]:
+        """Return the months that have to be fetched again."""
+        today = today or date.today()
+        now = time.time()
+        current = today.year * 12 + today.month - 1
+        volatile = {divmod(current + offset, 12)
+                    for offset in range(self.volatile_months)}
+        stale = []
+        for item in months:
+            record = records.get(month_key(item))
+            if (item in volatile or record is None
+                    or now - record.get("fetched", 0) >= self.max_age):
+                stale.append(item)
+        return stale
+
+    def sync(self, street=None, scope: str = "y",
+             today: Optional[date] = None) -> ScheduleChanges:
+        """Bring the stored months of ``street`` up to date.
+
+        :param street: strasseNummer, defaults to the configured street
+        :param scope: the months to keep in sync, as in
+                      ``get_pickup_dates``
+        :param today: the day the scope starts from, defaults to today
+        """
+        today = today or date.today()
+        if street is None:
+            street = self.client.config.strasse_nummer
+        street = str(street)
+        url = self.client.config.api_url
+        records = self.client.month_store.load(url, street)
+        months = scope_months(today.year, today.month, scope)
+        stale = self.stale_months(records, months, today)
+        changes = ScheduleChanges(street=street)
+        if not stale:
+            changes.skipped = list(months)
+            return changes
+
+        changed = self._fetch(street, stale, records, changes)
+        if changed:
+            changes.added, changes.removed, changes.moved = diff_pickups(
+                {key: days[0] for key, days in changed.items()},
+                {key: days[1] for key, days in changed.items()},
+                self.move_window)
+            # the stored yearly responses are outdated now
+            self.client.schedule_file.invalidate(street)
+        self.client.month_store.store(url, street, records)
+        changes.skipped = [item for item in months
+                           if item not in changes.fetched]
+        return changes
+
+    def _fetch(self, street: str, stale: List[Month], records: Dict[str, dict],
+               changes: ScheduleChanges) -> Dict[str, Tuple[dict, dict]]:
+        """Fetch the ``stale`` months and update their ``records``.
+
+        :return: the old and new days of each month that changed
+        """
+        changed: Dict[str, Tuple[dict, dict]] = {}
+        fetched_at = time.time()
+        for start, scope in plan_queries(stale):
+            first = datetime(start[0], start[1] + 1, 1)
+            pickups = self.client.fetch_schedule(street, first, scope)
+            changes.requests += 1
+            self.client.schedule_cache.put(street, first.year, first.month,
+                                           scope, pickups)
+            for item in scope_months(first.year, first.month, scope):
+                key = month_key(item)
+                days = pickups.get(key, {})
+                previous = _record(records, key, days, fetched_at)
+                changes.fetched.append(item)
+                if previous is not None:
+                    changes.changed_months.append(item)
+                    changed[key] = (previous, days)
+        return changed
+
+
+def _record(records: Dict[str, dict], key: str, days: dict,
+            fetched_at: float) -> Optional[dict]:
+    """Store a fetched month, return its old days if the content changed."""
+    previous = records.get(key)
+    digest = month_hash(days)
+    records[key] = {"fetched": fetched_at, "hash": digest, "days": days}
+    if previous is None or previous.get("hash") == digest:
+        return None
+    return previous.get("days", {})
+
+
+def _pickup_set(pickups: dict) -> Set[Pickup]:
+    """Return the ``(day, bin)`` pairs of a calendar response."""
+    found = set()
+    for month_year, days in pickups.items():
+        month, year = map(int, month_year.split('-'))
+        for day, day_bins in days.items():
+            when = date(year, month + 1, int(day))
+            found.update((when, name) for name in day_bins)
+    return found
+
+
+def run_sync(client: AWLScheduleClient, streets: List[str],
+             scope: str) -> None:
+    """Sync the schedules of ``streets`` and print what changed."""
+    sync = ScheduleSync(client)
+    for street in streets or [client.config.strasse_nummer]:
+        changes = sync.sync(street, scope)
+        print(f"{changes.street}: fetched {len(changes.fetched)} of "
+              f"{len(changes.fetched) + len(changes.skipped)} months in "
+              f"{changes.requests} requests, "
+              f"{len(changes.days())} days changed")
+        for line in changes.lines():
+            print(f"  {line}")
@@ -0,0 +1 @@
+"""Benchmarks for the AWL schedule client, run with ``python -m bench``."""
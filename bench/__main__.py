@@ -0,0 +1,7 @@
+"""Run the benchmark suite, see ``bench.benchmarks``."""
+
+import sys
+
+from bench.benchmarks import main
+
+sys.exit(main())
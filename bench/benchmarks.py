@@ -0,0 +1,275 @@
+"""Benchmark suite for the AWL schedule client.
+
+Every benchmark runs against a local ``FakeAWLServer`` so results do not
+depend on the portal. Results are written as JSON and can be compared
+with an earlier run to catch regressions::
+
+    python -m bench --output bench.json
+    python -m bench --compare bench.json --threshold 1.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from awl_async import AsyncAWLScheduleClient
+from awl_batch import BatchSchedules
+from awl_pickups import PickupSchedule
+from awl_schedule import AWLScheduleClient
+from awl_streets import StreetIndex
+from bench.fake_server import FakeAWLServer
+
+# name -> factory returning the function to time
+BENCHMARKS: Dict[str, Callable[[Context], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark factory under ``name``."""
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+@dataclass
+class Context:
+    """Shared fixtures of a benchmark run."""
+
+    server: FakeAWLServer
+    client: AWLScheduleClient
+    streets: list
+    pickups: dict
+    bulk_streets: int
+
+
+def make_client(server: FakeAWLServer, directory: str) -> AWLScheduleClient:
+    """Return a client configured for ``server`` with retries disabled."""
+    config_path = f"{directory}/awl.conf"
+    with open(config_path, "w", encoding="utf-8") as handle:
+        json.dump({"API_URL": server.api_url, "strasseNummer": 1000,
+                   "strasseBezeichnung": "Benchmark", "RETRIES": 0,
+                   "CACHE_DIR": directory}, handle)
+    return AWLScheduleClient(config_path)
+
+
+@benchmark("filter_streets.build_and_type")
+def bench_filter_streets_cold(ctx: Context):
+    """Index the street list and type a name, one key at a time."""
+    query = "goethe"
+
+    def run():
+        index = StreetIndex(ctx.streets)
+        for end in range(1, len(query) + 1):
+            index.search(query[:end])
+    return run
+
+
+@benchmark("filter_streets.keystroke")
+def bench_filter_streets(ctx: Context):
+    """One keystroke on an already built index."""
+    index = ctx.client.street_index(ctx.streets)
+    queries = ["b", "be", "ber", "berg", "bergs", "bergst"]
+    state = {"pos": 0}
+
+    def run():
+        query = queries[state["pos"] % len(queries)]
+        state["pos"] += 1
+        if query == queries[0]:
+            index.reset()
+        return ctx.client.filter_streets(query, ctx.streets)
+    return run
+
+
+@benchmark("street_matcher.fuzzy")
+def bench_street_matcher(ctx: Context):
+    """A misspelled street name that needs the edit distance search."""
+    matcher = ctx.client.street_matcher(ctx.streets)
+    return lambda: matcher.search("Göthe-Schilerstrase")
+
+
+@benchmark("filter_pickups_by_bins")
+def bench_filter_pickups(ctx: Context):
+    """Filter a yearly response down to two bins."""
+    return lambda: ctx.client.filter_pickups_by_bins(ctx.pickups,
+                                                     ["gelb", "pink"])
+
+
+@benchmark("filter_next_available_day")
+def bench_next_day(ctx: Context):
+    """Find the next pickup in a yearly response."""
+    return lambda: ctx.client.filter_next_available_day(ctx.pickups)
+
+
+@benchmark("pickup_schedule.next_pickup")
+def bench_schedule_next(ctx: Context):
+    """Find the next pickup of one bin in an indexed schedule."""
+    schedule = PickupSchedule.from_pickups(ctx.pickups)
+    return lambda: schedule.next_pickup(bins=["gelb"])
+
+
+@benchmark("batch_schedules.next_pickup")
+def bench_batch_next(ctx: Context):
+    """Find the next pickup of one bin at many streets at once."""
+    schedule = PickupSchedule.from_pickups(ctx.pickups)
+    batch = BatchSchedules({number: schedule for number in range(1000)})
+    return lambda: batch.next_pickup(bins=["gelb"])
+
+
+@benchmark("get_pickup_dates.uncached")
+def bench_get_pickup_dates_cold(ctx: Context):
+    """A month query that has to go to the server."""
+    def run():
+        ctx.client.invalidate_schedule()
+        return ctx.client.get_pickup_dates(scope="m", bins=["gelb"])
+    return run
+
+
+@benchmark("get_pickup_dates.cached")
+def bench_get_pickup_dates_warm(ctx: Context):
+    """A month query answered from the schedule cache."""
+    ctx.client.get_pickup_dates(scope="y")
+    return lambda: ctx.client.get_pickup_dates(scope="m", bins=["gelb"])
+
+
+@benchmark("fetch_many")
+def bench_fetch_many(ctx: Context):
+    """Fetch the yearly schedules of many streets concurrently."""
+    numbers = [street["strasseNummer"]
+               for street in ctx.streets[:ctx.bulk_streets]]
+
+    async def fetch_all():
+        async with AsyncAWLScheduleClient(client=ctx.client) as bulk:
+            async for _ in bulk.fetch_many(numbers, scope="y"):
+                pass
+
+    def run():
+        ctx.client.invalidate_schedule()
+        asyncio.run(fetch_all())
+    return run
+
+
+def measure(func: Callable[[], object], repeat: int,
+            min_time: float) -> dict:
+    """Time ``func`` and return per-call statistics in seconds."""
+    func()  # warm up
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    samples.sort()
+    return {
+        "calls": number * repeat,
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def run_suite(args: argparse.Namespace) -> dict:
+    """Run the selected benchmarks and return the result document."""
+    results: List[dict] = []
+    with FakeAWLServer(latency=args.latency, streets=args.streets,
+                       recording=args.recording) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        client = make_client(server, directory)
+        ctx = Context(server=server, client=client,
+                      streets=client.fetch_streets(),
+                      pickups=client.get_pickup_dates(scope="y"),
+                      bulk_streets=args.bulk_streets)
+        for name, factory in BENCHMARKS.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            stats = measure(factory(ctx), args.repeat, args.min_time)
+            stats["name"] = name
+            results.append(stats)
+            print(f"{name:32} median {stats['median'] * 1e6:12.1f} us  "
+                  f"p95 {stats['p95'] * 1e6:12.1f} us", file=sys.stderr)
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "streets": args.streets,
+            "bulk_streets": args.bulk_streets,
+            "recording": args.recording,
+        },
+        "results": results,
+    }
+
+
+def compare(document: dict, baseline_path: str, threshold: float) -> List[str]:
+    """Return the benchmarks slower than ``threshold`` times the baseline."""
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = {entry["name"]: entry
+                    for entry in json.load(handle)["results"]}
+    regressions = []
+    for entry in document["results"]:
+        old: Optional[dict] = baseline.get(entry["name"])
+        if old and entry["median"] > old["median"] * threshold:
+            regressions.append(
+                f"{entry['name']}: {old['median'] * 1e6:.1f} us -> "
+                f"{entry['median'] * 1e6:.1f} us")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit status."""
+    ap = argparse.ArgumentParser(prog="python -m bench")
+    ap.add_argument("--output", help="write the JSON results to this file")
+    ap.add_argument("--compare", help="JSON results of an earlier run")
+    ap.add_argument("--threshold", type=float, default=1.25,
+                    help="allowed slowdown factor against --compare")
+    ap.add_argument("--latency", type=float, default=0.0,
+                    help="seconds the fake server adds to each response")
+    ap.add_argument("--streets", type=int, default=2000,
+                    help="number of synthetic streets")
+    ap.add_argument("--bulk-streets", type=int, default=200,
+                    help="streets fetched by the fetch_many benchmark")
+    ap.add_argument("--recording", help="recorded responses to serve")
+    ap.add_argument("--repeat", type=int, default=5,
+                    help="timed rounds per benchmark")
+    ap.add_argument("--min-time", type=float, default=0.2,
+                    help="minimum seconds per timed round")
+    ap.add_argument("--only", action="append",
+                    help="run benchmarks whose name contains this")
+    args = ap.parse_args(argv)
+
+    document = run_suite(args)
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(document, args.compare, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
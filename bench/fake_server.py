@@ -0,0 +1,230 @@
+"""Local stand-in for the AWL calendar API.
+
+Serves ``/townarea-streets`` and the calendar endpoint from synthetic or
+recorded data with a configurable latency, so benchmarks measure the
+client and not the portal. A recording is a JSON object::
+
+    {"streets": [<townarea-streets entries>],
+     "schedules": {"<strasseNummer>": {"<year>": <isYear response>}}}
+"""
+
+from __future__ import annotations
+
+import calendar
+import hashlib
+import json
+import pathlib
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = "/api/v1/calendar"
+BINS = ("blau", "braun", "gelb", "grau", "pink")
+WORDS = ("Goethe", "Schiller", "Berg", "Markt", "Kirch", "Linden", "Büttger",
+         "Rosen", "Neusser", "Garten", "Wald", "Post", "Bahnhof", "Mühlen")
+SUFFIXES = ("strasse", "straße", "weg", "platz", "allee", "str.")
+
+
+def synthetic_streets(count: int) -> list:
+    """Return ``count`` townarea-streets entries with plausible names."""
+    streets = []
+    for idx in range(count):
+        name = (WORDS[idx % len(WORDS)]
+                + WORDS[idx // len(WORDS) % len(WORDS)].lower()
+                + SUFFIXES[idx % len(SUFFIXES)])
+        if idx % 5 == 0:
+            name = f"{name} {idx % 40 + 1}-{idx % 40 + 60}"
+        streets.append({"strasseNummer": 1000 + idx,
+                        "strasseBezeichnung": name,
+                        "blockedHomeNumbers": []})
+    return streets
+
+
+def synthetic_year(street: int, year: int) -> dict:
+    """Return an isYear calendar response for ``street``.
+
+    Streets share their calendar in groups of seven, like collection
+    districts do.
+    """
+    district = street % 7
+    pickups = {}
+    for month0 in range(12):
+        days = {}
+        for day in range(1, calendar.monthrange(year, month0 + 1)[1] + 1):
+            names = [name for idx, name in enumerate(BINS)
+                     if (day + month0 * 3 + district + idx * 2) % 7 == 0]
+            if names:
+                days[str(day)] = names
+        pickups[f"{month0}-{year}"] = days
+    return pickups
+
+
+class FakeAWLServer(ThreadingHTTPServer):  # pylint: disable=too-many-instance-attributes
+    """Threaded HTTP server answering like the AWL portal."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0,
+                 streets: int = 500,
+                 recording: Optional[str | pathlib.Path] = None,
+                 rate_limit: Optional[float] = None) -> None:
+        """Class initialisation steps.
+
+        :param port: port to listen on, 0 picks a free one
+        :param latency: seconds added to every response
+        :param streets: number of synthetic streets
+        :param recording: Optional recorded responses to serve instead
+        :param rate_limit: Optional requests per second above which the
+                           server answers 429 like a throttling portal
+        """
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.throttled = 0
+        # requests being answered now and the most there were at once
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._allowance = rate_limit or 0.0
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+        self._schedules: dict = {}
+        if recording:
+            data = json.loads(pathlib.Path(recording).read_text(
+                encoding="utf-8"))
+            self.streets = data["streets"]
+            self._schedules = data.get("schedules", {})
+        else:
+            self.streets = synthetic_streets(streets)
+        self.streets_body = json.dumps(self.streets).encode("utf-8")
+        self.streets_etag = f'"{hashlib.sha1(self.streets_body).hexdigest()}"'
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_url(self) -> str:
+        """The calendar URL to put into ``API_URL``."""
+        return f"http://127.0.0.1:{self.server_address[1]}{API_PATH}"
+
+    def start(self) -> FakeAWLServer:
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> FakeAWLServer:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def enter(self) -> None:
+        """Count a request as in flight until ``leave`` is called."""
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self) -> None:
+        """Count a request as answered."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def admit(self) -> bool:
+        """Check if a request fits into ``rate_limit``, count it if not."""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate_limit, self._allowance
+                                  + (now - self._checked) * self.rate_limit)
+            self._checked = now
+            if self._allowance >= 1:
+                self._allowance -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def calendar(self, params: dict) -> dict:
+        """Return the calendar response for the query ``params``."""
+        start = datetime.strptime(params["startMonth"], "%b %Y")
+        street = str(params["streetNum"])
+        if params.get("isYear") == "true":
+            return self._year(street, start.year)
+        count = 3 if params.get("isTreeMonthRange") == "true" else 1
+        pickups = {}
+        for offset in range(count):
+            year, month0 = divmod(start.year * 12 + start.month - 1 + offset,
+                                  12)
+            key = f"{month0}-{year}"
+            pickups[key] = self._year(street, year).get(key, {})
+        return pickups
+
+    def _year(self, street: str, year: int) -> dict:
+        recorded = self._schedules.get(street, {}).get(str(year))
+        if recorded is not None:
+            return recorded
+        return synthetic_year(int(street), year)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of ``FakeAWLServer``."""
+
+    protocol_version = "HTTP/1.1"
+    # send headers and body in one segment, avoids delayed ACK stalls
+    wbufsize = -1
+    server: FakeAWLServer
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keep the benchmark output clean."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer a streets or calendar request."""
+        self.server.enter()
+        try:
+            self._answer()
+        finally:
+            self.server.leave()
+
+    def _answer(self) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.admit():
+            self._send(429, b'{"error": "too many requests"}')
+            return
+        url = urlsplit(self.path)
+        if url.path == f"{API_PATH}/townarea-streets":
+            etag = self.server.streets_etag
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", etag)
+                return
+            self._send(200, self.server.streets_body, etag)
+        elif url.path == API_PATH:
+            params = {key: values[-1]
+                      for key, values in parse_qs(url.query).items()}
+            try:
+                body = json.dumps(self.server.calendar(params)).encode()
+            except (KeyError, ValueError):
+                self._send(400, b'{"error": "bad query"}')
+                return
+            self._send(200, body)
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def _send(self, status: int, body: bytes,
+              etag: Optional[str] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,156 @@
+"""Start up time of the command line tool on the cached path.
+
+With a complete ``awl.conf`` and a fresh schedule in the cache directory
+the tool must answer without loading the HTTP stack. This benchmark
+warms the cache once against a ``FakeAWLServer``, then times complete
+runs of ``awl_schedule.py``. The budget applies to the time on top of a
+bare interpreter start, which depends on the machine and not on us::
+
+    python -m bench.startup --budget 0.075
+
+That time is about 50 ms on a machine where the bare interpreter takes
+60 ms to start, about 15 ms of it compiling ``awl_schedule.py``, which
+Python never caches for the script it runs, and 10 ms ``dataclasses``.
+Loading ``requests`` or ``awl_streets`` would add to it, the run fails
+on its own if any of the lazy modules gets imported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bench.fake_server import FakeAWLServer
+
+SCRIPT = pathlib.Path(__file__).resolve().parent.parent / "awl_schedule.py"
+
+# modules a cached run must not load
+LAZY_MODULES = ("requests", "urllib3", "curses", "awl_streets")
+
+# runs the tool in-process and reports which lazy modules got loaded
+IMPORT_CHECK = """
+import json, runpy, sys
+sys.argv = [{script!r}, "-c", {config!r}]
+runpy.run_path({script!r}, run_name="__main__")
+print("LOADED", json.dumps([name for name in {lazy!r}
+                            if name in sys.modules]))
+"""
+
+
+def time_runs(command: List[str], runs: int,
+              env: Optional[Dict[str, str]] = None) -> List[float]:
+    """Return the sorted wall times of ``runs`` runs of ``command``."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                       env=env)
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)
+
+
+def loaded_modules(config: str) -> List[str]:
+    """Return the lazily imported modules a cached run loads."""
+    result = subprocess.run(
+        [sys.executable, "-c",
+         IMPORT_CHECK.format(script=str(SCRIPT), config=config,
+                             lazy=LAZY_MODULES)],
+        check=True, capture_output=True, text=True)
+    line = result.stdout.strip().splitlines()[-1]
+    return json.loads(line.split(" ", 1)[1])
+
+
+def bytecode_env(directory: str) -> Dict[str, str]:
+    """Return an environment that caches bytecode below ``directory``.
+
+    An installed tool imports its modules from ``__pycache__``, runs with
+    ``PYTHONDONTWRITEBYTECODE`` would time compiling them instead.
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=str(
+        pathlib.Path(directory) / "pycache"))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def run_cached(runs: int) -> Tuple[List[float], float, List[str], int]:
+    """Time cached runs.
+
+    :return: the samples, the median bare interpreter start, the lazy
+             modules loaded and the requests sent
+    """
+    with FakeAWLServer() as server, \
+            tempfile.TemporaryDirectory() as directory:
+        config = str(pathlib.Path(directory) / "awl.conf")
+        pathlib.Path(config).write_text(json.dumps({
+            "API_URL": server.api_url, "strasseNummer": 1000,
+            "strasseBezeichnung": "Benchmark"}), encoding="utf-8")
+        command = [sys.executable, str(SCRIPT), "-c", config]
+        env = bytecode_env(directory)
+        # the first run fills the cache directory and the bytecode cache
+        time_runs(command, 1, env)
+        requests_before = server.requests
+        # alternate the runs, a busy machine slows both alike
+        samples, bare = [], []
+        for _ in range(runs):
+            samples += time_runs(command, 1, env)
+            bare += time_runs([sys.executable, "-c", "pass"], 1, env)
+        samples.sort()
+        interpreter = statistics.median(bare)
+        loaded = loaded_modules(config)
+        return samples, interpreter, loaded, server.requests - requests_before
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit status."""
+    ap = argparse.ArgumentParser(prog="python -m bench.startup")
+    ap.add_argument("--budget", type=float, default=0.075,
+                    help="allowed median seconds on top of a bare "
+                         "interpreter start")
+    ap.add_argument("--runs", type=int, default=10,
+                    help="timed runs")
+    ap.add_argument("--output", help="write the JSON result to this file")
+    args = ap.parse_args(argv)
+
+    samples, interpreter, loaded, upstream = run_cached(args.runs)
+
+    result = {
+        "name": "cli.startup_cached",
+        "runs": args.runs,
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "max": samples[-1],
+        "interpreter": interpreter,
+        "overhead": statistics.median(samples) - interpreter,
+        "budget": args.budget,
+        "upstream_requests": upstream,
+        "lazy_modules_loaded": loaded,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        pathlib.Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+    failures = []
+    if result["overhead"] > args.budget:
+        failures.append(f"{result['overhead'] * 1000:.1f} ms on top of the "
+                        f"interpreter is over the "
+                        f"{args.budget * 1000:.0f} ms budget")
+    if loaded:
+        failures.append(f"cached run imported {', '.join(loaded)}")
+    if upstream:
+        failures.append(f"cached runs sent {upstream} requests")
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Shared fixtures of the test suite."""
+
+from __future__ import annotations
+
+import json
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# pylint: disable-next=wrong-import-position
+from bench.fake_server import FakeAWLServer
+
+
+@pytest.fixture
+def server():
+    """A ``FakeAWLServer`` serving in the background."""
+    with FakeAWLServer(streets=40) as fake:
+        yield fake
+
+
+@pytest.fixture
+def make_client(server, tmp_path):  # pylint: disable=redefined-outer-name
+    """Return a factory of clients configured for ``server``.
+
+    Keyword arguments are ``awl.conf`` keys added to the configuration.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from awl_schedule import AWLScheduleClient
+
+    def factory(**conf):
+        config = {"API_URL": server.api_url, "strasseNummer": 1000,
+                  "strasseBezeichnung": "Test", "RETRIES": 0,
+                  "CACHE_DIR": str(tmp_path)}
+        config.update(conf)
+        config_path = tmp_path / "awl.conf"
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+        return AWLScheduleClient(config_path)
+    return factory
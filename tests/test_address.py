@@ -0,0 +1,127 @@
+"""Tests of the house number aware address resolution."""
+
+import io
+import random
+
+import pytest
+
+from awl_address import (EVEN, MAX_HOUSE_NUMBER, ODD, AddressResolver,
+                         StreetRange, house_number_key, parse_address,
+                         parse_house_number, parse_street, resolve_csv)
+from awl_streets import normalize_street
+from bench.fake_server import synthetic_streets
+
+STREETS = [
+    {"strasseNummer": 1, "strasseBezeichnung": "Goethestraße"},
+    {"strasseNummer": 2, "strasseBezeichnung": "Further Straße 1-99 ungerade"},
+    {"strasseNummer": 3, "strasseBezeichnung": "Further Straße 2-98 gerade",
+     "blockedHomeNumbers": ["12", "14a"]},
+    {"strasseNummer": 4, "strasseBezeichnung": "Further Straße ab 100"},
+    {"strasseNummer": 5, "strasseBezeichnung": "Marktplatz 1-20"},
+    {"strasseNummer": 6, "strasseBezeichnung": "Marktplatz 5-9"},
+    {"strasseNummer": 7, "strasseBezeichnung": "Straße des 17. Juni"},
+    {"strasseNummer": 8, "strasseBezeichnung": "Kirchweg bis 19"},
+    {"strasseNummer": 9, "strasseBezeichnung": "Kirchweg 20 - 40, 44"},
+]
+
+
+@pytest.mark.parametrize("name, parsed", [
+    ("Goethestrasse", ("Goethestrasse", [], None)),
+    ("Further Straße 1-99 ungerade", ("Further Straße", [(1, 99)], ODD)),
+    ("Hauptstraße 2 - 40 gerade", ("Hauptstraße", [(2, 40)], EVEN)),
+    ("Kirchweg ab 20", ("Kirchweg", [(20, MAX_HOUSE_NUMBER)], None)),
+    ("Kirchweg bis 19", ("Kirchweg", [(0, 19)], None)),
+    ("Straße des 17. Juni", ("Straße des 17. Juni", [], None)),
+    ("Marktplatz 1, 3, 5-9", ("Marktplatz", [(1, 1), (3, 3), (5, 9)], None)),
+    ("Bergstr. 10a-20", ("Bergstr.", [(10, 20)], None)),
+    ("Weg 30-10", ("Weg", [(10, 30)], None)),
+    ("Am Markt Nr. 4 und 6", ("Am Markt", [(4, 4), (6, 6)], None)),
+])
+def test_parse_street(name, parsed):
+    """Names and house number ranges are told apart."""
+    assert parse_street(name) == parsed
+
+
+def test_parse_address():
+    """The house number is split off the end of an address."""
+    assert parse_address("Goethestraße 12a") == ("Goethestraße", "12a")
+    assert parse_address(" Am Markt 4 b ") == ("Am Markt", "4 b")
+    assert parse_address("Goethestraße") == ("Goethestraße", None)
+    assert parse_address("Straße des 17. Juni 5") == ("Straße des 17. Juni",
+                                                      "5")
+
+
+@pytest.mark.parametrize("address, number", [
+    ("Goethestraße 3", 1),
+    ("goethestrasse", 1),
+    ("Further Straße 17", 2),
+    ("Further Straße 18", 3),
+    ("Further Straße 100", 4),
+    ("Further Straße 2000", 4),
+    ("Marktplatz 7", 6),
+    ("Marktplatz 12", 5),
+    ("Marktplatz 21", None),
+    ("Kirchweg 19", 8),
+    ("Kirchweg 44", 9),
+    ("Kirchweg 42", None),
+    ("Straße des 17. Juni 5", 7),
+    ("Unbekannter Weg 1", None),
+    # the street is split, the number is needed
+    ("Further Straße", None),
+])
+def test_resolve(address, number):
+    """Addresses resolve to the narrowest covering entry."""
+    assert AddressResolver(STREETS).resolve(address) == number
+
+
+def test_blocked_numbers():
+    """Blocked numbers are excluded, a plain one with all its suffixes."""
+    resolver = AddressResolver(STREETS)
+    assert resolver.resolve("Further Straße", 10) == 3
+    assert resolver.resolve("Further Straße", 12) is None
+    assert resolver.resolve("Further Straße", "12b") is None
+    assert resolver.resolve("Further Straße", "14") == 3
+    assert resolver.resolve("Further Straße", "14 A") is None
+
+
+def _brute_force(streets, street, house_number):
+    """Resolve by checking every range of every entry."""
+    house = parse_house_number(house_number)
+    found = []
+    for entry in streets:
+        base, ranges, parity = parse_street(entry["strasseBezeichnung"])
+        if normalize_street(base) != normalize_street(street):
+            continue
+        for low, high in ranges or [(0, MAX_HOUSE_NUMBER)]:
+            if StreetRange(entry["strasseNummer"], low, high, parity,
+                           entry.get("blockedHomeNumbers") or ()).covers(
+                               house, house_number_key(str(house_number))):
+                found.append(((high - low, parity is None), len(found),
+                              entry["strasseNummer"]))
+    return min(found)[2] if found else None
+
+
+def test_resolver_matches_brute_force():
+    """The interval index gives the answer of a linear scan."""
+    streets = STREETS + synthetic_streets(300)
+    resolver = AddressResolver(streets)
+    names = sorted({parse_street(street["strasseBezeichnung"])[0]
+                    for street in streets})
+    rng = random.Random(19)
+    for _ in range(500):
+        street = rng.choice(names)
+        house_number = f"{rng.randint(0, 130)}{rng.choice(['', '', 'a'])}"
+        assert (resolver.resolve(street, house_number)
+                == _brute_force(streets, street, house_number)), (
+                    street, house_number)
+
+
+def test_resolve_csv():
+    """Rows keep their columns and get the strasseNummer added."""
+    source = io.StringIO("id,strasse,hausnummer\n1,Further Straße,18\n"
+                         "2,Further Straße,12\n")
+    target = io.StringIO()
+    assert resolve_csv(AddressResolver(STREETS), source, target) == (2, 1)
+    assert target.getvalue().splitlines() == [
+        "id,strasse,hausnummer,strasseNummer", "1,Further Straße,18,3",
+        "2,Further Straße,12,"]
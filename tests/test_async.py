@@ -0,0 +1,33 @@
+"""Tests of the asyncio bulk client against the local stand-in server."""
+
+import asyncio
+
+from awl_async import AsyncAWLScheduleClient
+
+STREETS = [str(number) for number in range(1000, 1012)]
+
+
+async def _fetch_all(client, concurrency, **kwargs):
+    async with AsyncAWLScheduleClient(client=client,
+                                      concurrency=concurrency) as bulk:
+        return {street: pickups async for street, pickups
+                in bulk.fetch_many(STREETS, **kwargs)}
+
+
+def test_fetch_many_matches_the_sync_client(make_client, tmp_path):
+    """Every street gets what ``get_pickup_dates`` returns for it."""
+    found = asyncio.run(_fetch_all(make_client(), 4, scope="3m",
+                                   bins=["gelb", "pink"]))
+    sync = make_client(CACHE_DIR=str(tmp_path / "sync"))
+    assert found == {street: sync.get_pickup_dates(
+        scope="3m", bins=["gelb", "pink"], street=street)
+        for street in STREETS}
+
+
+def test_fetch_many_bounds_the_requests_in_flight(make_client, server):
+    """No more than ``concurrency`` requests reach the server at once."""
+    server.latency = 0.05
+    found = asyncio.run(_fetch_all(make_client(), 3, scope="y"))
+    assert sorted(found) == STREETS
+    assert server.requests == len(STREETS)
+    assert server.max_in_flight == 3
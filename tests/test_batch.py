@@ -0,0 +1,106 @@
+"""Parity of the batch engine with the scalar ``PickupSchedule`` queries.
+
+Every test runs once with NumPy, if it is installed, and once on the
+fallback that is used without it.
+"""
+
+from datetime import date
+
+import pytest
+
+import awl_batch
+from awl_batch import BatchSchedules
+from awl_pickups import DEFAULT_BINS, PickupSchedule
+from bench.fake_server import synthetic_year
+
+DAYS = [date(2024, 6, 1), date(2025, 3, 14), date(2025, 12, 20),
+        date(2025, 12, 30), date(2025, 12, 31), date(2026, 1, 1),
+        date(2026, 7, 31), date(2026, 12, 30), date(2026, 12, 31)]
+BINS = [None, ["gelb"], ["blau", "pink"], ["pink", "lila"], ["lila"],
+        ["unknown"]]
+
+
+def _schedules():
+    schedules = {}
+    for number in range(1000, 1008):
+        pickups = dict(synthetic_year(number, 2025))
+        pickups.update(synthetic_year(number, 2026))
+        schedules[number] = PickupSchedule.from_pickups(pickups)
+    # a bin no other street knows, around the turn of the year
+    schedules[2000] = PickupSchedule.from_pickups(
+        {"11-2025": {"31": ["lila", "gelb"]}, "0-2026": {"1": ["lila"]}})
+    schedules[2001] = PickupSchedule.from_pickups({}, DEFAULT_BINS)
+    return schedules
+
+
+@pytest.fixture(name="engine", params=["numpy", "fallback"])
+def fixture_engine(request, monkeypatch):
+    """Select the NumPy engine or the fallback for a test."""
+    if request.param == "numpy" and awl_batch.np is None:
+        pytest.skip("NumPy is not installed")
+    if request.param == "fallback":
+        monkeypatch.setattr(awl_batch, "np", None)
+    return request.param
+
+
+def test_next_pickup_matches(engine):
+    """``next_pickup`` of every street, day and bin subset."""
+    schedules = _schedules()
+    batch = BatchSchedules(schedules)
+    assert batch.vectorized == (engine == "numpy")
+    for after in DAYS:
+        for bins in BINS:
+            assert batch.next_pickup(after, bins) == {
+                street: schedule.next_pickup(after, bins)
+                for street, schedule in schedules.items()}, (after, bins)
+
+
+@pytest.mark.usefixtures("engine")
+def test_next_pickup_per_bin_matches():
+    """The next day of each bin is ``next_pickup`` of that bin alone."""
+    schedules = _schedules()
+    batch = BatchSchedules(schedules)
+    for after in DAYS:
+        expected = {}
+        for street, schedule in schedules.items():
+            expected[street] = {}
+            for name in batch.bins:
+                found = schedule.next_pickup(after, [name])
+                expected[street][name] = found[0] if found else None
+        assert batch.next_pickup_per_bin(after) == expected, after
+
+
+@pytest.mark.usefixtures("engine")
+def test_tomorrow_matches():
+    """The bins of the next day, empty where nothing is collected."""
+    schedules = _schedules()
+    batch = BatchSchedules(schedules)
+    for today in DAYS:
+        for bins in BINS:
+            expected = {}
+            for street, schedule in schedules.items():
+                names = dict(schedule).get(date.fromordinal(
+                    today.toordinal() + 1), [])
+                expected[street] = [name for name in names
+                                    if bins is None or name in bins]
+            assert batch.tomorrow(today, bins) == expected, (today, bins)
+
+
+@pytest.mark.usefixtures("engine")
+@pytest.mark.parametrize("start, end", [
+    (None, None), (date(2025, 12, 1), date(2026, 1, 31)),
+    (date(2025, 12, 31), date(2025, 12, 31)), (None, date(2025, 6, 30)),
+    (date(2026, 11, 15), None), (date(2027, 1, 1), None),
+])
+def test_counts_match(start, end):
+    """Pickups per bin within the bounds, both days included."""
+    schedules = _schedules()
+    batch = BatchSchedules(schedules)
+    expected = {}
+    for street, schedule in schedules.items():
+        kept = [names for day, names in schedule
+                if (start is None or day >= start)
+                and (end is None or day <= end)]
+        expected[street] = {name: sum(name in names for names in kept)
+                            for name in batch.bins}
+    assert batch.counts(start, end) == expected
@@ -0,0 +1,118 @@
+"""Tests of date range queries and their query planning."""
+
+import itertools
+import random
+from datetime import date
+
+import pytest
+
+from awl_cache import months_between, plan_queries, scope_months, trim_pickups
+from bench.fake_server import synthetic_year
+
+
+def _covered(queries):
+    return {month for (year, month0), scope in queries
+            for month in scope_months(year, month0 + 1, scope)}
+
+
+def _candidates(months):
+    for year, month0 in months:
+        yield ((year, month0), "m")
+        yield ((year, month0), "3m")
+        yield ((year, 0), "y")
+
+
+@pytest.mark.parametrize("months, plan", [
+    ([], []),
+    ([(2026, 4)], [((2026, 4), "m")]),
+    ([(2026, 4), (2026, 5)], [((2026, 4), "3m")]),
+    # a 3m query runs into the next year
+    ([(2025, 10), (2025, 11), (2026, 0)], [((2025, 10), "3m")]),
+    ([(2025, 11), (2026, 0)], [((2025, 11), "3m")]),
+    # two separate months of a year are one y query
+    ([(2026, 2), (2026, 5)], [((2026, 0), "y")]),
+    ([(2026, month0) for month0 in range(7)], [((2026, 0), "y")]),
+    ([(2026, month0) for month0 in range(7)] + [(2026, 11), (2027, 0)],
+     [((2026, 0), "y"), ((2027, 0), "m")]),
+    ([(2025, 11), (2026, 3), (2026, 4)],
+     [((2025, 11), "m"), ((2026, 3), "3m")]),
+])
+def test_plans(months, plan):
+    """Known month sets get the expected plans."""
+    assert plan_queries(months) == plan
+    assert plan_queries(reversed(months)) == plan
+
+
+def test_plans_are_minimal():
+    """No other set of queries covers the months with fewer calls."""
+    rng = random.Random(18)
+    span = [divmod(index, 12) for index in range(2025 * 12, 2027 * 12)]
+    for _ in range(200):
+        months = set(rng.sample(span, rng.randint(1, 4)))
+        plan = plan_queries(months)
+        assert months <= _covered(plan)
+        candidates = sorted(set(_candidates(months)))
+        smaller = [combination for size in range(1, len(plan))
+                   for combination in itertools.combinations(candidates, size)
+                   if months <= _covered(combination)]
+        assert not smaller, (months, plan, smaller[0])
+
+
+def test_months_between():
+    """Months are listed in order across the year boundary."""
+    assert months_between(date(2025, 11, 15), date(2026, 2, 1)) == (
+        (2025, 10), (2025, 11), (2026, 0), (2026, 1))
+    assert months_between(date(2026, 3, 1), date(2026, 3, 31)) == (
+        (2026, 2),)
+    assert not months_between(date(2026, 3, 2), date(2026, 2, 1))
+
+
+def test_trim_pickups():
+    """Only the days in the range are kept, in date order."""
+    pickups = {"0-2026": {"20": ["gelb"], "3": ["blau"], "5": ["grau"]},
+               "10-2025": {"30": ["pink"], "2": ["braun"]},
+               "11-2025": {},
+               "5-2026": {"1": ["blau"]}}
+    trimmed = trim_pickups(pickups, date(2025, 11, 10), date(2026, 1, 5))
+    assert list(trimmed) == ["10-2025", "0-2026"]
+    assert list(trimmed["10-2025"].items()) == [("30", ["pink"])]
+    assert list(trimmed["0-2026"].items()) == [("3", ["blau"]),
+                                              ("5", ["grau"])]
+
+
+def _expected(street, start, end):
+    pickups = {}
+    for year in range(start.year, end.year + 1):
+        pickups.update(synthetic_year(street, year))
+    return trim_pickups(pickups, start, end)
+
+
+def test_get_pickups_between(make_client, server):
+    """A range over the year boundary costs one 3m query, then none."""
+    client = make_client()
+    start, end = date(2025, 12, 20), date(2026, 2, 10)
+    before = server.requests
+    assert client.get_pickups_between(start, end) == _expected(1000, start,
+                                                               end)
+    assert server.requests - before == 1
+
+    narrower = client.get_pickups_between(date(2026, 1, 1), end,
+                                          bins=["gelb"])
+    assert server.requests - before == 1
+    assert narrower == client.filter_pickups_by_bins(
+        _expected(1000, date(2026, 1, 1), end), ["gelb"])
+
+    with pytest.raises(ValueError):
+        client.get_pickups_between(end, start)
+
+
+def test_get_pickups_between_mixed_plan(make_client, server):
+    """Most of a year and one month after it are a y and an m query."""
+    client = make_client()
+    start, end = date(2026, 1, 15), date(2027, 1, 31)
+    before = server.requests
+    assert client.get_pickups_between(start, end) == _expected(1000, start,
+                                                               end)
+    assert server.requests - before == 2
+    assert client.schedule_file.load(client.config.api_url, 1000,
+                                     2026) is not None
@@ -0,0 +1,55 @@
+"""Tests of the schedule caches."""
+
+import pytest
+
+from awl_cache import (MonthStore, ScheduleCache, ScheduleDiskCache,
+                       merge_pickups)
+
+
+def _bins(pickups):
+    return [name for days in pickups.values() for day_bins in days.values()
+            for name in day_bins]
+
+
+@pytest.mark.parametrize("fetch_year", [True, False])
+def test_changing_a_result_leaves_the_cache_alone(make_client, fetch_year):
+    """Lists of a returned schedule are not the cached ones."""
+    client = make_client(SCHEDULE_FETCH_YEAR=fetch_year)
+    for days in client.get_pickup_dates(scope="m").values():
+        for day_bins in days.values():
+            day_bins.append("bogus")
+    assert "bogus" not in _bins(client.get_pickup_dates(scope="m"))
+    assert "bogus" not in _bins(client.get_pickup_dates(scope="y"))
+
+
+def test_schedule_cache_hands_out_copies():
+    """Neither the stored nor the returned pickups alias the entry."""
+    cache = ScheduleCache()
+    stored = {"0-2026": {"5": ["gelb"]}}
+    cache.put(1000, 2026, 1, "m", stored)
+    stored["0-2026"]["5"].append("bogus")
+    cache.get(1000, 2026, 1, "m")["0-2026"]["5"].append("bogus")
+    cache.lookup(1000, [(2026, 0)])[0]["0-2026"]["5"].append("bogus")
+    assert cache.get(1000, 2026, 1, "m") == {"0-2026": {"5": ["gelb"]}}
+
+
+def test_merge_pickups_builds_new_lists():
+    """Merged days get new lists, the merged in ones stay as they were."""
+    source = {"0-2026": {"5": ["gelb"]}}
+    target = merge_pickups({}, source)
+    merge_pickups(target, {"0-2026": {"5": ["blau", "gelb"]}})
+    assert target == {"0-2026": {"5": ["gelb", "blau"]}}
+    assert source == {"0-2026": {"5": ["gelb"]}}
+
+
+def test_cache_paths_refuse_other_streets(tmp_path):
+    """A strasseNummer that is not a number never becomes a file name."""
+    schedules = ScheduleDiskCache(tmp_path / "cache")
+    months = MonthStore(tmp_path / "cache")
+    for street in ("x/../../escaped", "../1000", "1000 "):
+        with pytest.raises(ValueError):
+            schedules.store("url", street, 2026, {})
+        with pytest.raises(ValueError):
+            months.store("url", street, {})
+    assert not list(tmp_path.rglob("*.json"))
+    assert schedules.path(1000, 2026).name == "awl-schedule-1000-2026.json"
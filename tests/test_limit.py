@@ -0,0 +1,55 @@
+"""Tests of the adaptive rate limiter."""
+
+import threading
+import time
+
+from awl_limit import AdaptiveLimiter
+
+
+def test_off_by_default(make_client):
+    """Clients only limit their requests when RATE_LIMIT is set."""
+    assert make_client().limiter is None
+    limiter = make_client(RATE_LIMIT=5, CONCURRENCY=3).limiter
+    assert (limiter.rate, limiter.limit) == (5, 3)
+
+
+def test_one_cut_per_overload():
+    """Requests already in flight when the limits were cut do not cut."""
+    limiter = AdaptiveLimiter(rate=100, concurrency=8)
+    before = [limiter.acquire() for _ in range(3)]
+    limiter.release(before[0], 429)
+    assert (limiter.rate, limiter.limit) == (50, 4)
+    limiter.release(before[1], 503)
+    limiter.release(before[2], None)
+    assert (limiter.rate, limiter.limit, limiter.cuts) == (50, 4, 1)
+
+    limiter.release(limiter.acquire(), 429)
+    assert (limiter.rate, limiter.limit, limiter.cuts) == (25, 2, 2)
+    assert limiter.stats()["throttled"] == 2
+
+
+def test_good_responses_raise_limits_up_to_the_maximum():
+    """Additive increase never goes past the configured limits."""
+    limiter = AdaptiveLimiter(rate=1000, concurrency=4, increase=5000)
+    limiter.release(limiter.acquire(), 500)
+    for _ in range(200):
+        limiter.release(limiter.acquire(), 200)
+    assert (limiter.rate, limiter.limit) == (1000, 4)
+
+
+def test_acquire_waits_for_a_free_slot():
+    """A caller over the concurrency limit waits for a release."""
+    limiter = AdaptiveLimiter(rate=1000, concurrency=1)
+    started = limiter.acquire()
+    acquired = threading.Event()
+
+    def second():
+        limiter.release(limiter.acquire(), 200)
+        acquired.set()
+    worker = threading.Thread(target=second)
+    worker.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    limiter.release(started, 200)
+    worker.join(1)
+    assert acquired.is_set()
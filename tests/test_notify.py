@@ -0,0 +1,112 @@
+"""Tests of the reminder daemon with a stub sender and a fake clock."""
+
+# the timer heap is what these tests check
+# pylint: disable=protected-access
+
+from datetime import date, datetime, time
+
+import pytest
+
+from awl_notify import NotificationDaemon, Subscriber, reminder_text
+from awl_pickups import PickupSchedule
+
+PICKUPS = {"2-2026": {"5": ["gelb"], "10": ["blau", "gelb"], "12": ["pink"]}}
+
+
+class StubSender:  # pylint: disable=too-few-public-methods
+    """Collect the messages instead of sending them."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, chat_id, text):
+        """Remember ``text`` for ``chat_id``."""
+        self.messages.append((chat_id, text))
+
+
+class StubClient:
+    """Answer every street with ``PICKUPS``."""
+
+    def __init__(self):
+        self.fetched = 0
+
+    def get_schedule(self, scope="m", street=None):
+        """Return the schedule of ``PICKUPS``."""
+        assert scope == "3m" and street == "1000"
+        self.fetched += 1
+        return PickupSchedule.from_pickups(PICKUPS)
+
+    def invalidate_schedule(self, street=None):
+        """Nothing is cached."""
+
+
+class FakeClock:  # pylint: disable=too-few-public-methods
+    """A clock that only moves when told to."""
+
+    def __init__(self, now):
+        self.now = now.timestamp()
+
+    def __call__(self):
+        return self.now
+
+    def set(self, now):
+        """Move the clock to ``now``."""
+        self.now = now.timestamp()
+
+
+@pytest.fixture(name="daemon")
+def fixture_daemon():
+    """A daemon with a gelb and a pink subscriber of street 1000."""
+    daemon = NotificationDaemon(StubClient(), StubSender())
+    daemon.clock = FakeClock(datetime(2026, 3, 2, 10, 0))
+    daemon.add(Subscriber("gelb", "1000", ["gelb"]))
+    daemon.add(Subscriber("pink", "1000", ["pink"], time(7, 30)))
+    return daemon
+
+
+def _timers(daemon):
+    return sorted((datetime.fromtimestamp(due), subscriber.chat_id, day)
+                  for due, _, subscriber, day in daemon._timers)
+
+
+def test_one_message_per_pickup(daemon):
+    """Every pickup is announced once, at the subscriber's time."""
+    for hour in range(24 * 20):
+        daemon.clock.set(datetime(2026, 3, 2 + hour // 24, hour % 24, 0))
+        daemon.run_pending()
+        daemon.run_pending()
+    assert daemon.sender.messages == [
+        ("gelb", reminder_text(date(2026, 3, 5), ["gelb"])),
+        ("gelb", reminder_text(date(2026, 3, 10), ["gelb"])),
+        ("pink", reminder_text(date(2026, 3, 12), ["pink"])),
+    ]
+    assert daemon.sent == 3
+
+
+def test_timers_move_on_after_a_send(daemon):
+    """A send replaces the timer with the one of the next pickup."""
+    assert daemon.run_pending() == 2
+    assert _timers(daemon) == [
+        (datetime(2026, 3, 4, 18, 0), "gelb", date(2026, 3, 5)),
+        (datetime(2026, 3, 11, 7, 30), "pink", date(2026, 3, 12)),
+    ]
+
+    daemon.clock.set(datetime(2026, 3, 4, 17, 59))
+    assert daemon.run_pending() == 0
+    daemon.clock.set(datetime(2026, 3, 4, 18, 0))
+    assert daemon.run_pending() == 1
+    assert daemon.sent == 1
+    assert _timers(daemon) == [
+        (datetime(2026, 3, 9, 18, 0), "gelb", date(2026, 3, 10)),
+        (datetime(2026, 3, 11, 7, 30), "pink", date(2026, 3, 12)),
+    ]
+
+    daemon.clock.set(datetime(2026, 3, 9, 18, 5))
+    assert daemon.run_pending() == 1
+    # nothing more is known, look again after the next refresh
+    assert _timers(daemon) == [
+        (datetime(2026, 3, 10, 18, 5), "gelb", None),
+        (datetime(2026, 3, 11, 7, 30), "pink", date(2026, 3, 12)),
+    ]
+    # the schedule is older than refresh_interval at both sends
+    assert daemon.client.fetched == 3
@@ -0,0 +1,36 @@
+"""Tests of the query mode."""
+
+import argparse
+
+import pytest
+
+from awl_query import run_query
+
+
+def _args(**options):
+    values = {"query_street": ["1001"], "query_scope": None,
+              "query_bins": None, "query_next": False,
+              "query_format": "ndjson", "query_concurrency": None}
+    values.update(options)
+    return argparse.Namespace(**values)
+
+
+@pytest.mark.parametrize("options, scope", [
+    ({}, "m"),
+    ({"query_next": True}, "3m"),
+    ({"query_next": True, "query_scope": "m"}, "m"),
+    ({"query_scope": "y"}, "y"),
+])
+def test_default_scope(make_client, capsys, options, scope):
+    """``--next`` looks past the end of the month unless told otherwise."""
+    client = make_client()
+    scopes = []
+    original = client.get_pickup_dates
+
+    def record(**kwargs):
+        scopes.append(kwargs["scope"])
+        return original(**kwargs)
+    client.get_pickup_dates = record
+    assert run_query(client, _args(**options)) == 0
+    assert scopes == [scope]
+    assert capsys.readouterr().out
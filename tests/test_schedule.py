@@ -0,0 +1,125 @@
+"""Tests of the command line tool."""
+
+import json
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT = pathlib.Path(__file__).resolve().parent.parent / "awl_schedule.py"
+
+
+def test_stale_schedule_is_refreshed_before_exit(make_client, server,
+                                                 tmp_path):
+    """A run that answers from a stale schedule still revalidates it."""
+    make_client(SCHEDULE_SOFT_TTL=0)
+    command = [sys.executable, str(SCRIPT), "-c", str(tmp_path / "awl.conf")]
+    subprocess.run(command, check=True, capture_output=True)
+    stored = next(tmp_path.glob("awl-schedule-1000-*.json"))
+    fetched = stored.stat().st_mtime_ns
+
+    server.latency = 0.5
+    result = subprocess.run(command, check=True, capture_output=True,
+                            text=True)
+    assert "Next pickup" in result.stdout
+    assert stored.stat().st_mtime_ns > fetched
+
+
+def test_query_options_are_rejected_with_a_subcommand(tmp_path):
+    """``--street`` before ``sync`` is an error, not a silent override."""
+    command = [sys.executable, str(SCRIPT), "-c", str(tmp_path / "awl.conf"),
+               "--street", "1001", "sync"]
+    result = subprocess.run(command, check=False, capture_output=True,
+                            text=True)
+    assert result.returncode == 2
+    assert "query options" in result.stderr
+
+
+def test_parallel_query_matches_sequential(make_client, tmp_path):
+    """``--concurrency`` only changes the order of the records."""
+    make_client()
+    command = [sys.executable, str(SCRIPT), "-c", str(tmp_path / "awl.conf"),
+               "--format", "ndjson"]
+    for number in range(1000, 1010):
+        command += ["--street", str(number)]
+    sequential = subprocess.run(command, check=True, capture_output=True,
+                                text=True).stdout.splitlines()
+    parallel = subprocess.run(command + ["--concurrency", "4"], check=True,
+                              capture_output=True,
+                              text=True).stdout.splitlines()
+    assert len(sequential) > 10
+    assert sorted(parallel) == sorted(sequential)
+
+
+def test_query_output_has_only_records(make_client, tmp_path):
+    """Warnings of the client go to stderr, not between the records."""
+    blocked = tmp_path / "blocked"
+    blocked.write_text("not a directory", encoding="utf-8")
+    make_client(CACHE_DIR=str(blocked / "cache"))
+    command = [sys.executable, str(SCRIPT), "-c", str(tmp_path / "awl.conf"),
+               "--street", "1001", "--format", "ndjson", "--next"]
+    result = subprocess.run(command, check=True, capture_output=True,
+                            text=True)
+    assert "Warning: could not write" in result.stderr
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record["strasseNummer"] for record in records] == ["1001"]
+
+
+def test_save_config_keeps_defaults_out(make_client, tmp_path):
+    """Only the basic keys, loaded keys and changed values are written."""
+    client = make_client()
+    client.config.concurrency += 1
+    client.save_config()
+    saved = json.loads((tmp_path / "awl.conf").read_text(encoding="utf-8"))
+    assert sorted(saved) == sorted([
+        "API_URL", "STR_URL", "WASTE_BINS", "strasseNummer",
+        "strasseBezeichnung", "RETRIES", "CACHE_DIR", "CONCURRENCY"])
+    assert saved["RETRIES"] == 0
+
+
+def test_lazy_session_and_limiter_are_shared(make_client, monkeypatch):
+    """Threads racing for the first API call share one of each."""
+    import awl_limit  # pylint: disable=import-outside-toplevel
+
+    class SlowLimiter(awl_limit.AdaptiveLimiter):
+        """Takes long enough to build for the threads to overlap."""
+
+        def __init__(self, *args, **kwargs):
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(awl_limit, "AdaptiveLimiter", SlowLimiter)
+    client = make_client(RATE_LIMIT=50)
+    new_session = client._new_session  # pylint: disable=protected-access
+
+    def slow_session():
+        time.sleep(0.05)
+        return new_session()
+    client._new_session = slow_session  # pylint: disable=protected-access
+
+    barrier = threading.Barrier(8)
+
+    def first_use():
+        barrier.wait()
+        return client.session, client.limiter
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        used = list(pool.map(lambda _: first_use(), range(8)))
+    assert len({id(session) for session, _ in used}) == 1
+    assert len({id(limiter) for _, limiter in used}) == 1
+
+
+def test_cached_run_leaves_lazy_modules_alone(make_client, tmp_path):
+    """Answering from the cache loads neither requests nor awl_streets."""
+    make_client()
+    config = str(tmp_path / "awl.conf")
+    subprocess.run([sys.executable, str(SCRIPT), "-c", config], check=True,
+                   capture_output=True)
+    check = ("import runpy, sys\n"
+             f"sys.argv = [{str(SCRIPT)!r}, '-c', {config!r}]\n"
+             f"runpy.run_path({str(SCRIPT)!r}, run_name='__main__')\n"
+             "print(sorted({'requests', 'curses', 'awl_streets'}"
+             " & set(sys.modules)))\n")
+    result = subprocess.run([sys.executable, "-c", check], check=True,
+                            capture_output=True, text=True)
+    assert result.stdout.splitlines()[-1] == "[]"
@@ -0,0 +1,123 @@
+"""Tests of the in-memory schedule service."""
+
+# the responses are checked without opening a socket
+# pylint: disable=protected-access
+
+import asyncio
+import json
+from datetime import date
+
+from awl_server import ScheduleService
+
+
+def _get(service, target):
+    return asyncio.run(service._respond(["GET", target, "HTTP/1.1"]))
+
+
+def test_bins_are_normalized_before_caching(make_client):
+    """Bin order and duplicates do not create new cache entries."""
+    service = ScheduleService(make_client())
+    first = _get(service, "/next?street=1000&bins=gelb,blau")
+    assert first[0] == 200
+    assert _get(service, "/next?street=1000&bins=blau,gelb,gelb") == first
+    assert len(service._responses) == 1
+
+    status, body = _get(service, "/next?street=1000&bins=gelb,x1")
+    assert status == 400 and "x1" in json.loads(body)["error"]
+    assert len(service._responses) == 1
+
+
+def test_responses_are_bounded(make_client):
+    """The least recently used responses are dropped."""
+    service = ScheduleService(make_client(), max_responses=3)
+    for number in range(1000, 1006):
+        assert _get(service, f"/next?street={number}")[0] == 200
+    assert [key[1] for key in service._responses] == ["1003", "1004",
+                                                      "1005"]
+
+
+def test_unexpected_errors_answer_500(make_client, capsys):
+    """A failure other than RequestError still gets a response."""
+    client = make_client()
+
+    def fail(**_):
+        raise KeyError("broken")
+    client.get_pickup_dates = fail
+    status, body = _get(ScheduleService(client), "/next?street=1000")
+    assert status == 500
+    assert json.loads(body) == {"error": "internal error"}
+    assert "KeyError" in capsys.readouterr().out
+
+
+def test_streets_must_be_numbers(make_client, tmp_path):
+    """Anything but a strasseNummer is rejected before it is fetched."""
+    service = ScheduleService(make_client())
+    for street in ("x/../../escaped", "1000x", "-1", "١٠٠٠"):
+        status, _ = _get(service, f"/next?street={street}")
+        assert status == 400, street
+    assert not service._schedules
+    assert not list(tmp_path.parent.glob("escaped*"))
+
+
+def test_schedules_are_bounded(make_client):
+    """The least recently used schedules are dropped with their answers."""
+    service = ScheduleService(make_client(), max_schedules=2)
+    for number in ("1000", "1001", "1000", "1002"):
+        assert _get(service, f"/schedule?street={number}")[0] == 200
+    assert [key[0] for key in service._schedules] == ["1000", "1002"]
+    assert {key[1] for key in service._responses} == {"1000", "1002"}
+
+
+def test_refresh_drops_schedules_nobody_asked_for(make_client):
+    """Only the schedules used since the last refresh are fetched again."""
+    client = make_client()
+    service = ScheduleService(client, refresh_interval=0.01)
+    _get(service, "/next?street=1000")
+    _get(service, "/next?street=1001")
+    service._used = {("1001", "3m", date.today().replace(day=1))}
+    fetched = []
+    original = client.get_pickup_dates
+
+    def record(**kwargs):
+        fetched.append(kwargs["street"])
+        return original(**kwargs)
+    client.get_pickup_dates = record
+
+    async def refresh_once():
+        task = asyncio.ensure_future(service._refresh_loop())
+        while not fetched:
+            await asyncio.sleep(0.01)
+        task.cancel()
+    asyncio.run(refresh_once())
+    assert fetched == ["1001"]
+    assert [window[:2] for window in service._schedules] == [("1001", "3m")]
+
+
+def test_month_rollover_fetches_the_new_window(make_client, monkeypatch):
+    """A schedule of the previous month is not served after the rollover."""
+    today = [date(2026, 1, 31)]
+
+    class Clock(date):
+        """``date`` with a settable ``today``."""
+
+        @classmethod
+        def today(cls):
+            return today[0]
+    monkeypatch.setattr("awl_server.date", Clock)
+    client = make_client()
+    fetched = []
+    original = client.get_pickup_dates
+
+    def record(**kwargs):
+        fetched.append(kwargs["scope"])
+        return original(**kwargs)
+    client.get_pickup_dates = record
+    service = ScheduleService(client)
+
+    assert _get(service, "/schedule?street=1000")[0] == 200
+    assert _get(service, "/schedule?street=1000")[0] == 200
+    assert fetched == ["m"]
+    today[0] = date(2026, 2, 1)
+    assert _get(service, "/schedule?street=1000")[0] == 200
+    assert fetched == ["m", "m"]
+    assert ("1000", "m", date(2026, 2, 1)) in service._schedules
@@ -0,0 +1,15 @@
+"""Tests of the metrics export."""
+
+from awl_stats import Stats, prometheus_text
+
+
+def test_prometheus_counters_are_exact():
+    """Large counters keep every digit, fractions their full precision."""
+    stats = Stats()
+    stats.count("requests_total", 1234567, endpoint="calendar")
+    stats.count("retries_total", 3)
+    stats.add_collector(lambda: [("rate", {}, 17.123456789)])
+    lines = prometheus_text(stats).splitlines()
+    assert 'awl_requests_total{endpoint="calendar"} 1234567' in lines
+    assert "awl_retries_total 3" in lines
+    assert "awl_rate 17.123456789" in lines
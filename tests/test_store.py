@@ -0,0 +1,23 @@
+"""Tests of the city-wide crawl and the schedule store."""
+
+from awl_pickups import PickupSchedule
+from awl_store import ScheduleStore, crawl
+
+
+def test_crawl_stores_every_street_without_caching(make_client, server,
+                                                   tmp_path):
+    """The store matches the API, the cache directory stays empty."""
+    client = make_client(CACHE_DIR=str(tmp_path / "cache"))
+    path = tmp_path / "city.awls"
+    # the stand-in server has seven collection districts
+    assert crawl(client, path, concurrency=4) == (len(server.streets), 0, 7)
+    assert not list((tmp_path / "cache").glob("awl-schedule-*"))
+    assert len(client.schedule_cache) == 0
+
+    expected = make_client(CACHE_DIR=str(tmp_path / "expected"))
+    with ScheduleStore(path) as store:
+        assert len(store) == len(server.streets)
+        for number in (1000, 1013, 1039):
+            pickups = expected.get_pickup_dates(scope="y", street=number)
+            assert list(store.schedule(number)) == list(
+                PickupSchedule.from_pickups(pickups, store.bins))
@@ -0,0 +1,198 @@
+"""Tests of the street list helpers."""
+
+import json
+import random
+
+import pytest
+
+from awl_streets import (Street, StreetIndex, StreetMatcher, edit_distance,
+                         iter_streets, normalize_street)
+from bench.fake_server import synthetic_streets
+
+STREETS = [{"strasseNummer": 1000 + idx, "strasseBezeichnung": name}
+           for idx, name in enumerate(("Hauptstraße", "Bahnhofstraße",
+                                       "Am Markt", "Marktplatz",
+                                       "Hauptmarkt"))]
+
+
+def brute_force(query):
+    """Return the streets matching ``query`` by a linear scan."""
+    return [street for street in STREETS
+            if query.lower() in street["strasseBezeichnung"].lower()]
+
+
+def test_search_matches_linear_scan():
+    """Every query agrees with a scan, also when narrowing from the memo."""
+    index = StreetIndex(STREETS)
+    for query in ("", "m", "ma", "mar", "mark", "markt", "MARKT", "t",
+                  "straße", "haupt", "hauptm", "xyz", "am markt"):
+        assert index.search(query) == brute_force(query), query
+
+
+def test_empty_query_survives_memo_eviction():
+    """The full list is still returned after the memo turned over."""
+    index = StreetIndex(STREETS, memo_size=4)
+    assert index.search("") == STREETS
+    for number in range(70):
+        index.search(f"query {number}")
+    assert index.search("") == STREETS
+    index.reset()
+    assert index.search("") == STREETS
+
+
+@pytest.mark.parametrize("name, key", [
+    ("Goethe-Straße", "goethestr"),
+    ("Goethestrasse", "goethestr"),
+    ("goethestr.", "goethestr"),
+    ("GOETHESTR", "goethestr"),
+    ("Büttger Straße 1-99", "buettgerstr199"),
+    ("Am Mühlenweg", "ammuehlenweg"),
+    ("Straße des 17. Juni", "strdes17juni"),
+    ("Neusser Str.", "neusserstr"),
+])
+def test_normalize_street(name, key):
+    """Spelling variants give the same key."""
+    assert normalize_street(name) == key
+
+
+def levenshtein(left, right):
+    """Return the edit distance without any shortcut."""
+    previous = list(range(len(right) + 1))
+    for row, char in enumerate(left, 1):
+        current = [row]
+        for col, other in enumerate(right, 1):
+            current.append(min(previous[col] + 1, current[col - 1] + 1,
+                               previous[col - 1] + (char != other)))
+        previous = current
+    return previous[-1]
+
+
+def _misspell(rng, key):
+    for _ in range(rng.randint(0, 3)):
+        pos = rng.randrange(len(key) + 1)
+        letter = rng.choice("abcdeilnorstu")
+        key = rng.choice((key[:pos] + letter + key[pos:],
+                          key[:pos] + key[pos + 1:],
+                          key[:pos] + letter + key[pos + 1:])) or letter
+    return key
+
+
+def test_edit_distance_is_bounded_levenshtein():
+    """Distances up to the bound are exact, larger ones are bound + 1."""
+    rng = random.Random(20)
+    keys = [normalize_street(street["strasseBezeichnung"])
+            for street in synthetic_streets(100)]
+    for _ in range(1000):
+        left = rng.choice(keys)
+        right = _misspell(rng, rng.choice((left, rng.choice(keys))))
+        bound = rng.randint(0, 4)
+        assert edit_distance(left, right, bound) == min(
+            levenshtein(left, right), bound + 1), (left, right, bound)
+
+
+def test_within_matches_brute_force():
+    """The BK-tree finds exactly the keys a scan with Levenshtein finds."""
+    rng = random.Random(20)
+    streets = synthetic_streets(200)
+    matcher = StreetMatcher(streets)
+    keys = sorted({normalize_street(street["strasseBezeichnung"])
+                   for street in streets})
+    for _ in range(40):
+        query = _misspell(rng, rng.choice(keys))
+        max_distance = rng.randint(0, 3)
+        distances = {key: levenshtein(query, key) for key in keys}
+        expected = sorted((key, distance)
+                          for key, distance in distances.items()
+                          if distance <= max_distance)
+        assert sorted(matcher.within(query, max_distance)) == expected, (
+            query, max_distance)
+
+
+def test_search_and_best():
+    """Substring matches rank first, ambiguous typos have no best match."""
+    streets = [{"strasseNummer": 1, "strasseBezeichnung": "Goethestraße"},
+               {"strasseNummer": 2, "strasseBezeichnung": "Goetheplatz"},
+               {"strasseNummer": 3, "strasseBezeichnung": "Göthestr."},
+               {"strasseNummer": 4, "strasseBezeichnung": "Mühlenweg"},
+               {"strasseNummer": 5, "strasseBezeichnung": "Muehlenweg"}]
+    matcher = StreetMatcher(streets)
+    found = matcher.search("Goethe Strasse")
+    assert [street["strasseNummer"] for street, _ in found] == [1, 3]
+    assert [distance for _, distance in found] == [0, 0]
+    # "Göthestr." has the same key as "Goethestraße"
+    assert matcher.search("Goetestrase") == [(streets[0], 1),
+                                             (streets[2], 1)]
+    assert matcher.best("goethestr") == streets[0]
+    assert matcher.best("Goetestrasse") == streets[0]
+    assert matcher.best("Mühlenwek") == streets[3]
+    assert matcher.best("Xyz") is None
+    assert not matcher.search("")
+
+
+ENTRIES = [{"strasseNummer": 3670, "strasseBezeichnung": "Goethestraße",
+            "blockedHomeNumbers": ["12", "14a"]},
+           {"strasseNummer": 3671, "strasseBezeichnung": "Büttger Weg 1-9",
+            "extra": {"nested": ["}", "]", "{"]}},
+           {"strasseNummer": 3672, "strasseBezeichnung": "Mühlenstr. „Alt“"}]
+
+
+def _body(entries, **options):
+    return json.dumps(entries, ensure_ascii=False, **options).encode("utf-8")
+
+
+def test_every_split_position():
+    """Chunks may end inside a multi-byte character or an object."""
+    expected = [Street.from_dict(entry) for entry in ENTRIES]
+    for body in (_body(ENTRIES), _body(ENTRIES, indent=2)):
+        for pos in range(len(body) + 1):
+            assert list(iter_streets([body[:pos], body[pos:]])) == expected
+        assert list(iter_streets(body[pos:pos + 1]
+                                 for pos in range(len(body)))) == expected
+
+
+def test_random_chunks_of_a_long_list():
+    """Any chunking decodes the same streets as json.loads."""
+    entries = synthetic_streets(300) + ENTRIES
+    body = _body(entries)
+    expected = [Street.from_dict(entry) for entry in json.loads(body)]
+    rng = random.Random(16)
+    for _ in range(20):
+        cuts = sorted(rng.sample(range(1, len(body)), 50))
+        chunks = [body[start:end]
+                  for start, end in zip([0] + cuts, cuts + [len(body)])]
+        assert list(iter_streets(chunks)) == expected
+
+
+def test_streets_arrive_before_the_download_ends():
+    """The first street is yielded while later chunks are still unread."""
+    body = _body(ENTRIES)
+    first_end = body.index(b"}") + 2
+    read = []
+
+    def chunks():
+        for part in (body[:first_end], body[first_end:]):
+            read.append(part)
+            yield part
+    streets = iter_streets(chunks())
+    assert next(streets) == Street.from_dict(ENTRIES[0])
+    assert len(read) == 1
+
+
+@pytest.mark.parametrize("body", [
+    b"", b"[", b'[{"strasseNummer": 1, "strasseBezeichnung": "A"}',
+    b'{"strasseNummer": 1}', b"[1, 2]", b'[{"strasseNummer": 1, "strasse',
+])
+def test_broken_lists_raise(body):
+    """Incomplete or wrongly shaped bodies are errors, not short lists."""
+    with pytest.raises(ValueError):
+        list(iter_streets([body[:5], body[5:]]))
+
+
+def test_street_records_read_like_dicts():
+    """Records answer the API field names and convert back."""
+    street = next(iter_streets([_body(ENTRIES)]))
+    assert street["strasseBezeichnung"] == "Goethestraße"
+    assert street["blockedHomeNumbers"] == ["12", "14a"]
+    assert street.get("extra") is None
+    assert street.to_dict() == ENTRIES[0]
+    assert not list(iter_streets([b" [ ] "]))
@@ -0,0 +1,83 @@
+"""Tests of the incremental schedule sync."""
+
+import copy
+import time
+from datetime import date
+
+from awl_cache import month_hash
+from awl_sync import ScheduleSync, diff_pickups
+from bench.fake_server import synthetic_year
+
+
+def test_unchanged_calendars_have_no_diff():
+    """Reordered bins and days are not a change."""
+    old = {"0-2026": {"5": ["gelb", "blau"], "12": ["grau"]}}
+    new = {"0-2026": {"12": ["grau"], "5": ["blau", "gelb"]}}
+    assert diff_pickups(old, new) == ([], [], [])
+    assert month_hash(old["0-2026"]) == month_hash(new["0-2026"])
+
+
+def test_moves_added_and_removed():
+    """Close days of the same bin are moves, the rest adds and removals."""
+    old = {"0-2026": {"5": ["gelb", "blau"], "20": ["grau"], "31": ["pink"]}}
+    new = {"0-2026": {"6": ["gelb"], "5": ["blau"], "28": ["grau"]},
+           "1-2026": {"2": ["pink"], "10": ["braun"]}}
+    added, removed, moved = diff_pickups(old, new)
+    assert moved == [("gelb", date(2026, 1, 5), date(2026, 1, 6)),
+                     ("pink", date(2026, 1, 31), date(2026, 2, 2))]
+    assert added == [(date(2026, 1, 28), "grau"),
+                     (date(2026, 2, 10), "braun")]
+    assert removed == [(date(2026, 1, 20), "grau")]
+
+    _, _, moved = diff_pickups(old, new, move_window=8)
+    assert ("grau", date(2026, 1, 20), date(2026, 1, 28)) in moved
+
+
+def test_a_move_claims_the_closest_day():
+    """Each new pickup is the target of one move only."""
+    old = {"2-2026": {"10": ["gelb"], "12": ["gelb"]}}
+    new = {"2-2026": {"11": ["gelb"]}}
+    added, removed, moved = diff_pickups(old, new)
+    assert moved == [("gelb", date(2026, 3, 10), date(2026, 3, 11))]
+    assert removed == [(date(2026, 3, 12), "gelb")]
+    assert not added
+
+
+def test_stale_months(make_client):
+    """Missing, old and volatile months are fetched, fresh ones are not."""
+    sync = ScheduleSync(make_client(), max_age=3600, volatile_months=2)
+    now = time.time()
+    records = {"11-2025": {"fetched": now}, "0-2026": {"fetched": now},
+               "1-2026": {"fetched": now}, "2-2026": {"fetched": now - 7200}}
+    months = [(2025, 11), (2026, 0), (2026, 1), (2026, 2), (2026, 3)]
+    # December and January are volatile, March too old, April missing
+    assert sync.stale_months(records, months, date(2025, 12, 24)) == [
+        (2025, 11), (2026, 0), (2026, 2), (2026, 3)]
+    assert not sync.stale_months(records, months[1:2], date(2026, 6, 1))
+
+
+def test_sync_reports_what_changed(make_client, server):
+    """A second sync only refetches volatile months and finds the move."""
+    # the synthetic calendars are rewritten below
+    # pylint: disable=protected-access
+    client = make_client()
+    sync = ScheduleSync(client, max_age=3600, volatile_months=1)
+    today = date(2026, 3, 1)
+    first = sync.sync(1000, scope="3m", today=today)
+    assert first.fetched == [(2026, 2), (2026, 3), (2026, 4)]
+    assert not first.changed
+
+    year = synthetic_year(1000, 2026)
+    moved = copy.deepcopy(year)
+    day = min(year["2-2026"], key=int)
+    name = year["2-2026"][day][0]
+    moved["2-2026"][day].remove(name)
+    moved["2-2026"].setdefault(str(int(day) + 1), []).append(name)
+    server._schedules = {"1000": {"2026": moved}}
+
+    second = sync.sync(1000, scope="3m", today=today)
+    assert second.fetched == [(2026, 2)]
+    assert second.skipped == [(2026, 3), (2026, 4)]
+    assert second.moved == [(name, date(2026, 3, int(day)),
+                             date(2026, 3, int(day) + 1))]
+    assert second.requests == 1